@@ -1,64 +1,103 @@
 from models import ToolInput, ToolResult
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from dispatch import COORDINATE_PARAMS, ToolArgumentError, compile_tools
+from timeouts import TimeoutPolicy
+from scene import SHAPE_KINDS, SceneGraph
+from drawlog import DrawLog
+from layout import LayoutCompiler, LayoutError
 import threading
 import queue
 import time
 import subprocess
 import json
+import os
 import asyncio
+import concurrent.futures
 import sys
+import uuid
+import base64
+import copy
+import signal
+from typing import List, Optional, Tuple
 from rich.console import Console
 from rich.panel import Panel
 
 console = Console()
 
+# Result of show_reasoning, which is handled locally and always succeeds the same way
+REASONING_DISPLAYED = "Reasoning steps displayed successfully."
+
 class ActionLayer:
-    def __init__(self):
-        """Initialize the action layer"""
+    def __init__(self, backend: Optional[str] = None, server_url: Optional[str] = None):
+        """Initialize the action layer; backend selects the server's drawing backend.
+        With server_url (default: PAINT_MCP_URL) the layer connects to a shared server over SSE
+        (a URL ending in /sse) or streamable HTTP instead of starting its own over stdio"""
+        self.backend = backend
+        self.server_url = server_url or os.getenv("PAINT_MCP_URL") or None
         self.tools = []
+        self._dispatch = {}
         self._session = None
-        self._server_process = None
+        self._loop = None
+        # Process ID the server reports, to check it is gone after stop()
+        self.server_pid = None
+        self.timeouts = TimeoutPolicy()
+        self.scene = SceneGraph()
+        # Drawing calls of the current run, for offline replay
+        self.drawlog = DrawLog()
+        self._canvas_view = None
+        self._timed_out_requests = {}
+        self._unreconciled_requests = {}
         self.result_queue = queue.Queue()
+        self.server_thread = None
+        self._stop_requested = threading.Event()
+        # Set on the session loop to leave the keep-alive wait; the main task is cancelled
+        # instead while the session is still starting up
+        self._stop_event = None
+        self._main_task = None
+        # Futures of calls scheduled on the session loop and not yet finished
+        self._inflight = set()
+        self._inflight_lock = threading.Lock()
+        self._leftover_tasks = []
+        self._stop_report = None
         
     def start_mcp_server(self):
-        """Start the MCP server"""
+        """Start the MCP server in the background; get_tools() waits until it is ready"""
         try:
             # Start the server process
-            server_params = StdioServerParameters(
-                command="python",
-                args=["paint_mcp_tools.py"]
-            )
+            env = dict(os.environ)
+            if self.backend:
+                env["PAINT_BACKEND"] = self.backend
             
-            # Start the MCP server in a separate thread
+            # Start the MCP server in a separate thread, which also loads the MCP client
             self.server_thread = threading.Thread(
                 target=self._run_server_thread,
-                args=(server_params,)
+                args=(env,)
             )
             self.server_thread.daemon = True
             self.server_thread.start()
-            
-            # Wait for server to be ready
-            time.sleep(2)  # Increased wait time
             return True
         except Exception as e:
             console.print(f"[bold red]Error starting MCP server: {e}[/]")
             return False
     
-    def _run_server_thread(self, server_params):
+    def _run_server_thread(self, env):
         """Run the server in a thread by creating and running an event loop"""
-        asyncio.run(self._run_server(server_params))
+        asyncio.run(self._run_server(env))
     
-    async def _run_server(self, server_params):
+    async def _run_server(self, env):
         """Run the MCP server asynchronously"""
+        self._main_task = asyncio.current_task()
         try:
+            # The MCP client is the slowest import of the agent; load it off the main thread
+            from mcp import ClientSession
             console.print("[cyan]Starting MCP server connection...[/]")
             # This function runs in a separate thread with its own event loop
-            async with stdio_client(server_params) as (read, write):
-                console.print("[cyan]Established stdio connection with MCP server[/]")
+            async with self._connect(env) as streams:
+                read, write = streams[:2]
+                console.print(f"[cyan]Established {self.server_url or 'stdio'} connection with MCP server[/]")
                 # Create the session
                 async with ClientSession(read, write) as session:
                     self._session = session
+                    self._loop = asyncio.get_running_loop()
                     
                     # Initialize the session
                     console.print("[cyan]Initializing MCP session...[/]")
@@ -68,32 +107,80 @@ class ActionLayer:
                     # Get the tools
                     console.print("[cyan]Requesting available tools...[/]")
                     tools_result = await session.list_tools()
-                    self.tools = tools_result.tools
+                    self._load_tools(tools_result.tools)
                     console.print(f"[green]Received {len(self.tools)} tools from MCP server[/]")
+                    if "server_stats" in self._dispatch:
+                        stats = await session.call_tool("server_stats", arguments={})
+                        self.server_pid = json.loads(stats.content[0].text).get("pid")
                     
                     # Signal that initialization is complete
                     self.result_queue.put(("init_complete", self.tools))
                     
-                    # Keep the session alive
+                    # Keep the session alive until stop(); leaving the async context managers
+                    # closes the session and the stdio transport, which ends the server process
                     console.print("[cyan]MCP server session ready and waiting for commands[/]")
-                    while True:
-                        await asyncio.sleep(1)
+                    self._stop_event = asyncio.Event()
+                    if not self._stop_requested.is_set():
+                        await self._stop_event.wait()
                         
+        except asyncio.CancelledError:
+            console.print("[yellow]MCP session cancelled before it was ready[/]")
+            self.result_queue.put(("init_error", "cancelled"))
         except Exception as e:
-            console.print(f"[bold red]Error in MCP server thread: {e}[/]")
-            import traceback
-            traceback.print_exc()
+            if self._stop_requested.is_set():
+                # Errors from streams torn down while stopping are expected
+                console.print(f"[dim]MCP session closed during shutdown: {e}[/]")
+            else:
+                console.print(f"[bold red]Error in MCP server thread: {e}[/]")
+                import traceback
+                traceback.print_exc()
             self.result_queue.put(("init_error", str(e)))
+        finally:
+            # Anything still running here would only be cancelled silently by asyncio.run
+            current = asyncio.current_task()
+            leftovers = [task for task in asyncio.all_tasks() if task is not current]
+            self._leftover_tasks = [getattr(task.get_coro(), "__qualname__", task.get_name()) for task in leftovers]
+            for task in leftovers:
+                task.cancel()
+    
+    def _connect(self, env):
+        """Transport to the server: a child process over stdio, or the shared server at server_url"""
+        if self.server_url is None:
+            from mcp import StdioServerParameters
+            from mcp.client.stdio import stdio_client
+            return stdio_client(StdioServerParameters(command="python", args=["paint_mcp_tools.py"], env=env))
+        if self.server_url.rstrip("/").endswith("/sse"):
+            from mcp.client.sse import sse_client
+            return sse_client(self.server_url)
+        from mcp.client.streamable_http import streamablehttp_client
+        return streamablehttp_client(self.server_url)
+
+    def _submit(self, coro) -> concurrent.futures.Future:
+        """Schedule a coroutine on the session loop, tracked until it finishes so stop() can cancel it"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        with self._inflight_lock:
+            self._inflight.add(future)
+        future.add_done_callback(self._forget_inflight)
+        return future
+    
+    def _forget_inflight(self, future) -> None:
+        with self._inflight_lock:
+            self._inflight.discard(future)
             
+    def _load_tools(self, tools):
+        """Store the tools and compile their schemas into the dispatch table"""
+        self.tools = tools
+        self._dispatch = compile_tools(tools)
+        
     def get_tools(self):
         """Get the available tools"""
         # Wait for tools to be loaded
         if not self.tools:
             try:
                 console.print("[cyan]Waiting for tools to be loaded from MCP server...[/]")
-                result_type, result_value = self.result_queue.get(timeout=10)
+                result_type, result_value = self.result_queue.get(timeout=15)
                 if result_type == "init_complete":
-                    self.tools = result_value
+                    self._load_tools(result_value)
                     console.print(f"[green]Tools loaded successfully: {len(self.tools)} tools available[/]")
                 else:
                     console.print(f"[bold red]Error initializing tools: {result_value}[/]")
@@ -109,26 +196,62 @@ class ActionLayer:
             if tool_call.name == "show_reasoning":
                 return self._handle_show_reasoning(tool_call)
                 
-            # Create a new event loop for each tool execution
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # Use wait_for with a shorter timeout to prevent hanging
+            # Scene queries are answered from the local scene graph without a round trip,
+            # unless a shared server's canvas also holds other clients' shapes
+            if tool_call.name == "query_scene" and self.server_url is None:
+                return self._handle_query_scene(tool_call)
+                
+            # Scene specs are compiled locally and drawn as one batch
+            if tool_call.name == "compose_scene" and self.server_url is None:
+                return self._handle_compose_scene(tool_call)
+                
+            # Validate and coerce arguments before any MCP round trip
+            compiled = self._dispatch.get(tool_call.name)
+            if compiled is None:
+                return ToolResult(
+                    success=False,
+                    content="",
+                    error=f"Tool not found: {tool_call.name}"
+                )
+            try:
+                processed_args, fingerprint = self._prepare_call(compiled, tool_call)
+            except ToolArgumentError as e:
+                console.print(f"[bold yellow]Rejected call to {tool_call.name}: {e}[/]")
+                return ToolResult(
+                    success=False,
+                    content="",
+                    error=str(e)
+                )
+                
+            if self._loop is None or self._stop_requested.is_set():
+                return ToolResult(
+                    success=False,
+                    content="",
+                    error="MCP session is not ready"
+                )
+                
+            # Run the call on the session's own event loop so a timeout can cancel it there
             tool_name = tool_call.name
-            console.print(f"[cyan]Starting execution of tool: [bold]{tool_name}[/][/]")
+            timeout = self.timeouts.timeout_for(tool_name)
+            console.print(f"[cyan]Starting execution of tool: [bold]{tool_name}[/] (timeout {timeout:.1f}s)[/]")
             
+            start = time.perf_counter()
+            future = self._submit(self._execute_tool_async(tool_call, processed_args))
             try:
-                result = loop.run_until_complete(
-                    asyncio.wait_for(
-                        self._execute_tool_async(tool_call), 
-                        timeout=4  # Reduced from 30 to 5 seconds
-                    )
-                )
-                loop.close()
+                result = future.result(timeout=timeout)
+                self.timeouts.record(tool_name, time.perf_counter() - start)
+                if fingerprint is not None:
+                    self._timed_out_requests.pop(fingerprint, None)
                 console.print(f"[green]Tool [bold]{tool_name}[/] completed successfully[/]")
+                self._update_scene(tool_call, processed_args, result)
                 return result
-            except asyncio.TimeoutError:
-                console.print(f"[bold yellow]Tool [bold]{tool_name}[/] execution timed out after 5 seconds[/]")
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                self.timeouts.record(tool_name, time.perf_counter() - start, timed_out=True)
+                if fingerprint is not None:
+                    self._timed_out_requests[fingerprint] = tool_call.request_id
+                    self._unreconciled_requests[tool_call.request_id] = (tool_call, processed_args)
+                console.print(f"[bold yellow]Tool [bold]{tool_name}[/] execution timed out after {timeout:.1f} seconds[/]")
                 # Generic timeout handler for all tools
                 return ToolResult(
                     success=False,
@@ -146,6 +269,281 @@ class ActionLayer:
                 error=f"Error executing tool: {str(e)}"
             )
     
+    def _coerce_call(self, compiled, tool_call: ToolInput) -> dict:
+        """Coerce a call's arguments, writing adjusted coordinates back into the call"""
+        processed_args = compiled.coerce(tool_call.args)
+        if compiled.is_drawing:
+            # Keep the adjusted coordinates visible in the agent's history
+            tool_call.args.update(
+                (coord, processed_args[coord]) for coord in COORDINATE_PARAMS if coord in processed_args
+            )
+        return processed_args
+    
+    def _prepare_call(self, compiled, tool_call: ToolInput):
+        """Coerce a call's arguments and tag it with a request ID, returning (arguments, fingerprint)"""
+        processed_args = self._coerce_call(compiled, tool_call)
+            
+        # Tag idempotent tools with a request ID; retrying a timed-out call reuses its ID
+        # so the server returns the original result instead of drawing again
+        fingerprint = None
+        if "request_id" in compiled.coercers:
+            processed_args.pop("request_id", None)
+            fingerprint = (tool_call.name, json.dumps(processed_args, sort_keys=True))
+            request_id = self._timed_out_requests.get(fingerprint) or uuid.uuid4().hex
+            tool_call.request_id = request_id
+            processed_args["request_id"] = request_id
+        return processed_args, fingerprint
+    
+    def execute_batch(self, tool_calls: List[ToolInput]) -> List[ToolResult]:
+        """Run calls in order in a single pass on the session loop.
+
+        Every call is validated before anything is sent, so a bad argument
+        rejects the whole batch. Calls still pending when the batch times out
+        are left for reconcile_timeouts like a single timed-out call.
+        """
+        prepared = []
+        for tool_call in tool_calls:
+            compiled = self._dispatch.get(tool_call.name)
+            if compiled is None:
+                raise ToolArgumentError(f"Tool not found: {tool_call.name}")
+            processed_args, fingerprint = self._prepare_call(compiled, tool_call)
+            prepared.append((tool_call, processed_args, fingerprint))
+        if self._loop is None or self._stop_requested.is_set():
+            return [ToolResult(success=False, content="", error="MCP session is not ready") for _ in tool_calls]
+        
+        timeout = sum(self.timeouts.timeout_for(tool_call.name) for tool_call in tool_calls)
+        console.print(f"[cyan]Executing a batch of {len(tool_calls)} calls (timeout {timeout:.1f}s)[/]")
+        completed = []
+        future = self._submit(self._execute_batch_async(prepared, completed))
+        try:
+            future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            console.print(f"[bold yellow]Batch timed out after {len(completed)} of {len(tool_calls)} calls[/]")
+        
+        results = []
+        for index, (tool_call, processed_args, fingerprint) in enumerate(prepared):
+            if index < len(completed):
+                result, elapsed = completed[index]
+                self.timeouts.record(tool_call.name, elapsed)
+                if fingerprint is not None:
+                    self._timed_out_requests.pop(fingerprint, None)
+                self._update_scene(tool_call, processed_args, result)
+            else:
+                if fingerprint is not None:
+                    self._timed_out_requests[fingerprint] = tool_call.request_id
+                    self._unreconciled_requests[tool_call.request_id] = (tool_call, processed_args)
+                result = ToolResult(
+                    success=False,
+                    content=f"Tool {tool_call.name} execution timed out but the action may have completed",
+                    error="No response received from tool within timeout period"
+                )
+            results.append(result)
+        return results
+    
+    async def _execute_batch_async(self, prepared, completed: list) -> None:
+        for tool_call, processed_args, _ in prepared:
+            start = time.perf_counter()
+            try:
+                result = await self._session.call_tool(tool_call.name, arguments=processed_args)
+                text = " ".join(item.text if hasattr(item, 'text') else str(item) for item in result.content)
+                tool_result = ToolResult(success=not result.isError, content=text,
+                                         error=text if result.isError else None)
+            except Exception as e:
+                tool_result = ToolResult(success=False, content="", error=str(e))
+            completed.append((tool_result, time.perf_counter() - start))
+    
+    def _handle_compose_scene(self, tool_call: ToolInput) -> ToolResult:
+        """Compile a scene spec against the current scene and draw it as one batch"""
+        try:
+            compiled = self._dispatch.get(tool_call.name)
+            args = compiled.coerce(tool_call.args) if compiled else tool_call.args
+            if "spec" not in args:
+                raise ToolArgumentError("compose_scene: missing required argument 'spec'")
+            compiler = LayoutCompiler(self.scene)
+            calls = compiler.compile(args["spec"])
+            results = self.execute_batch(calls)
+        except (ToolArgumentError, LayoutError) as e:
+            return ToolResult(
+                success=False,
+                content="",
+                error=str(e)
+            )
+        
+        drawn = []
+        for object_id, call, result in zip(compiler.order, calls, results):
+            item = {"id": object_id, "tool": call.name, "args": call.args}
+            if not result.success or "Error" in result.content:
+                item["error"] = result.error or result.content
+            drawn.append(item)
+        failed = sum(1 for item in drawn if "error" in item)
+        return ToolResult(
+            success=failed < len(drawn),
+            content=json.dumps({"drawn": drawn, "failed": failed, "notes": compiler.notes}),
+            error=f"{failed} of {len(drawn)} objects failed" if failed else None
+        )
+    
+    def reconcile_timeouts(self) -> List[Tuple[str, ToolResult]]:
+        """Fetch results of timed-out calls that have since completed on the server"""
+        if not self._unreconciled_requests or self._loop is None or self._stop_requested.is_set():
+            return []
+        
+        reconciled = []
+        for request_id in list(self._unreconciled_requests):
+            future = self._submit(self._lookup_request(request_id))
+            try:
+                result = future.result(timeout=self.timeouts.timeout_for("lookup_request"))
+            except Exception as e:
+                future.cancel()
+                console.print(f"[dim]Could not look up request {request_id}: {e}[/]")
+                continue
+            if result is not None:
+                console.print(f"[green]Late result received for request {request_id}: {result.content[:100]}[/]")
+                tool_call, processed_args = self._unreconciled_requests.pop(request_id)
+                self._update_scene(tool_call, processed_args, result)
+                reconciled.append((request_id, result))
+        return reconciled
+    
+    async def _lookup_request(self, request_id: str) -> Optional[ToolResult]:
+        """Ask the server for the stored result of a request, or None if it has not finished"""
+        result = await self._session.call_tool("lookup_request", arguments={"request_id": request_id})
+        if result.isError:
+            return None
+        return ToolResult(
+            success=True,
+            content=" ".join(item.text if hasattr(item, 'text') else str(item) for item in result.content)
+        )
+    
+    def reset_canvas(self) -> ToolResult:
+        """Clear the server's canvas and forget per-run request state"""
+        self._timed_out_requests.clear()
+        self._unreconciled_requests.clear()
+        self.scene.clear()
+        self.drawlog.clear()
+        return self.execute_tool(ToolInput(name="reset_canvas", args={}))
+    
+    def server_stats(self) -> Optional[dict]:
+        """Return the server's process stats, or None if it does not respond"""
+        result = self.execute_tool(ToolInput(name="server_stats", args={}))
+        if not result.success:
+            return None
+        try:
+            return json.loads(result.content)
+        except ValueError:
+            return None
+    
+    def pending_tasks(self) -> Optional[int]:
+        """Number of asyncio tasks alive on the session's event loop, or None without a session"""
+        if self._loop is None or self._stop_requested.is_set():
+            return None
+        
+        async def count():
+            # Not counting the task running this coroutine
+            return len(asyncio.all_tasks()) - 1
+        
+        future = asyncio.run_coroutine_threadsafe(count(), self._loop)
+        try:
+            return future.result(timeout=5)
+        except Exception:
+            future.cancel()
+            return None
+    
+    def snapshot(self, scale: float = 1.0, region: Optional[Tuple[int, int, int, int]] = None,
+                 format: str = "png", since_version: Optional[int] = None) -> Optional[dict]:
+        """Fetch a canvas snapshot: the server's metadata plus decoded image bytes under "images".
+
+        Snapshots bypass the normal result path so image data never ends up
+        in logs or in the agent's history.
+        """
+        if self._loop is None or self._stop_requested.is_set():
+            return None
+        args = {"scale": scale, "format": format}
+        if region is not None:
+            args.update(zip(("x1", "y1", "x2", "y2"), region))
+        if since_version is not None:
+            args["since_version"] = since_version
+        future = self._submit(self._session.call_tool("get_canvas_snapshot", arguments=args))
+        start = time.perf_counter()
+        try:
+            result = future.result(timeout=self.timeouts.timeout_for("get_canvas_snapshot"))
+        except Exception as e:
+            future.cancel()
+            console.print(f"[yellow]Canvas snapshot failed: {e}[/]")
+            return None
+        self.timeouts.record("get_canvas_snapshot", time.perf_counter() - start)
+        if result.isError:
+            console.print(f"[yellow]Canvas snapshot failed: {result.content[0].text if result.content else ''}[/]")
+            return None
+        snapshot = json.loads(result.content[0].text)
+        snapshot["images"] = [base64.b64decode(item.data) for item in result.content if item.type == "image"]
+        return snapshot
+    
+    def canvas_view(self):
+        """Map the server's headless canvas read-only, or None if it is not shared.
+
+        The view reads the server's pixels in place; its version tells
+        whether they changed since a previous look.
+        """
+        result = self.execute_tool(ToolInput(name="get_canvas_handle", args={}))
+        if not result.success:
+            return None
+        try:
+            handle = json.loads(result.content)
+        except ValueError:
+            return None
+        if self._canvas_view is None or self._canvas_view.path != handle["path"]:
+            from canvas import SharedCanvasView
+            self._canvas_view = SharedCanvasView(handle["path"])
+        return self._canvas_view
+    
+    def preview_scene(self, tool_call: ToolInput) -> Optional[str]:
+        """Canvas summary as it would read after a call succeeds, without running the call.
+
+        Coerces the call's arguments the way execute_tool will, so the call's recorded
+        arguments already match. Returns None for calls whose effect cannot be predicted.
+        """
+        if tool_call.name in ("open_paint", "reset_canvas"):
+            return SceneGraph().summary()
+        if tool_call.name == "show_reasoning":
+            return self.scene.summary()
+        compiled = self._dispatch.get(tool_call.name)
+        if compiled is None or tool_call.name not in SHAPE_KINDS:
+            return None
+        try:
+            processed_args = self._coerce_call(compiled, tool_call)
+        except ToolArgumentError:
+            return None
+        scene = copy.deepcopy(self.scene)
+        scene.add_from_call(tool_call.name, processed_args)
+        return scene.summary()
+    
+    def _update_scene(self, tool_call: ToolInput, processed_args: dict, result: ToolResult) -> None:
+        """Mirror a completed canvas change in the client-side scene graph and drawing log"""
+        if not result.success or "Error" in result.content or "Paint is not open" in result.content:
+            return
+        if tool_call.name in ("open_paint", "reset_canvas"):
+            self.scene.clear()
+            self.drawlog.record("clear", {})
+        elif tool_call.name in SHAPE_KINDS:
+            self.scene.add_from_call(tool_call.name, processed_args, request_id=tool_call.request_id)
+            self.drawlog.record(tool_call.name, processed_args)
+    
+    def _handle_query_scene(self, tool_call: ToolInput) -> ToolResult:
+        """Special handler for query_scene, answered from the local scene graph"""
+        try:
+            compiled = self._dispatch.get(tool_call.name)
+            args = compiled.coerce(tool_call.args) if compiled else tool_call.args
+            return ToolResult(
+                success=True,
+                content=json.dumps(self.scene.query(**args))
+            )
+        except (ToolArgumentError, ValueError, TypeError) as e:
+            return ToolResult(
+                success=False,
+                content="",
+                error=str(e)
+            )
+    
     def _handle_show_reasoning(self, tool_call: ToolInput) -> ToolResult:
         """Special handler for show_reasoning tool"""
         try:
@@ -163,7 +561,7 @@ class ActionLayer:
             # Return the result without rendering it again
             return ToolResult(
                 success=True,
-                content="Reasoning steps displayed successfully."
+                content=REASONING_DISPLAYED
             )
         except Exception as e:
             console.print(f"[bold red]Error in show_reasoning: {e}[/]")
@@ -173,84 +571,11 @@ class ActionLayer:
                 error=str(e)
             )
     
-    async def _execute_tool_async(self, tool_call: ToolInput) -> ToolResult:
-        """Execute a tool asynchronously"""
+    async def _execute_tool_async(self, tool_call: ToolInput, processed_args: dict) -> ToolResult:
+        """Execute a tool asynchronously with already coerced arguments"""
         func_name = tool_call.name
-        arguments = tool_call.args
-        
-        # Find the matching tool
-        tool = next((t for t in self.tools if t.name == func_name), None)
-        if not tool:
-            return ToolResult(
-                success=False,
-                content="",
-                error=f"Tool not found: {func_name}"
-            )
         
         try:
-            # Define valid drawing boundaries
-            MIN_X = 20
-            MAX_X = 1830
-            MIN_Y = 160
-            MAX_Y = 960
-            
-            # For drawing tools, enforce both coordinate uniqueness and canvas boundaries
-            drawing_tools = ["draw_rectangle", "draw_oval", "draw_up_arrow", 
-                             "draw_down_arrow", "draw_left_arrow", "draw_right_arrow",
-                             "draw_2D_rectangle", "draw_2D_oval", "draw_2D_up_arrow_shape",
-                             "draw_2D_right_arrow_shape", "draw_2D_down_arrow_shape", 
-                             "draw_2D_left_arrow_shape"]
-                             
-            if func_name in drawing_tools:
-                # 1. First ensure coordinates are unique
-                if "x1" in arguments and "x2" in arguments and arguments["x1"] == arguments["x2"]:
-                    console.print(f"[yellow]Warning: x1 equals x2 in {func_name}. Auto-adjusting x2.[/]")
-                    arguments["x2"] = int(arguments["x2"]) + 5  # Add offset
-                    
-                if "y1" in arguments and "y2" in arguments and arguments["y1"] == arguments["y2"]:
-                    console.print(f"[yellow]Warning: y1 equals y2 in {func_name}. Auto-adjusting y2.[/]")
-                    arguments["y2"] = int(arguments["y2"]) + 5  # Add offset
-                
-                # 2. Then constrain all coordinates to the canvas boundaries
-                for coord in ['x1', 'x2', 'y1', 'y2']:
-                    if coord in arguments:
-                        original_val = arguments[coord]
-                        # Convert to int for comparison
-                        val = int(original_val)
-                        
-                        # Apply appropriate bounds based on coordinate type
-                        if coord.startswith('x'):
-                            bounded_val = max(MIN_X, min(MAX_X, val))
-                        else:  # y coordinates
-                            bounded_val = max(MIN_Y, min(MAX_Y, val))
-                        
-                        # Update if needed and log the change
-                        if bounded_val != val:
-                            console.print(f"[yellow]Adjusted {coord} from {val} to {bounded_val} to stay within canvas bounds[/]")
-                            arguments[coord] = bounded_val
-
-            # Process arguments according to schema
-            schema_properties = tool.inputSchema.get('properties', {})
-            processed_args = {}
-            
-            for param_name, param_info in schema_properties.items():
-                if param_name in arguments:
-                    expected_type = param_info.get('type', 'string')
-                    value = arguments[param_name]
-                    
-                    console.print(f"[dim cyan]Processing argument {param_name} with expected type {expected_type}[/]")
-                    
-                    if expected_type == 'integer':
-                        processed_args[param_name] = int(value)
-                    elif expected_type == 'number':
-                        processed_args[param_name] = float(value)
-                    elif expected_type == 'array' and isinstance(value, str):
-                        processed_args[param_name] = [
-                            int(x.strip()) for x in value.strip('[]').split(',')
-                        ]
-                    else:
-                        processed_args[param_name] = str(value)
-            
             console.print(f"[cyan]Processed arguments: {processed_args}[/]")
             console.print(f"[cyan]Sending request to MCP server for tool: [bold]{func_name}[/][/]")
             
@@ -287,9 +612,12 @@ class ActionLayer:
                 
             console.print(f"[green]Processed result for tool [bold]{func_name}[/]: {content_str[:100]}...[/]")
             
+            # A tool that raised on the server comes back as an error result, not an exception
+            is_error = bool(getattr(result, "isError", False))
             return ToolResult(
-                success=True,
-                content=content_str
+                success=not is_error,
+                content=content_str,
+                error=content_str if is_error else None
             )
             
         except Exception as e:
@@ -302,8 +630,83 @@ class ActionLayer:
                 error=str(e)
             )
             
-    def stop(self):
-        """Stop the action layer and clean up resources"""
-        # Just letting the thread terminate naturally is enough
-        # since async context managers will be closed properly
-        pass 
\ No newline at end of file
+    def stop(self, timeout: float = 10.0) -> dict:
+        """Shut the session down and return a report of anything left behind.
+
+        New calls are refused and calls in flight are cancelled. The session
+        and stdio transport are then closed, which ends the server process,
+        and the server thread gets `timeout` seconds to finish. A server
+        process still running after that is killed; a shared server at
+        server_url is only disconnected from. Stopping twice returns the
+        first report.
+        """
+        if self._stop_report is not None:
+            return self._stop_report
+        start = time.monotonic()
+        
+        # Keep the learned tool latencies for the next run
+        self.timeouts.save()
+        
+        self._stop_requested.set()
+        with self._inflight_lock:
+            inflight = list(self._inflight)
+        cancelled = sum(future.cancel() for future in inflight)
+        
+        loop, stop_event, main_task = self._loop, self._stop_event, self._main_task
+        if loop is not None or main_task is not None:
+            try:
+                if stop_event is not None:
+                    loop.call_soon_threadsafe(stop_event.set)
+                elif main_task is not None:
+                    main_task.get_loop().call_soon_threadsafe(main_task.cancel)
+            except RuntimeError:
+                # The loop has already closed
+                pass
+        
+        server_killed = False
+        if self.server_thread is not None:
+            self.server_thread.join(timeout)
+            if self.server_thread.is_alive():
+                server_killed = self._kill_server()
+                self.server_thread.join(1.0)
+        
+        self._loop = None
+        self._session = None
+        report = {
+            "cancelled_calls": cancelled,
+            "thread_alive": self.server_thread is not None and self.server_thread.is_alive(),
+            "leftover_tasks": list(self._leftover_tasks),
+            "server_pid": self.server_pid,
+            "server_killed": server_killed,
+            "elapsed_s": round(time.monotonic() - start, 3),
+        }
+        report["clean"] = not (report["thread_alive"] or report["leftover_tasks"] or server_killed)
+        if not report["clean"]:
+            console.print(f"[bold yellow]Action layer stopped with leftovers: {report}[/]")
+        self._stop_report = report
+        return report
+    
+    def _kill_server(self) -> bool:
+        """Kill the server process if it outlived the session shutdown; returns True if it was killed"""
+        if self.server_pid is None or self.server_url is not None:
+            # A shared server belongs to whoever started it
+            return False
+        try:
+            import psutil
+        except ImportError:
+            psutil = None
+        if psutil is not None:
+            try:
+                process = psutil.Process(self.server_pid)
+                if process.status() == psutil.STATUS_ZOMBIE:
+                    return False
+                process.kill()
+                return True
+            except psutil.Error:
+                return False
+        try:
+            os.kill(self.server_pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            return True
+        except OSError:
+            return False
+ 
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""Batch image generation: run many agent sessions concurrently.
+
+Usage:
+    python batch.py queries.jsonl --out batch_output --concurrency 4 --llm-concurrency 2 --llm-rpm 60
+
+Each line of the input file is a JSON object with a "description" and a
+"style_preference" (or "style"). Every query gets its own agent, MCP server
+session and headless canvas; sessions are leased from a warm pool of server
+processes unless --no-pool is given. Results are appended to results.jsonl in the
+output directory as each run finishes, next to the run's image, state log and
+drawing log (see drawlog.py); run numbers continue from any runs already in
+the directory. With --run-store, every decision and tool call is also written
+to a SQLite database for querying across runs (see runstore.py).
+"""
+from perception import PerceptionLayer
+from memory import MemoryLayer
+from decision import DecisionLayer
+from action import ActionLayer
+from models import ToolInput, UserQuery
+from main import run_agent_loop
+from guard import LoopGuard
+from speculate import ResultPredictor, Speculator
+from plancache import PlanCache
+from runstore import RunStore
+import llmclient
+from pool import McpServerPool
+from rich.console import Console
+import argparse
+import asyncio
+import functools
+import json
+import os
+import re
+import time
+
+console = Console()
+
+# Longest a session waits for a pooled server before the run is recorded as failed
+LEASE_TIMEOUT = 300.0
+
+
+def load_queries(path: str) -> list:
+    """Read queries from a JSONL file, skipping blank lines"""
+    queries = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                queries.append(UserQuery.from_input(json.loads(line)))
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: {e}")
+    return queries
+
+
+def next_run_index(output_dir: str) -> int:
+    """First run index whose files would not overwrite a run already in the output directory"""
+    indices = [int(match.group(1)) for match in map(re.compile(r"run_(\d+)").match, os.listdir(output_dir))
+               if match]
+    return max(indices, default=-1) + 1
+
+
+def run_session(index: int, query: UserQuery, output_dir: str, pool=None, make_guard=LoopGuard,
+                make_speculator=Speculator, plan_cache=None, run_store=None,
+                lease_timeout: float = LEASE_TIMEOUT) -> dict:
+    """Run one complete agent session on its own MCP server and canvas"""
+    start = time.perf_counter()
+    record = {
+        "index": index,
+        "description": query.description,
+        "style_preference": query.style_preference,
+        "image": None,
+        "final_answer": None,
+        "iterations": 0,
+        "stop_reason": None,
+        "speculation": None,
+        "model_tiers": None,
+        "error": None,
+    }
+    try:
+        if pool is not None:
+            with pool.lease(timeout=lease_timeout) as action:
+                _run_agent(action, index, query, output_dir, record, make_guard, make_speculator,
+                           plan_cache, run_store)
+        else:
+            action = ActionLayer(backend="headless")
+            try:
+                if not action.start_mcp_server():
+                    raise RuntimeError("failed to start MCP server")
+                _run_agent(action, index, query, output_dir, record, make_guard, make_speculator,
+                           plan_cache, run_store)
+            finally:
+                action.stop()
+    except Exception as e:
+        record["error"] = str(e)
+    record["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def _run_agent(action: ActionLayer, index: int, query: UserQuery, output_dir: str, record: dict,
+               make_guard=LoopGuard, make_speculator=Speculator, plan_cache=None, run_store=None) -> None:
+    """Drive one query to completion on a started action layer, filling in the record"""
+    run_name = f"run_{index:04d}"
+    image_path = os.path.join(output_dir, f"{run_name}.png")
+    tools = action.get_tools()
+    if not tools:
+        raise RuntimeError("failed to load tools")
+
+    perception = PerceptionLayer()
+    memory = MemoryLayer()
+    decision = DecisionLayer()
+    system_prompt = decision.create_system_prompt(tools)
+    processed_query = perception.process_user_query(query)
+    speculator = make_speculator(decision, action)
+    recorder = None
+    if run_store is not None:
+        recorder = run_store.start_run(query.description, query.style_preference,
+                                       label=os.path.join(output_dir, run_name))
+    run_agent_loop(
+        processed_query, perception, memory, decision, action, system_prompt,
+        state_file=os.path.join(output_dir, f"{run_name}_state.txt"),
+        drawlog_file=os.path.join(output_dir, f"{run_name}.drawlog"),
+        guard=make_guard(),
+        speculator=speculator,
+        user_query=query,
+        plan_cache=plan_cache,
+        recorder=recorder
+    )
+
+    saved = action.execute_tool(ToolInput(name="save_canvas", args={"path": os.path.abspath(image_path)}))
+    if saved.success and os.path.exists(image_path):
+        record["image"] = image_path
+    else:
+        record["error"] = saved.error or saved.content
+
+    state = memory.get_state()
+    record["final_answer"] = state.final_answer
+    record["iterations"] = state.iteration
+    record["stop_reason"] = state.stop_reason
+    record["speculation"] = speculator.stats()
+    record["model_tiers"] = decision.router.stats()
+
+
+async def run_batch(queries: list, output_dir: str, concurrency: int, pool=None,
+                    make_guard=LoopGuard, make_speculator=Speculator, plan_cache=None, run_store=None) -> list:
+    """Run all queries with at most `concurrency` sessions; LLM requests are limited by the shared client"""
+    os.makedirs(output_dir, exist_ok=True)
+    session_slots = asyncio.Semaphore(concurrency)
+
+    async def run_one(index, query):
+        async with session_slots:
+            console.print(f"[cyan]Starting run {index}: {query.description[:60]}[/]")
+            # ActionLayer and DecisionLayer are blocking, so each session runs on a worker thread
+            return await asyncio.to_thread(run_session, index, query, output_dir, pool,
+                                           make_guard, make_speculator, plan_cache, run_store)
+
+    records = []
+    results_path = os.path.join(output_dir, "results.jsonl")
+    # Number on from earlier runs in the directory, so their files and results.jsonl lines stay together
+    first = next_run_index(output_dir)
+    tasks = [asyncio.create_task(run_one(index, query)) for index, query in enumerate(queries, start=first)]
+    with open(results_path, "a") as results_file:
+        for finished in asyncio.as_completed(tasks):
+            record = await finished
+            records.append(record)
+            results_file.write(json.dumps(record) + "\n")
+            results_file.flush()
+            status = "[green]done[/]" if record["error"] is None else f"[red]failed: {record['error']}[/]"
+            console.print(f"Run {record['index']} {status} in {record['elapsed_s']}s ({len(records)}/{len(queries)})")
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate images for a batch of queries")
+    parser.add_argument("queries", help="JSONL file with description and style_preference per line")
+    parser.add_argument("--out", default="batch_output", help="directory for images, state logs and results.jsonl")
+    parser.add_argument("--concurrency", type=int, default=4, help="agent sessions running at once")
+    parser.add_argument("--llm-concurrency", type=int, default=2, help="LLM requests in flight across all sessions")
+    parser.add_argument("--llm-rpm", type=float, default=None, help="LLM requests per minute allowed by the quota")
+    parser.add_argument("--llm-tpm", type=float, default=None, help="LLM tokens per minute allowed by the quota")
+    parser.add_argument("--no-pool", action="store_true", help="spawn a fresh MCP server per run instead of leasing warm ones")
+    parser.add_argument("--max-leases", type=int, default=50, help="recycle a pooled server after this many runs")
+    parser.add_argument("--max-rss-mb", type=float, default=500.0, help="recycle a pooled server above this resident memory")
+    parser.add_argument("--max-iterations", type=int, default=40, help="stop a run after this many tool calls")
+    parser.add_argument("--max-seconds", type=float, default=600.0, help="stop a run after this much wall-clock time")
+    parser.add_argument("--max-repeats", type=int, default=3, help="stop a run after this many repeated calls")
+    parser.add_argument("--no-speculate", action="store_true", help="do not request decisions while tools are running")
+    parser.add_argument("--plan-cache", default="logs/plan_cache.json", help="file of cached plans to reuse")
+    parser.add_argument("--no-plan-cache", action="store_true", help="plan every query from scratch")
+    parser.add_argument("--run-store", default=os.getenv("PAINT_RUN_STORE"),
+                        help="SQLite database to record runs, decisions and tool calls in")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    client = llmclient.configure(max_in_flight=args.llm_concurrency, requests_per_minute=args.llm_rpm,
+                                 tokens_per_minute=args.llm_tpm)
+    make_guard = functools.partial(LoopGuard, max_iterations=args.max_iterations, max_seconds=args.max_seconds,
+                                   max_repeats=args.max_repeats)
+    # Result templates learned in one run let the others speculate from their first call
+    make_speculator = functools.partial(Speculator, predictor=ResultPredictor(), enabled=not args.no_speculate)
+    plan_cache = None if args.no_plan_cache else PlanCache(args.plan_cache)
+    run_store = RunStore(args.run_store) if args.run_store else None
+    console.print(f"[bold cyan]Running {len(queries)} queries with {args.concurrency} concurrent sessions[/]")
+    start = time.perf_counter()
+    pool = None
+    if not args.no_pool:
+        pool = McpServerPool(size=args.concurrency, max_leases=args.max_leases, max_rss_mb=args.max_rss_mb)
+        pool.start()
+    try:
+        records = asyncio.run(run_batch(queries, args.out, args.concurrency, pool, make_guard,
+                                        make_speculator, plan_cache, run_store))
+    finally:
+        if run_store is not None:
+            run_store.close()
+        if pool is not None:
+            console.print(f"[bold cyan]Pool stats:[/] {pool.stats()}")
+            pool.close()
+    succeeded = sum(1 for record in records if record["error"] is None)
+    speculated = [record["speculation"] for record in records if record["speculation"]]
+    attempts = sum(stats["attempts"] for stats in speculated)
+    if attempts:
+        hits = sum(stats["hits"] for stats in speculated)
+        console.print(f"[bold cyan]Speculative decisions:[/] {hits}/{attempts} used, "
+                      f"{sum(stats['saved_s'] for stats in speculated):.1f}s of LLM latency overlapped")
+    if plan_cache is not None:
+        console.print(f"[bold cyan]Plan cache:[/] {plan_cache.stats()}")
+    console.print(f"[bold cyan]LLM client:[/] {client.stats()}")
+    tiers = {}
+    for record in records:
+        for tier, stats in (record["model_tiers"] or {}).items():
+            totals = tiers.setdefault(tier, {"calls": 0, "seconds": 0.0, "invalid": 0})
+            totals["calls"] += stats["calls"]
+            totals["seconds"] += stats["calls"] * stats["mean_latency_s"]
+            totals["invalid"] += stats["invalid"]
+    for tier, totals in tiers.items():
+        console.print(f"[bold cyan]Model tier {tier}:[/] {totals['calls']} calls, "
+                      f"mean {totals['seconds'] / totals['calls']:.3f}s, {totals['invalid']} unusable replies")
+    console.print(f"[bold green]{succeeded}/{len(records)} runs succeeded in {time.perf_counter() - start:.1f}s[/]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,588 @@
+"""Micro-benchmarks for the agent's hot paths.
+
+Run all benchmarks with `python benchmark.py`, or a single one with
+`python benchmark.py dispatch --iterations 50000`.
+"""
+from types import SimpleNamespace
+import argparse
+import io
+import random
+import time
+
+from rich.console import Console
+
+console = Console()
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a benchmark function under a name"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def _report(label: str, elapsed: float, count: int) -> None:
+    per_item_us = elapsed / count * 1e6 if count else 0.0
+    console.print(f"  {label:<34} {elapsed * 1000:10.2f} ms total  {per_item_us:10.2f} µs/op")
+
+
+def _sample_tools():
+    """Tool objects shaped like the ones paint_mcp_tools.py advertises"""
+    coords = {
+        "properties": {
+            "x1": {"type": "integer"}, "y1": {"type": "integer"},
+            "x2": {"type": "integer"}, "y2": {"type": "integer"},
+        },
+        "required": ["x1", "y1", "x2", "y2"],
+    }
+    names = ["draw_2D_rectangle", "draw_2D_oval", "draw_2D_right_arrow_shape",
+             "draw_2D_left_arrow_shape", "draw_2D_up_arrow_shape", "draw_2D_down_arrow_shape"]
+    tools = [SimpleNamespace(name=name, inputSchema=coords) for name in names]
+    tools.insert(0, SimpleNamespace(name="open_paint", inputSchema={"properties": {}}))
+    tools.append(SimpleNamespace(
+        name="add_text_in_paint",
+        inputSchema={"properties": {"text": {"type": "string"}}, "required": ["text"]},
+    ))
+    return tools
+
+
+def _legacy_dispatch(tools, func_name, arguments):
+    """The per-call scan-and-branch argument processing the dispatch table replaced"""
+    tool = next((t for t in tools if t.name == func_name), None)
+    drawing_tools = ["draw_rectangle", "draw_oval", "draw_up_arrow",
+                     "draw_down_arrow", "draw_left_arrow", "draw_right_arrow",
+                     "draw_2D_rectangle", "draw_2D_oval", "draw_2D_up_arrow_shape",
+                     "draw_2D_right_arrow_shape", "draw_2D_down_arrow_shape",
+                     "draw_2D_left_arrow_shape"]
+    if func_name in drawing_tools:
+        for coord in ['x1', 'x2', 'y1', 'y2']:
+            if coord in arguments:
+                val = int(arguments[coord])
+                if coord.startswith('x'):
+                    bounded_val = max(20, min(1830, val))
+                else:
+                    bounded_val = max(160, min(960, val))
+                if bounded_val != val:
+                    arguments[coord] = bounded_val
+    processed_args = {}
+    for param_name, param_info in tool.inputSchema.get('properties', {}).items():
+        if param_name in arguments:
+            expected_type = param_info.get('type', 'string')
+            value = arguments[param_name]
+            if expected_type == 'integer':
+                processed_args[param_name] = int(value)
+            elif expected_type == 'number':
+                processed_args[param_name] = float(value)
+            else:
+                processed_args[param_name] = str(value)
+    return processed_args
+
+
+def _legacy_models():
+    """The pydantic history models the slotted dataclasses replaced"""
+    from pydantic import BaseModel
+    from typing import Any, Dict, List, Optional
+
+    class ToolInput(BaseModel):
+        name: str
+        args: Dict[str, Any] = {}
+        request_id: Optional[str] = None
+
+    class ToolResult(BaseModel):
+        success: bool
+        content: str
+        error: Optional[str] = None
+
+    class MemoryItem(BaseModel):
+        iteration: int
+        action: Optional[ToolInput] = None
+        result: Optional[ToolResult] = None
+
+    class AgentState(BaseModel):
+        iteration: int = 0
+        history: List[MemoryItem] = []
+        task_complete: bool = False
+        final_answer: Optional[str] = None
+
+    return SimpleNamespace(ToolInput=ToolInput, ToolResult=ToolResult, MemoryItem=MemoryItem,
+                           AgentState=AgentState, dump=lambda state: state.model_dump())
+
+
+@benchmark("dispatch")
+def bench_dispatch(iterations: int = 20000) -> None:
+    """Argument validation and coercion overhead per tool call"""
+    import dispatch
+
+    tools = _sample_tools()
+    drawing = [t.name for t in tools if t.name.startswith("draw_")]
+    rng = random.Random(0)
+    calls = [
+        (rng.choice(drawing), {"x1": rng.randint(20, 1830), "y1": str(rng.randint(160, 960)),
+                               "x2": rng.randint(20, 1830), "y2": rng.randint(160, 960)})
+        for _ in range(iterations)
+    ]
+
+    # Silence the clamping warnings so only dispatch cost is measured
+    dispatch.console.file = io.StringIO()
+
+    start = time.perf_counter()
+    for name, args in calls:
+        _legacy_dispatch(tools, name, dict(args))
+    _report("legacy scan + branch", time.perf_counter() - start, iterations)
+
+    start = time.perf_counter()
+    table = dispatch.compile_tools(tools)
+    compile_elapsed = time.perf_counter() - start
+    for name, args in calls:
+        table[name].coerce(dict(args))
+    _report("compiled dispatch table", time.perf_counter() - start, iterations)
+    _report("  (of which schema compilation)", compile_elapsed, 1)
+
+
+@benchmark("scene")
+def bench_scene(iterations: int = 2000) -> None:
+    """Scene graph queries against a canvas of 500 shapes"""
+    from scene import SceneGraph
+
+    rng = random.Random(0)
+    scene = SceneGraph()
+    for _ in range(500):
+        x, y = rng.randint(20, 1700), rng.randint(160, 900)
+        scene.add("oval", (x, y, x + rng.randint(5, 120), y + rng.randint(5, 60)))
+    boxes = []
+    for _ in range(iterations):
+        x, y = rng.randint(20, 1700), rng.randint(160, 900)
+        boxes.append((x, y, x + 100, y + 60))
+
+    start = time.perf_counter()
+    for box in boxes:
+        scene.overlapping(box)
+    _report("overlapping", time.perf_counter() - start, iterations)
+
+    start = time.perf_counter()
+    for box in boxes:
+        scene.containers_of(box)
+    _report("containers_of", time.perf_counter() - start, iterations)
+
+    count = max(1, iterations // 20)
+    start = time.perf_counter()
+    for _ in range(count):
+        scene.free_space(150, 100)
+    _report("free_space", time.perf_counter() - start, count)
+
+
+@benchmark("verify")
+def bench_verify(iterations: int = 50) -> None:
+    """Raster verification of the last shape on a full 1920x1080 canvas"""
+    from canvas import HeadlessCanvas
+    import verify
+
+    rng = random.Random(0)
+    canvas = HeadlessCanvas()
+    for _ in range(40):
+        x, y = rng.randint(20, 1700), rng.randint(160, 900)
+        canvas.draw_oval(x, y, x + rng.randint(20, 120), y + rng.randint(20, 60))
+    canvas.draw_text("benchmark label", 40, 1000)
+    canvas.draw_rectangle(272, 310, 559, 657)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        verify.changed_bbox(canvas.previous, canvas.pixels)
+    _report("snapshot diff", time.perf_counter() - start, iterations)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        verify.count_shapes(canvas.pixels)
+    _report("connected components", time.perf_counter() - start, iterations)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        verify.verify_last_change(canvas.previous, canvas.pixels, "rectangle", (272, 310, 559, 657), 41)
+    _report("full verify_task check", time.perf_counter() - start, iterations)
+
+
+@benchmark("snapshot")
+def bench_snapshot(iterations: int = 50) -> None:
+    """Canvas snapshots: uncached encoding vs the tile cache after small edits"""
+    from canvas import HeadlessCanvas
+    from snapshot import SnapshotCache, _encode
+    from PIL import Image
+    import numpy as np
+
+    rng = random.Random(0)
+    canvas = HeadlessCanvas()
+    for _ in range(40):
+        x, y = rng.randint(20, 1700), rng.randint(160, 900)
+        canvas.draw_rectangle(x, y, x + rng.randint(20, 120), y + rng.randint(20, 60))
+    cache = SnapshotCache(canvas)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        scaled = Image.fromarray(canvas.pixels).resize((960, 540), Image.BOX)
+        _encode(np.asarray(scaled), "png")
+    _report("uncached half-scale snapshot", time.perf_counter() - start, iterations)
+
+    cache.snapshot(0.5)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        cache.snapshot(0.5)
+    _report("repeated snapshot, no change", time.perf_counter() - start, iterations)
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        canvas.draw_oval(100 + i, 200, 140 + i, 230)
+        cache.snapshot(0.5)
+    _report("snapshot after a small draw", time.perf_counter() - start, iterations)
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        version = canvas.version
+        canvas.draw_oval(100 + i, 200, 140 + i, 230)
+        cache.changed_tiles(version)
+    _report("incremental tiles after a draw", time.perf_counter() - start, iterations)
+
+
+@benchmark("shared")
+def bench_shared(iterations: int = 50) -> None:
+    """Reading canvas pixels from another process: PNG + base64 transport vs a mapped file"""
+    from canvas import HeadlessCanvas, SharedCanvasView, shared_canvas_path
+    from snapshot import _encode
+    from PIL import Image
+    import base64
+    import numpy as np
+
+    canvas = HeadlessCanvas(shared_path=shared_canvas_path())
+    try:
+        for i in range(40):
+            canvas.draw_rectangle(40 + i * 40, 200, 80 + i * 40, 260)
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            payload = base64.b64encode(_encode(canvas.pixels, "png"))
+            np.asarray(Image.open(io.BytesIO(base64.b64decode(payload))))
+        _report("encode, base64 and decode", time.perf_counter() - start, iterations)
+
+        view = SharedCanvasView(canvas.shared_path)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            (view.pixels < 128).sum()
+        _report("mapped view, read in place", time.perf_counter() - start, iterations)
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            view.copy()
+        _report("mapped view, consistent copy", time.perf_counter() - start, iterations)
+    finally:
+        canvas.close()
+
+
+@benchmark("replay")
+def bench_replay(iterations: int = 20) -> None:
+    """Replaying a binary drawing log of 50 calls onto a blank canvas"""
+    from canvas import HeadlessCanvas
+    from drawlog import DrawLog, TOOL_IDS, replay
+    import os
+    import tempfile
+
+    rng = random.Random(0)
+    tools = [name for name in TOOL_IDS if name != "clear"]
+    log = DrawLog()
+    for _ in range(50):
+        name = rng.choice(tools)
+        x, y = rng.randint(20, 1700), rng.randint(160, 900)
+        log.record(name, {"x1": x, "y1": y, "x2": x + rng.randint(20, 120), "y2": y + rng.randint(20, 60),
+                          "text": "label", "x": x, "y": y})
+    fd, path = tempfile.mkstemp(suffix=".drawlog")
+    os.close(fd)
+    try:
+        log.save(path)
+        console.print(f"  log size: {os.path.getsize(path)} bytes")
+        start = time.perf_counter()
+        for _ in range(iterations):
+            replay(path, HeadlessCanvas(track_previous=False))
+        _report("replay one run", time.perf_counter() - start, iterations)
+    finally:
+        os.remove(path)
+
+
+@benchmark("text")
+def bench_text(iterations: int = 2000) -> None:
+    """Text rendering from the glyph atlas, after warm-up"""
+    from canvas import HeadlessCanvas, glyph_atlas
+    from PIL import Image, ImageDraw, ImageFont
+
+    canvas = HeadlessCanvas(track_previous=False)
+    short, long = "Label", "The quick brown fox jumps over the lazy dog. " * 4
+    glyph_atlas(10)
+
+    font = ImageFont.load_default()
+    start = time.perf_counter()
+    for _ in range(iterations // 10):
+        image = Image.new("L", (400, 20), 0)
+        ImageDraw.Draw(image).text((0, 0), short, fill=255, font=font)
+    _report("PIL draw.text, short label", time.perf_counter() - start, iterations // 10)
+
+    for label, text in (("atlas, short label", short), (f"atlas, {len(long)} characters", long)):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            canvas.draw_text(text, 100, 400)
+        _report(label, time.perf_counter() - start, iterations)
+
+
+@benchmark("paths")
+def bench_paths(iterations: int = 200) -> None:
+    """Coercing and rasterizing 1000-point paths"""
+    from canvas import HeadlessCanvas
+    from dispatch import _coerce_points
+    import json
+
+    rng = random.Random(0)
+    points = [[rng.randint(20, 1830), rng.randint(160, 960)] for _ in range(1000)]
+    as_json = json.dumps(points)
+    coerce = _coerce_points("draw_polyline", "points", clamp=True)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        coerce(points)
+    _report("coerce list of pairs", time.perf_counter() - start, iterations)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        coerce(as_json)
+    _report("coerce JSON text", time.perf_counter() - start, iterations)
+
+    canvas = HeadlessCanvas(track_previous=False)
+    start = time.perf_counter()
+    for _ in range(iterations // 10):
+        canvas.draw_polyline(points)
+    _report("rasterize polyline", time.perf_counter() - start, iterations // 10)
+
+    start = time.perf_counter()
+    for _ in range(iterations // 10):
+        canvas.draw_curve(points)
+    _report("rasterize curve", time.perf_counter() - start, iterations // 10)
+
+
+@benchmark("llm")
+def bench_llm(iterations: int = 200) -> None:
+    """LLM request throughput against a local mock endpoint with 20 ms latency, 16 caller threads"""
+    from concurrent.futures import ThreadPoolExecutor
+    from llmclient import LLMClient
+    from mockllm import MockLLMServer
+    import requests
+
+    server = MockLLMServer(latency=0.02)
+    base_url = server.start()
+    prompt = "Query: draw a house\n" * 50
+    body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+    def run(label, call):
+        connections = server.connections
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda _: call(), range(iterations)))
+        elapsed = time.perf_counter() - start
+        _report(label, elapsed, iterations)
+        console.print(f"  {'':<34} {iterations / elapsed:10.1f} req/s, {server.connections - connections} connections")
+
+    try:
+        run("new connection per request",
+            lambda: requests.post(f"{base_url}/models/mock:generateContent", json=body, timeout=10).json())
+        for max_in_flight, rpm in ((16, None), (4, None), (16, 600)):
+            client = LLMClient(max_in_flight=max_in_flight, requests_per_minute=rpm, base_url=base_url)
+            if client.request_bucket is not None:
+                # Start from an empty bucket to measure the sustained rate rather than the burst
+                client.request_bucket.tokens = 0
+
+            def call():
+                return client.generate("mock", prompt)
+
+            limits = f", {rpm:g}/min" if rpm else ""
+            run(f"pooled, {max_in_flight} in flight{limits}", call)
+            stats = client.stats()
+            console.print(f"  {'':<34} queue wait mean {stats['mean_wait_s'] * 1000:.1f} ms, "
+                          f"p95 {stats['p95_wait_s'] * 1000:.1f} ms")
+            client.close()
+    finally:
+        server.stop()
+
+
+@benchmark("history")
+def bench_history(iterations: int = 10000) -> None:
+    """Building and dumping an agent state with `iterations` history items"""
+    import gc
+    import tracemalloc
+    import models
+
+    current = SimpleNamespace(ToolInput=models.ToolInput, ToolResult=models.ToolResult,
+                              MemoryItem=models.MemoryItem, AgentState=models.AgentState,
+                              dump=lambda state: state.to_dict())
+    rng = random.Random(0)
+    calls = [{"x1": rng.randint(20, 1830), "y1": rng.randint(160, 960),
+              "x2": rng.randint(20, 1830), "y2": rng.randint(160, 960)} for _ in range(iterations)]
+
+    def build(kinds):
+        state = kinds.AgentState()
+        for index, args in enumerate(calls):
+            item = kinds.MemoryItem(iteration=index,
+                                    action=kinds.ToolInput(name="draw_2D_rectangle", args=args))
+            state.history.append(item)
+            item.result = kinds.ToolResult(success=True, content="Rectangle drawn")
+        return state
+
+    for label, kinds in (("pydantic models", _legacy_models()), ("slotted dataclasses", current)):
+        console.print(f"  [bold]{label}[/]")
+        gc.collect()
+        start = time.perf_counter()
+        state = build(kinds)
+        _report("record action + result", time.perf_counter() - start, iterations)
+
+        start = time.perf_counter()
+        kinds.dump(state)
+        _report("dump state", time.perf_counter() - start, iterations)
+
+        # Measured apart from the timings, which tracing would slow down
+        del state
+        gc.collect()
+        tracemalloc.start()
+        state = build(kinds)
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        console.print(f"  {'memory':<34} {allocated / 1024:10.1f} KiB    {allocated / iterations:10.1f} B/item")
+
+
+# Dependencies that should only load on first use
+@benchmark("mcp_load")
+def bench_mcp_load(iterations: int = 40) -> None:
+    """Tool call latency on one headless SSE server under 1, 4 and 16 concurrent clients, 1 call in 4 drawing"""
+    import asyncio
+    import json
+    import os
+    import socket
+    import subprocess
+    import sys
+    from mcp import ClientSession
+    from mcp.client.sse import sse_client
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    url = f"http://127.0.0.1:{port}/sse"
+    server = subprocess.Popen(
+        [sys.executable, "paint_mcp_tools.py", "sse", str(port)],
+        env=dict(os.environ, PAINT_BACKEND="headless"), cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    reads = [
+        ("query_scene", {"op": "summary"}),
+        ("get_canvas_snapshot", {"scale": 0.25}),
+        ("verify_task", {"task": "shape"}),
+    ]
+
+    async def client(index, latencies):
+        async with sse_client(url) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                for i in range(iterations):
+                    if i % 4 == 0:
+                        x, y = 20 + (index * 37 + i * 11) % 1700, 20 + (index * 53 + i * 7) % 900
+                        name, args, kind = "draw_2D_rectangle", {"x1": x, "y1": y, "x2": x + 60, "y2": y + 40}, "draw"
+                    else:
+                        (name, args), kind = reads[i % len(reads)], "read"
+                    start = time.perf_counter()
+                    result = await session.call_tool(name, arguments=args)
+                    latencies[kind].append(time.perf_counter() - start)
+                    if result.isError:
+                        raise RuntimeError(f"{name} failed: {result.content[0].text}")
+
+    async def call(name, args=None):
+        async with sse_client(url) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                return await session.call_tool(name, arguments=args or {})
+
+    async def run(clients):
+        await call("open_paint")
+        latencies = {"draw": [], "read": []}
+        start = time.perf_counter()
+        await asyncio.gather(*(client(index, latencies) for index in range(clients)))
+        elapsed = time.perf_counter() - start
+        canvas = json.loads((await call("server_stats")).content[0].text)["canvas"]
+        console.print(f"  {clients} client(s): {clients * iterations / elapsed:8.1f} calls/s, "
+                      f"peak {canvas['peak_parallel_reads']} parallel reads, {canvas['peak_queued']} queued draws")
+        for kind, values in latencies.items():
+            values.sort()
+            p50, p95, p99 = (values[min(len(values) - 1, int(len(values) * q))] * 1000 for q in (0.5, 0.95, 0.99))
+            console.print(f"    {kind:<32} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  p99 {p99:7.2f} ms")
+
+    async def wait_for_server():
+        for _ in range(100):
+            try:
+                await call("server_stats")
+                return
+            except Exception:
+                await asyncio.sleep(0.1)
+        raise RuntimeError(f"The MCP server did not come up on {url}")
+
+    async def main():
+        await wait_for_server()
+        for clients in (1, 4, 16):
+            await run(clients)
+
+    try:
+        asyncio.run(main())
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+HEAVY_MODULES = ("mcp", "pydantic", "numpy", "PIL", "requests", "dotenv", "google.generativeai",
+                 "pywinauto", "win32gui")
+
+
+@benchmark("startup")
+def bench_startup(iterations: int = 5) -> None:
+    """Import time of the entry points in a fresh interpreter (best of `iterations`)"""
+    import os
+    import subprocess
+    import sys
+
+    probe = ("import sys; import {module}; "
+             "print(','.join(name for name in {heavy!r} if name in sys.modules))")
+    env = dict(os.environ, PAINT_BACKEND="headless")
+    for module in ("main", "batch", "paint_mcp_tools"):
+        best, loaded = None, ""
+        for _ in range(iterations):
+            completed = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", probe.format(module=module, heavy=HEAVY_MODULES)],
+                capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            # The line for the module itself carries its cumulative import time in microseconds
+            line = next(line for line in completed.stderr.splitlines() if line.rstrip().endswith(f"| {module}"))
+            micros = int(line.split("|")[1])
+            best = micros if best is None else min(best, micros)
+            loaded = completed.stdout.strip()
+        console.print(f"  {'import ' + module:<34} {best / 1000:10.2f} ms        heavy modules: {loaded or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent micro-benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--iterations", type=int, default=None, help="override the default iteration count")
+    args = parser.parse_args()
+
+    for name in args.names or list(BENCHMARKS):
+        func = BENCHMARKS[name]
+        console.print(f"[bold cyan]{name}[/]: {func.__doc__}")
+        if args.iterations:
+            func(args.iterations)
+        else:
+            func()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""Headless raster canvas used when the MCP server runs without MS Paint.
+
+Shapes are drawn as 1px black outlines on a white grayscale canvas, the
+same way Paint draws them with its default brush. Every shape is reduced
+to line segments that are rasterized with vectorized NumPy operations, and
+text is composited from a cached glyph atlas.
+
+A canvas can live in a memory-mapped file so other processes can read its
+pixels without copies: the file starts with a small header holding the
+sequence counter and the canvas size, followed by the rows of pixels.
+The counter is a seqlock: it is odd while pixels are being written and
+even otherwise, so a reader in another process retries a copy that
+overlapped a write. The canvas version is half the counter.
+"""
+from contextlib import contextmanager
+from typing import Optional
+import os
+import tempfile
+import time
+import numpy as np
+
+CANVAS_WIDTH = 1920
+CANVAS_HEIGHT = 1080
+
+INK = 0
+PAPER = 255
+
+# Side of the square tiles used to track which parts of the canvas changed
+TILE_SIZE = 256
+
+# Header of a shared canvas file: sequence counter, width and height as int64
+HEADER_FIELDS = 3
+HEADER_BYTES = 64
+
+# Default text position, matching where the Paint backend clicks for text
+DEFAULT_TEXT_POSITION = (350, 533)
+DEFAULT_TEXT_SIZE = 10
+MIN_TEXT_SIZE = 6
+MAX_TEXT_SIZE = 200
+
+# Right arrow outline in unit coordinates (u along the arrow, v across it),
+# shaped like Paint's block arrow: a half-height shaft and a head taking
+# the second half of the length
+_ARROW_OUTLINE = np.array([
+    (0.0, 0.25), (0.5, 0.25), (0.5, 0.0), (1.0, 0.5),
+    (0.5, 1.0), (0.5, 0.75), (0.0, 0.75),
+])
+
+ARROW_DIRECTIONS = ("right", "left", "up", "down")
+
+
+def arrow_outline(direction: str, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+    """Vertices of a block arrow pointing in a direction inside the box between two corners"""
+    u, v = _ARROW_OUTLINE[:, 0], _ARROW_OUTLINE[:, 1]
+    if direction == "right":
+        px, py = u, v
+    elif direction == "left":
+        px, py = 1 - u, v
+    elif direction == "down":
+        px, py = v, u
+    elif direction == "up":
+        px, py = v, 1 - u
+    else:
+        raise ValueError(f"Unknown arrow direction: {direction}")
+    left, top = min(x1, x2), min(y1, y2)
+    width, height = abs(x2 - x1), abs(y2 - y1)
+    return np.column_stack([left + px * width, top + py * height])
+
+
+def catmull_rom(points, closed: bool = False, spacing: float = 4.0) -> np.ndarray:
+    """Sample a smooth Catmull-Rom curve through an (N, 2) array of points.
+
+    Each segment gets enough samples that consecutive ones are about
+    `spacing` pixels apart along its chord.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) < 3:
+        return points
+    if closed:
+        padded = np.vstack([points[-1:], points, points[:2]])
+    else:
+        padded = np.vstack([points[:1], points, points[-1:]])
+    p0, p1, p2, p3 = padded[:-3], padded[1:-2], padded[2:-1], padded[3:]
+
+    chords = np.hypot(*(p2 - p1).T)
+    counts = np.clip(np.ceil(chords / spacing), 1, 256).astype(np.int64)
+    segment = np.repeat(np.arange(counts.size), counts)
+    t = ((np.arange(segment.size) - np.repeat(np.cumsum(counts) - counts, counts)) / counts[segment])[:, None]
+    a, b, c, d = p0[segment], p1[segment], p2[segment], p3[segment]
+    samples = 0.5 * (2 * b + (c - a) * t + (2 * a - 5 * b + 4 * c - d) * t ** 2 + (3 * b - a - 3 * c + d) * t ** 3)
+    # The sampling stops short of each segment's end, so add the final point of an open curve
+    return samples if closed else np.vstack([samples, points[-1:]])
+
+
+class GlyphAtlas:
+    """Pre-rendered glyphs of one font size, stored as ink pixel offsets.
+
+    Each glyph is rasterized once; a string is then drawn by gathering the
+    ink offsets of its characters, shifting them by each character's pen
+    position and setting them all in a single indexed assignment.
+    """
+
+    def __init__(self, size: int = DEFAULT_TEXT_SIZE):
+        from PIL import ImageFont
+
+        self.size = size
+        try:
+            self._font = ImageFont.load_default(size=size)
+        except TypeError:
+            # Pillow without FreeType only has the fixed-size bitmap font
+            self._font = ImageFont.load_default()
+        ascent, descent = self._font.getmetrics()
+        self.line_height = ascent + descent
+        # Character -> index into the glyph tables
+        self._index = {}
+        self._advances = []
+        self._starts = []
+        self._counts = []
+        self._xs = np.zeros(0, dtype=np.int64)
+        self._ys = np.zeros(0, dtype=np.int64)
+        self._add_glyphs([chr(code) for code in range(32, 127)])
+
+    def _add_glyphs(self, chars) -> None:
+        from PIL import Image, ImageDraw
+
+        xs, ys = [self._xs], [self._ys]
+        offset = self._xs.size
+        for char in chars:
+            left, top, right, bottom = self._font.getbbox(char)
+            advance = self._font.getlength(char)
+            width = max(right, int(np.ceil(advance)), 1)
+            image = Image.new("L", (width, self.line_height), 0)
+            ImageDraw.Draw(image).text((0, 0), char, fill=255, font=self._font)
+            glyph_ys, glyph_xs = np.nonzero(np.asarray(image) > 127)
+            self._index[char] = len(self._advances)
+            self._advances.append(advance)
+            self._starts.append(offset)
+            self._counts.append(glyph_xs.size)
+            xs.append(glyph_xs)
+            ys.append(glyph_ys)
+            offset += glyph_xs.size
+        self._xs = np.concatenate(xs)
+        self._ys = np.concatenate(ys)
+        self._advance_table = np.array(self._advances)
+        self._start_table = np.array(self._starts, dtype=np.int64)
+        self._count_table = np.array(self._counts, dtype=np.int64)
+
+    def _codes(self, text: str) -> np.ndarray:
+        missing = set(text).difference(self._index)
+        if missing:
+            self._add_glyphs(sorted(missing))
+        return np.fromiter((self._index[char] for char in text), dtype=np.int64, count=len(text))
+
+    def layout(self, text: str):
+        """Ink pixel coordinates (xs, ys) of a line of text with its top-left at the origin"""
+        codes = self._codes(text)
+        pen = np.concatenate([[0.0], np.cumsum(self._advance_table[codes])[:-1]]).round().astype(np.int64)
+        counts = self._count_table[codes]
+        total = int(counts.sum())
+        glyph = np.repeat(np.arange(codes.size), counts)
+        # Position of every ink pixel within its glyph's slice of the tables
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        source = self._start_table[codes][glyph] + within
+        return self._xs[source] + pen[glyph], self._ys[source]
+
+    def text_width(self, text: str) -> int:
+        return int(round(self._advance_table[self._codes(text)].sum()))
+
+
+_ATLASES = {}
+
+
+def glyph_atlas(size: int = DEFAULT_TEXT_SIZE) -> GlyphAtlas:
+    """The shared glyph atlas for a font size, built on first use"""
+    atlas = _ATLASES.get(size)
+    if atlas is None:
+        atlas = _ATLASES[size] = GlyphAtlas(size)
+    return atlas
+
+
+def shared_canvas_path() -> str:
+    """A fresh file path for a shared canvas, in RAM-backed /dev/shm where available"""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    fd, path = tempfile.mkstemp(prefix=f"paint_canvas_{os.getpid()}_", suffix=".bin", dir=directory)
+    os.close(fd)
+    return path
+
+
+def _map_canvas_file(path: str, mode: str, width: int = 0, height: int = 0):
+    """Map a canvas file, returning (header, pixels) views of it"""
+    if mode == "w+":
+        buffer = np.memmap(path, dtype=np.uint8, mode=mode, shape=(HEADER_BYTES + width * height,))
+    else:
+        buffer = np.memmap(path, dtype=np.uint8, mode=mode)
+    header = buffer[:HEADER_BYTES].view(np.int64)[:HEADER_FIELDS]
+    if mode != "w+":
+        width, height = int(header[1]), int(header[2])
+    return header, buffer[HEADER_BYTES:HEADER_BYTES + width * height].reshape(height, width)
+
+
+class HeadlessCanvas:
+    def __init__(self, width: int = CANVAS_WIDTH, height: int = CANVAS_HEIGHT, shared_path: Optional[str] = None,
+                 track_previous: bool = True):
+        """Create a blank canvas, memory-mapped to `shared_path` if given.
+
+        With track_previous off, `previous` is not updated before each
+        change, which saves a full-canvas copy per operation when nothing
+        needs to verify the last change.
+        """
+        self.width = width
+        self.height = height
+        self.shared_path = shared_path
+        self.track_previous = track_previous
+        if shared_path is None:
+            self._header = np.zeros(HEADER_FIELDS, dtype=np.int64)
+            self.pixels = np.full((height, width), PAPER, dtype=np.uint8)
+        else:
+            self._header, self.pixels = _map_canvas_file(shared_path, "w+", width, height)
+            self.pixels.fill(PAPER)
+        self._header[1:] = (width, height)
+        # Canvas as it was before the most recent drawing operation
+        self.previous = self.pixels.copy()
+        # Each tile remembers the version that last touched it
+        self.tile_versions = np.zeros(
+            (-(-height // TILE_SIZE), -(-width // TILE_SIZE)), dtype=np.int64
+        )
+
+    @property
+    def version(self) -> int:
+        """Counter incremented by every change to the pixels"""
+        return int(self._header[0]) // 2
+
+    @contextmanager
+    def _writing(self):
+        """Hold the sequence counter odd while the pixels change"""
+        self._header[0] += 1
+        try:
+            yield
+        finally:
+            self._header[0] += 1
+
+    def close(self) -> None:
+        """Release a shared canvas and delete its file"""
+        if self.shared_path is None:
+            return
+        self._header = self._header.copy()
+        self.pixels = np.array(self.pixels)
+        try:
+            os.remove(self.shared_path)
+        except OSError:
+            pass
+        self.shared_path = None
+
+    def mark_dirty(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        """Record that pixels in the inclusive box changed in the latest version"""
+        version = self.version
+        self.tile_versions[
+            max(y1, 0) // TILE_SIZE:min(y2, self.height - 1) // TILE_SIZE + 1,
+            max(x1, 0) // TILE_SIZE:min(x2, self.width - 1) // TILE_SIZE + 1,
+        ] = version
+
+    def dirty_tiles(self, since_version: int) -> np.ndarray:
+        """(row, column) indices of tiles changed after a version"""
+        return np.argwhere(self.tile_versions > since_version)
+
+    def checkpoint(self) -> None:
+        """Remember the current pixels as the 'before' state of the next change"""
+        if self.track_previous:
+            np.copyto(self.previous, self.pixels)
+
+    def clear(self) -> None:
+        """Reset every pixel to the paper colour"""
+        self.checkpoint()
+        with self._writing():
+            self.pixels.fill(PAPER)
+        self.mark_dirty(0, 0, self.width - 1, self.height - 1)
+
+    def _draw_segments(self, x0, y0, x1, y1) -> None:
+        """Rasterize many line segments at once"""
+        x0 = np.asarray(x0, dtype=np.float64).ravel()
+        y0 = np.asarray(y0, dtype=np.float64).ravel()
+        dx = np.asarray(x1, dtype=np.float64).ravel() - x0
+        dy = np.asarray(y1, dtype=np.float64).ravel() - y0
+        if x0.size == 0:
+            return
+
+        # One sample per pixel along the longer axis of each segment
+        counts = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64) + 1
+        segment = np.repeat(np.arange(counts.size), counts)
+        starts = np.cumsum(counts) - counts
+        step = np.arange(segment.size) - starts[segment]
+        t = step / np.maximum(counts - 1, 1)[segment]
+
+        xs = np.rint(x0[segment] + t * dx[segment]).astype(np.int64)
+        ys = np.rint(y0[segment] + t * dy[segment]).astype(np.int64)
+        self._ink_points(xs, ys)
+
+    def draw_polyline(self, points, closed: bool = False) -> None:
+        """Draw connected line segments through an (N, 2) array of points"""
+        self.checkpoint()
+        self._draw_polyline(points, closed)
+
+    def _draw_polyline(self, points, closed: bool = False) -> None:
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 0:
+            return
+        if len(points) == 1:
+            points = np.vstack([points, points])
+        ends = np.roll(points, -1, axis=0) if closed else points[1:]
+        starts = points if closed else points[:-1]
+        self._draw_segments(starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1])
+
+    def draw_curve(self, points, closed: bool = False) -> None:
+        """Draw a smooth curve passing through every point"""
+        self.checkpoint()
+        self._draw_polyline(catmull_rom(points, closed), closed)
+
+    def draw_rectangle(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        """Draw a rectangle outline between two corners"""
+        self.checkpoint()
+        self._draw_polyline([(x1, y1), (x2, y1), (x2, y2), (x1, y2)], closed=True)
+
+    def draw_oval(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        """Draw an ellipse outline inscribed in the box between two corners"""
+        self.checkpoint()
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        rx, ry = abs(x2 - x1) / 2, abs(y2 - y1) / 2
+        # Enough vertices that consecutive ones are about 2px apart
+        count = max(16, int(np.pi * (rx + ry)))
+        theta = np.linspace(0, 2 * np.pi, count, endpoint=False)
+        points = np.column_stack([cx + rx * np.cos(theta), cy + ry * np.sin(theta)])
+        self._draw_polyline(points, closed=True)
+
+    def draw_arrow(self, direction: str, x1: int, y1: int, x2: int, y2: int) -> None:
+        """Draw a block arrow pointing in a direction inside the box between two corners"""
+        points = arrow_outline(direction, x1, y1, x2, y2)
+        self.checkpoint()
+        self._draw_polyline(points, closed=True)
+
+    def draw_text(self, text: str, x: int = DEFAULT_TEXT_POSITION[0],
+                  y: int = DEFAULT_TEXT_POSITION[1], size: int = DEFAULT_TEXT_SIZE) -> None:
+        """Render a line of text with the top-left of its line box at (x, y)"""
+        if not MIN_TEXT_SIZE <= size <= MAX_TEXT_SIZE:
+            raise ValueError(f"Text size must be between {MIN_TEXT_SIZE} and {MAX_TEXT_SIZE}")
+        self.checkpoint()
+        if not text:
+            return
+        xs, ys = glyph_atlas(size).layout(text)
+        self._ink_points(xs + x, ys + y)
+
+    def _ink_points(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """Ink the pixels at integer coordinates, ignoring those off the canvas"""
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        xs, ys = xs[inside], ys[inside]
+        if xs.size:
+            with self._writing():
+                self.pixels[ys, xs] = INK
+            self.mark_dirty(int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max()))
+
+    def save(self, path: str) -> None:
+        """Write the canvas to an image file; the format follows the extension"""
+        from PIL import Image
+
+        Image.fromarray(np.asarray(self.pixels)).save(path)
+
+
+class SharedCanvasView:
+    """Read-only, zero-copy view of a canvas shared by another process"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._header, self.pixels = _map_canvas_file(path, "r")
+        self.height, self.width = self.pixels.shape
+
+    @property
+    def version(self) -> int:
+        """The owner's change counter"""
+        return int(self._header[0]) // 2
+
+    def copy(self) -> np.ndarray:
+        """A copy of the pixels, taken again if a draw was in progress or finished while copying"""
+        while True:
+            sequence = int(self._header[0])
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            pixels = np.array(self.pixels)
+            if int(self._header[0]) == sequence:
+                return pixels
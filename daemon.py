@@ -0,0 +1,267 @@
+"""Resident agent service: answer queries over local HTTP with warm layers.
+
+The service starts a pool of MCP server sessions once and keeps them, their
+compiled tool tables, the shared LLM client, the result predictor and the
+plan cache alive across queries. Only per-run state is rebuilt: memory,
+loop guard, speculator and model routing stats, and the canvas, scene and
+drawing log, which are cleared when a session returns to the pool.
+
+After every run a leak tracker samples the service's resident memory,
+threads, open file descriptors and live objects, and the servers' memory
+and pending asyncio tasks. It reports growth against the first sample.
+
+Usage:
+    python daemon.py serve --port 8766 --pool-size 2
+    python daemon.py ask "a red house with a chimney" --style simple
+    curl -s localhost:8766/stats
+
+Endpoints:
+    POST /query   {"description": ..., "style_preference": ...} -> the run's record
+    GET  /stats   runs, pool, LLM client, plan cache and leak tracking
+    GET  /health
+"""
+from batch import next_run_index, run_session
+from guard import LoopGuard
+from models import UserQuery
+from plancache import PlanCache
+from procstats import open_files, resident_memory_mb
+from pool import McpServerPool
+from runstore import RunStore
+from speculate import ResultPredictor, Speculator
+import llmclient
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from rich.console import Console
+from typing import Optional
+import argparse
+import functools
+import gc
+import json
+import os
+import signal
+import threading
+
+console = Console()
+
+DEFAULT_PORT = 8766
+
+
+class LeakTracker:
+    # Counters that should return to their baseline between runs
+    COUNTERS = ("threads", "open_files", "server_tasks")
+
+    def __init__(self, rss_growth_mb: float = 100.0, history: int = 100):
+        """Sample resources between runs; warn when counters or memory grow past the first sample"""
+        self.rss_growth_mb = rss_growth_mb
+        self.baseline = None
+        self.samples = deque(maxlen=history)
+
+    def sample(self, pool: McpServerPool) -> dict:
+        members = pool.member_stats()
+        server_rss = [member["rss_mb"] for member in members if member.get("rss_mb") is not None]
+        server_tasks = [member["tasks"] for member in members if member.get("tasks") is not None]
+        return {
+            "rss_mb": resident_memory_mb(),
+            "threads": threading.active_count(),
+            "open_files": open_files(),
+            "objects": len(gc.get_objects()),
+            # Totals over the sessions idle at the time; a busy session is skipped
+            "servers_sampled": len(members),
+            "server_rss_mb": round(sum(server_rss), 1) if server_rss else None,
+            "server_tasks": sum(server_tasks) if server_tasks else None,
+        }
+
+    def record(self, pool: McpServerPool, run_index: int) -> dict:
+        """Sample after a run and return the sample with its growth over the baseline"""
+        sample = self.sample(pool)
+        sample["run"] = run_index
+        if self.baseline is None:
+            self.baseline = sample
+        growth = {}
+        comparable = sample["servers_sampled"] == self.baseline["servers_sampled"]
+        for name in ("rss_mb", "objects") + self.COUNTERS:
+            if name.startswith("server_") and not comparable:
+                continue
+            if sample[name] is not None and self.baseline[name] is not None:
+                growth[name] = round(sample[name] - self.baseline[name], 1)
+        sample["growth"] = growth
+        self.samples.append(sample)
+
+        suspects = [name for name in self.COUNTERS if growth.get(name, 0) > 0]
+        if growth.get("rss_mb", 0) > self.rss_growth_mb:
+            suspects.append("rss_mb")
+        if suspects:
+            console.print(f"[yellow]Possible leak after run {run_index}: "
+                          + ", ".join(f"{name} +{growth[name]}" for name in suspects) + "[/]")
+        return sample
+
+    def stats(self) -> dict:
+        return {"baseline": self.baseline, "latest": self.samples[-1] if self.samples else None}
+
+
+class AgentService:
+    def __init__(self, output_dir: str = "daemon_output", pool_size: int = 2, max_leases: int = 50,
+                 max_rss_mb: Optional[float] = 500.0, make_guard=LoopGuard, speculate: bool = True,
+                 plan_cache: Optional[PlanCache] = None, run_store: Optional[RunStore] = None):
+        """Configure the service; call start() to warm it up"""
+        self.output_dir = output_dir
+        self.pool = McpServerPool(size=pool_size, max_leases=max_leases, max_rss_mb=max_rss_mb)
+        self.make_guard = make_guard
+        # Result templates learned in one run let later runs speculate from their first call
+        self.make_speculator = functools.partial(Speculator, predictor=ResultPredictor(), enabled=speculate)
+        self.plan_cache = plan_cache
+        self.run_store = run_store
+        self.tracker = LeakTracker()
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self.runs = 0
+        self.failures = 0
+
+    def start(self) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Continue after the runs of earlier sessions rather than overwriting their files
+        self._next_index = next_run_index(self.output_dir)
+        self.pool.start()
+
+    def run(self, query: UserQuery) -> dict:
+        """Run one query on a warm session and return its record"""
+        with self._lock:
+            index = self._next_index
+            self._next_index += 1
+        record = run_session(index, query, self.output_dir, self.pool, self.make_guard, self.make_speculator,
+                             self.plan_cache, self.run_store)
+        record["leaks"] = self.tracker.record(self.pool, index)
+        with self._lock:
+            self.runs += 1
+            self.failures += record["error"] is not None
+        return record
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "pool": self.pool.stats(),
+            "llm_client": llmclient.shared_client().stats(),
+            "plan_cache": self.plan_cache.stats() if self.plan_cache is not None else None,
+            "leaks": self.tracker.stats(),
+        }
+
+    def close(self) -> None:
+        self.pool.close()
+        if self.run_store is not None:
+            self.run_store.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send(200, self.server.service.stats())
+        else:
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/query":
+            self._send(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            item = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not isinstance(item, dict):
+                raise ValueError("the request body must be a JSON object")
+            query = UserQuery.from_input(item)
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        console.print(f"[cyan]Query: {query.description[:60]}[/]")
+        self._send(200, self.server.service.run(query))
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(service: AgentService, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> None:
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service
+    # Stop on SIGTERM as on Ctrl-C; shutdown() waits for serve_forever, so it runs on another thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    console.print(f"[bold green]Agent service listening on http://{host}:{port}[/]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("[yellow]Shutting down[/]")
+    finally:
+        server.server_close()
+
+
+def ask(description: str, style: str, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> dict:
+    """Send a query to a running service and return the run's record"""
+    import urllib.request
+    request = urllib.request.Request(
+        f"http://{host}:{port}/query",
+        data=json.dumps({"description": description, "style_preference": style}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the agent as a resident service")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="start the service")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--out", default="daemon_output", help="directory for images and state logs")
+    serve_parser.add_argument("--pool-size", type=int, default=2, help="warm MCP sessions, i.e. queries run at once")
+    serve_parser.add_argument("--max-leases", type=int, default=50, help="recycle a server after this many runs")
+    serve_parser.add_argument("--max-rss-mb", type=float, default=500.0, help="recycle a server above this resident memory")
+    serve_parser.add_argument("--max-iterations", type=int, default=40, help="stop a run after this many tool calls")
+    serve_parser.add_argument("--max-seconds", type=float, default=600.0, help="stop a run after this much wall-clock time")
+    serve_parser.add_argument("--no-speculate", action="store_true", help="do not request decisions while tools are running")
+    serve_parser.add_argument("--no-plan-cache", action="store_true", help="plan every query from scratch")
+    serve_parser.add_argument("--run-store", default=os.getenv("PAINT_RUN_STORE"),
+                              help="SQLite database to record runs, decisions and tool calls in")
+    ask_parser = commands.add_parser("ask", help="send a query to a running service")
+    ask_parser.add_argument("description")
+    ask_parser.add_argument("--style", default="regular")
+    ask_parser.add_argument("--host", default="127.0.0.1")
+    ask_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    if args.command == "ask":
+        console.print(ask(args.description, args.style, args.host, args.port))
+        return
+
+    service = AgentService(
+        output_dir=args.out,
+        pool_size=args.pool_size,
+        max_leases=args.max_leases,
+        max_rss_mb=args.max_rss_mb,
+        make_guard=functools.partial(LoopGuard, max_iterations=args.max_iterations, max_seconds=args.max_seconds),
+        speculate=not args.no_speculate,
+        plan_cache=None if args.no_plan_cache else PlanCache(),
+        run_store=RunStore(args.run_store) if args.run_store else None,
+    )
+    console.print(f"[bold cyan]Starting {args.pool_size} MCP sessions...[/]")
+    service.start()
+    try:
+        serve(service, args.host, args.port)
+    finally:
+        console.print(f"[bold cyan]Service stats:[/] {service.stats()}")
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,29 @@
 from models import DecisionOutput, ToolInput, AgentState
-import google.generativeai as genai
-import os
+from dispatch import INTERNAL_TOOLS
+from routing import ModelRouter
+from llmclient import GeminiModel, LLMClient, Reply, shared_client
 import json
 import re
-from dotenv import load_dotenv
+import time
+from typing import Optional
 
 class DecisionLayer:
-    def __init__(self):
-        """Initialize the decision layer"""
-        # Load environment variables from .env file
+    def __init__(self, router: Optional[ModelRouter] = None, llm_client: Optional[LLMClient] = None):
+        """Initialize the decision layer; router picks the model for each turn and llm_client
+        sends and limits requests (both configured from the environment by default)"""
+        # Load environment variables (GEMINI_API_KEY and model settings) from .env file
+        from dotenv import load_dotenv
         load_dotenv()
         
-        # Configure Gemini
-        api_key = os.getenv("GEMINI_API_KEY")
-        genai.configure(api_key=api_key)
-        
-        # Initialize model
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
+        # Initialize the model tiers; every layer shares one pooled, rate-limited client
+        self.router = router if router is not None else ModelRouter.from_env()
+        self.llm_client = llm_client if llm_client is not None else shared_client()
         
     def create_system_prompt(self, tools: list) -> str:
         """Create the system prompt with available tools"""
         tools_description = []
         
+        tools = [tool for tool in tools if getattr(tool, 'name', None) not in INTERNAL_TOOLS]
         for i, tool in enumerate(tools):
             try:
                 params = tool.inputSchema
@@ -32,6 +34,9 @@ class DecisionLayer:
                 if 'properties' in params:
                     param_details = []
                     for param_name, param_info in params['properties'].items():
+                        # Request IDs are attached by the action layer, not the model
+                        if param_name == 'request_id':
+                            continue
                         param_type = param_info.get('type', 'unknown')
                         param_details.append(f"{param_name}: {param_type}")
                     params_str = ', '.join(param_details)
@@ -90,21 +95,58 @@ When you respond, you MUST produce exactly one line, and that line MUST be in on
         
         return system_prompt
     
-    def make_decision(self, query: str, memory: AgentState, system_prompt: str) -> DecisionOutput:
+    def make_decision(self, query: str, memory: AgentState, system_prompt: str,
+                      scene_summary: str = None) -> DecisionOutput:
         """Make a decision based on the current state and query"""
-        # Create the full prompt
+        return self.decide(self.build_prompt(query, memory, system_prompt, scene_summary),
+                           self.router.classify(memory))
+    
+    def build_prompt(self, query: str, memory: AgentState, system_prompt: str,
+                     scene_summary: str = None) -> str:
+        """Build the full LLM prompt for the current state"""
         if memory.iteration == 0:
             current_query = query
         else:
             history_context = self._format_history_from_state(memory)
             current_query = query + "\n\n" + history_context
+            if scene_summary:
+                current_query = current_query + "\n\nCurrent canvas:\n" + scene_summary
             current_query = current_query + "\nWhat should I do next?"
         
-        full_prompt = f"{system_prompt}\n\nQuery: {current_query}"
-        
+        return f"{system_prompt}\n\nQuery: {current_query}"
+    
+    def decide(self, full_prompt: str, turn: str = "routine") -> DecisionOutput:
+        """Ask the model routed for this kind of turn for the next step given a full prompt"""
+        tier = self.router.tier_for(turn)
+        decision_output = self._ask(tier, full_prompt)
+        escalation = self.router.escalation
+        if not decision_output.valid and escalation is not None and tier != escalation:
+            print(f"Unusable reply from the {tier} model, asking the {escalation} model")
+            decision_output = self._ask(escalation, full_prompt)
+            decision_output.escalated_from = tier
+        return decision_output
+    
+    def record_outcome(self, decision_output: DecisionOutput, success: bool) -> None:
+        """Credit the tier that chose a tool call with the call's outcome"""
+        if decision_output.model_tier is not None:
+            self.router.record_outcome(decision_output.model_tier, success)
+    
+    def _ask(self, tier: str, full_prompt: str) -> DecisionOutput:
+        start = time.perf_counter()
+        decision_output = self._generate(self.router.tiers[tier], full_prompt)
+        decision_output.model_tier = tier
+        self.router.record_call(tier, time.perf_counter() - start, decision_output.valid)
+        return decision_output
+    
+    def _generate(self, model, full_prompt: str) -> DecisionOutput:
         # Generate response from LLM
         try:
-            response = self.model.generate_content(full_prompt)
+            if isinstance(model, GeminiModel):
+                # Send it through this layer's client, which takes a slot for each attempt itself
+                response = Reply((model.client or self.llm_client).generate(model.name, full_prompt))
+            else:
+                with self.llm_client.slot(full_prompt):
+                    response = model.generate_content(full_prompt)
             response_text = response.text.strip()
             print(f"LLM Response: {response_text}")
             
@@ -128,6 +170,8 @@ When you respond, you MUST produce exactly one line, and that line MUST be in on
                         
                     func_name = call_obj["name"]
                     arguments = call_obj.get("args", {})
+                    if not isinstance(func_name, str) or not isinstance(arguments, dict):
+                        raise ValueError(f"Function call needs a string name and an args object: {call_obj}")
                     
                     return DecisionOutput(
                         is_final=False,
@@ -141,7 +185,8 @@ When you respond, you MUST produce exactly one line, and that line MUST be in on
                     # Return a fallback decision
                     return DecisionOutput(
                         is_final=True, 
-                        final_answer=f"Error in decision making: {e}"
+                        final_answer=f"Error in decision making: {e}",
+                        valid=False
                     )
                     
             elif response_text.startswith("FINAL_ANSWER:"):
@@ -155,14 +200,16 @@ When you respond, you MUST produce exactly one line, and that line MUST be in on
                 # Unexpected response format
                 return DecisionOutput(
                     is_final=True,
-                    final_answer=f"Unexpected response format: {response_text}"
+                    final_answer=f"Unexpected response format: {response_text}",
+                    valid=False
                 )
                 
         except Exception as e:
             print(f"Error in LLM generation: {e}")
             return DecisionOutput(
                 is_final=True,
-                final_answer=f"Error in decision making: {e}"
+                final_answer=f"Error in decision making: {e}",
+                valid=False
             )
 
     def _format_history_from_state(self, state: AgentState) -> str:
@@ -0,0 +1,268 @@
+from rich.console import Console
+from typing import Any, Callable, Dict, List
+import functools
+import json
+
+console = Console()
+
+# Valid drawing boundaries of the Paint canvas
+MIN_X = 20
+MAX_X = 1830
+MIN_Y = 160
+MAX_Y = 960
+
+# Tools whose x1/y1/x2/y2 arguments are canvas coordinates
+DRAWING_TOOLS = frozenset([
+    "draw_rectangle", "draw_oval", "draw_up_arrow",
+    "draw_down_arrow", "draw_left_arrow", "draw_right_arrow",
+    "draw_2D_rectangle", "draw_2D_oval", "draw_2D_up_arrow_shape",
+    "draw_2D_right_arrow_shape", "draw_2D_down_arrow_shape",
+    "draw_2D_left_arrow_shape",
+])
+
+COORDINATE_PARAMS = ("x1", "x2", "y1", "y2")
+
+# Tools that take a list of [x, y] points; their points are clamped to the canvas
+PATH_TOOLS = frozenset(["draw_polyline", "draw_polygon", "draw_curve"])
+MAX_PATH_POINTS = 10000
+
+# Tools the agent infrastructure calls itself; they are not offered to the model
+INTERNAL_TOOLS = frozenset([
+    "get_canvas_handle", "get_canvas_snapshot", "lookup_request", "reset_canvas", "save_canvas", "server_stats",
+])
+
+
+class ToolArgumentError(ValueError):
+    """Raised when a tool call does not match the tool's input schema"""
+
+
+def _coerce_integer(tool_name: str, param_name: str) -> Callable[[Any], int]:
+    def coerce(value):
+        if isinstance(value, bool):
+            raise ToolArgumentError(
+                f"{tool_name}: argument '{param_name}' expects an integer, got {value!r}"
+            )
+        if isinstance(value, int):
+            return value
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            try:
+                as_float = float(value)
+            except (TypeError, ValueError):
+                as_float = None
+            if as_float is not None and as_float.is_integer():
+                return int(as_float)
+            raise ToolArgumentError(
+                f"{tool_name}: argument '{param_name}' expects an integer, got {value!r}"
+            )
+    return coerce
+
+
+def _coerce_number(tool_name: str, param_name: str) -> Callable[[Any], float]:
+    def coerce(value):
+        if isinstance(value, bool):
+            raise ToolArgumentError(
+                f"{tool_name}: argument '{param_name}' expects a number, got {value!r}"
+            )
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ToolArgumentError(
+                f"{tool_name}: argument '{param_name}' expects a number, got {value!r}"
+            )
+    return coerce
+
+
+def _coerce_boolean(tool_name: str, param_name: str) -> Callable[[Any], bool]:
+    def coerce(value):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+            return value.strip().lower() == "true"
+        raise ToolArgumentError(
+            f"{tool_name}: argument '{param_name}' expects a boolean, got {value!r}"
+        )
+    return coerce
+
+
+def _coerce_array(tool_name: str, param_name: str) -> Callable[[Any], list]:
+    def coerce(value):
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        if isinstance(value, str):
+            try:
+                parsed = json.loads(value)
+                if isinstance(parsed, list):
+                    return parsed
+            except ValueError:
+                pass
+            try:
+                return [int(x.strip()) for x in value.strip('[]').split(',')]
+            except ValueError:
+                raise ToolArgumentError(
+                    f"{tool_name}: argument '{param_name}' expects an array, got {value!r}"
+                )
+        raise ToolArgumentError(
+            f"{tool_name}: argument '{param_name}' expects an array, got {value!r}"
+        )
+    return coerce
+
+
+def _coerce_points(tool_name: str, param_name: str, clamp: bool = False) -> Callable[[Any], list]:
+    """Coerce [[x, y], ...], a flat [x, y, x, y, ...] list or their JSON text into integer pairs"""
+    import numpy as np
+
+    def fail(value):
+        shown = repr(value)
+        raise ToolArgumentError(
+            f"{tool_name}: argument '{param_name}' expects a list of [x, y] points, "
+            f"got {shown if len(shown) <= 80 else shown[:80] + '...'}"
+        )
+
+    def coerce(value):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                try:
+                    value = [float(x) for x in value.replace('[', ' ').replace(']', ' ').split(',') if x.strip()]
+                except ValueError:
+                    fail(value)
+        try:
+            points = np.asarray(value, dtype=np.float64)
+        except (TypeError, ValueError):
+            fail(value)
+        if points.ndim == 1 and points.size % 2 == 0:
+            points = points.reshape(-1, 2)
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 2 or not np.isfinite(points).all():
+            fail(value)
+        if len(points) > MAX_PATH_POINTS:
+            raise ToolArgumentError(
+                f"{tool_name}: argument '{param_name}' has {len(points)} points; the limit is {MAX_PATH_POINTS}"
+            )
+        points = np.rint(points).astype(np.int64)
+        if clamp:
+            low, high = np.array([MIN_X, MIN_Y]), np.array([MAX_X, MAX_Y])
+            clamped = np.clip(points, low, high)
+            adjusted = int((clamped != points).any(axis=1).sum())
+            if adjusted:
+                console.print(f"[yellow]Adjusted {adjusted} point(s) in {param_name} to stay within canvas bounds[/]")
+            points = clamped
+        return points.tolist()
+    return coerce
+
+
+def _coerce_object(tool_name: str, param_name: str) -> Callable[[Any], dict]:
+    def coerce(value):
+        if isinstance(value, dict):
+            return value
+        if isinstance(value, str):
+            try:
+                parsed = json.loads(value)
+            except ValueError:
+                parsed = None
+            if isinstance(parsed, dict):
+                return parsed
+        raise ToolArgumentError(
+            f"{tool_name}: argument '{param_name}' expects a JSON object, got {value!r}"
+        )
+    return coerce
+
+
+def _coerce_string(tool_name: str, param_name: str) -> Callable[[Any], str]:
+    return str
+
+
+_COERCER_FACTORIES = {
+    "integer": _coerce_integer,
+    "number": _coerce_number,
+    "boolean": _coerce_boolean,
+    "array": _coerce_array,
+    "object": _coerce_object,
+    "string": _coerce_string,
+}
+
+
+def _schema_type(param_info: Dict[str, Any]):
+    """Return (type, nullable) for a property, unwrapping Optional's anyOf form"""
+    if "type" in param_info:
+        return param_info["type"], False
+    options = [option.get("type") for option in param_info.get("anyOf", ())]
+    types = [t for t in options if t and t != "null"]
+    return (types[0] if types else "string"), "null" in options
+
+
+def _allow_null(coerce: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    def coerce_nullable(value):
+        return None if value is None else coerce(value)
+    return coerce_nullable
+
+
+def _clamp(tool_name: str, param_name: str, coerce: Callable[[Any], int],
+           low: int, high: int) -> Callable[[Any], int]:
+    def clamp(value):
+        val = coerce(value)
+        bounded_val = low if val < low else high if val > high else val
+        if bounded_val != val:
+            console.print(f"[yellow]Adjusted {param_name} from {val} to {bounded_val} to stay within canvas bounds[/]")
+        return bounded_val
+    return clamp
+
+
+class CompiledTool:
+    """A tool schema compiled into per-parameter coercer functions"""
+
+    __slots__ = ("name", "tool", "coercers", "required", "is_drawing")
+
+    def __init__(self, tool):
+        self.name = tool.name
+        self.tool = tool
+        schema = tool.inputSchema or {}
+        self.required = tuple(schema.get("required", ()))
+        self.is_drawing = self.name in DRAWING_TOOLS
+
+        self.coercers: Dict[str, Callable[[Any], Any]] = {}
+        for param_name, param_info in schema.get("properties", {}).items():
+            expected_type, nullable = _schema_type(param_info)
+            factory = _COERCER_FACTORIES.get(expected_type, _coerce_string)
+            if expected_type == "array" and param_info.get("items", {}).get("type") == "array":
+                factory = functools.partial(_coerce_points, clamp=self.name in PATH_TOOLS)
+            coerce = factory(self.name, param_name)
+            if nullable:
+                coerce = _allow_null(coerce)
+            if self.is_drawing and param_name in COORDINATE_PARAMS:
+                if param_name.startswith("x"):
+                    coerce = _clamp(self.name, param_name, coerce, MIN_X, MAX_X)
+                else:
+                    coerce = _clamp(self.name, param_name, coerce, MIN_Y, MAX_Y)
+            self.coercers[param_name] = coerce
+
+    def coerce(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate and coerce call arguments, raising ToolArgumentError on bad input"""
+        for param_name in self.required:
+            if param_name not in arguments:
+                raise ToolArgumentError(f"{self.name}: missing required argument '{param_name}'")
+
+        coercers = self.coercers
+        processed_args = {
+            param_name: coercers[param_name](value)
+            for param_name, value in arguments.items()
+            if param_name in coercers
+        }
+        if self.is_drawing:
+            self._separate_coordinates(processed_args)
+        return processed_args
+
+    def _separate_coordinates(self, processed_args: Dict[str, Any]) -> None:
+        """Nudge x2/y2 so a shape never collapses to a line"""
+        for first, second, high in (("x1", "x2", MAX_X), ("y1", "y2", MAX_Y)):
+            if first in processed_args and processed_args.get(second) == processed_args[first]:
+                console.print(f"[yellow]Warning: {first} equals {second} in {self.name}. Auto-adjusting {second}.[/]")
+                value = processed_args[second]
+                processed_args[second] = value + 5 if value + 5 <= high else value - 5
+
+
+def compile_tools(tools: List[Any]) -> Dict[str, CompiledTool]:
+    """Compile a list of MCP tools into a name-indexed dispatch table"""
+    return {tool.name: CompiledTool(tool) for tool in tools}
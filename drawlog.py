@@ -0,0 +1,211 @@
+"""Compact binary log of the drawing calls made during a run, and its replay.
+
+A log file is a fixed header, one 16-byte record per executed call and the
+variable-length payloads of text and path calls:
+
+    header   magic b"PDL1", record count (uint32), payload bytes (uint32)
+    record   tool ID (uint8), padding, x1 y1 x2 y2 (int16), payload offset (uint32), payload length (uint16)
+    payload  UTF-8 text or int16 x, y point pairs, concatenated
+
+Text calls store their position in x1, y1 and their font size in x2. Path
+calls store their bounding box in x1..y2 and their points in the payload.
+
+Replaying streams the records straight into a headless canvas, without the
+LLM or the MCP server, so final images can be regenerated at renderer speed.
+
+Usage:
+    python drawlog.py logs/run.drawlog --out run.png
+"""
+from scene import DEFAULT_TEXT_POSITION, DEFAULT_TEXT_SIZE
+from typing import Iterator, Tuple
+import argparse
+import functools
+import struct
+
+MAGIC = b"PDL1"
+HEADER = struct.Struct("<4sII")
+
+# Logs are written with the struct and read back as a numpy array of the same
+# layout, so recording a run does not need numpy
+RECORD = struct.Struct("<BBhhhhIH")
+RECORD_FIELDS = [
+    ("tool", "u1"), ("pad", "u1"),
+    ("x1", "<i2"), ("y1", "<i2"), ("x2", "<i2"), ("y2", "<i2"),
+    ("payload_offset", "<u4"), ("payload_length", "<u2"),
+]
+
+# Stable IDs of the logged operations; never renumber, only append
+TOOL_IDS = {
+    "clear": 0,
+    "draw_2D_rectangle": 1,
+    "draw_2D_oval": 2,
+    "draw_2D_right_arrow_shape": 3,
+    "draw_2D_left_arrow_shape": 4,
+    "draw_2D_up_arrow_shape": 5,
+    "draw_2D_down_arrow_shape": 6,
+    "add_text_in_paint": 7,
+    "draw_polyline": 8,
+    "draw_polygon": 9,
+    "draw_curve": 10,
+    "draw_closed_curve": 11,
+}
+TOOL_NAMES = {tool_id: name for name, tool_id in TOOL_IDS.items()}
+
+_CLEAR, _RECTANGLE, _OVAL, _TEXT = (
+    TOOL_IDS[name] for name in ("clear", "draw_2D_rectangle", "draw_2D_oval", "add_text_in_paint")
+)
+_POLYLINE, _POLYGON, _CURVE, _CLOSED_CURVE = (
+    TOOL_IDS[name] for name in ("draw_polyline", "draw_polygon", "draw_curve", "draw_closed_curve")
+)
+_ARROWS = {TOOL_IDS[f"draw_2D_{direction}_arrow_shape"]: direction for direction in ("right", "left", "up", "down")}
+
+INT16_MIN, INT16_MAX = -2**15, 2**15 - 1
+
+
+@functools.lru_cache(maxsize=None)
+def record_dtype():
+    import numpy as np
+    return np.dtype(RECORD_FIELDS)
+
+
+class DrawLog:
+    """Drawing calls of one run, in the order they were executed"""
+
+    def __init__(self):
+        self._records = []
+        self._payload = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def clear(self) -> None:
+        """Forget every recorded call"""
+        self._records.clear()
+        self._payload.clear()
+
+    def _add_payload(self, data: bytes) -> Tuple[int, int]:
+        if len(data) > 0xFFFF:
+            raise ValueError(f"Payload of {len(data)} bytes does not fit the drawing log")
+        offset = len(self._payload)
+        self._payload += data
+        return offset, len(data)
+
+    def record(self, tool_name: str, args: dict) -> bool:
+        """Append a call; returns False for tools that do not draw"""
+        if tool_name == "draw_curve" and args.get("closed"):
+            tool_name = "draw_closed_curve"
+        tool_id = TOOL_IDS.get(tool_name)
+        if tool_id is None:
+            return False
+        payload_offset = payload_length = 0
+        if tool_name == "add_text_in_paint":
+            # Cut overlong text on a character boundary so the payload still decodes
+            text = str(args.get("text", "")).encode("utf-8")[:0xFFFF].decode("utf-8", "ignore")
+            payload_offset, payload_length = self._add_payload(text.encode("utf-8"))
+            coords = (args.get("x", DEFAULT_TEXT_POSITION[0]), args.get("y", DEFAULT_TEXT_POSITION[1]),
+                      args.get("size", DEFAULT_TEXT_SIZE), 0)
+        elif tool_name == "clear":
+            coords = (0, 0, 0, 0)
+        elif "points" in args:
+            import numpy as np
+            points = np.asarray(args["points"], dtype=np.int64).reshape(-1, 2)
+            if points.size and (points.min() < INT16_MIN or points.max() > INT16_MAX):
+                raise ValueError("Path points do not fit the drawing log")
+            payload_offset, payload_length = self._add_payload(points.astype("<i2").tobytes())
+            coords = (points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max())
+        else:
+            coords = (args["x1"], args["y1"], args["x2"], args["y2"])
+        coords = tuple(int(value) for value in coords)
+        if not all(INT16_MIN <= value <= INT16_MAX for value in coords):
+            raise ValueError(f"Coordinates {coords} do not fit the drawing log")
+        self._records.append((tool_id, 0) + coords + (payload_offset, payload_length))
+        return True
+
+    def to_bytes(self) -> bytes:
+        records = b"".join(RECORD.pack(*record) for record in self._records)
+        return HEADER.pack(MAGIC, len(self._records), len(self._payload)) + records + bytes(self._payload)
+
+    def save(self, path: str) -> str:
+        """Write the log to a file and return its path"""
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+        return path
+
+
+def read_log(path: str) -> Tuple["np.ndarray", bytes]:
+    """Load a log file as (records, payload bytes)"""
+    import numpy as np
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, count, payload_size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a drawing log")
+    records = np.frombuffer(data, dtype=record_dtype(), count=count, offset=HEADER.size)
+    payload_start = HEADER.size + count * RECORD.size
+    return records, data[payload_start:payload_start + payload_size]
+
+
+def _points(payload: bytes, offset: int, length: int) -> "np.ndarray":
+    import numpy as np
+    return np.frombuffer(payload, dtype="<i2", count=length // 2, offset=offset).reshape(-1, 2)
+
+
+def iter_calls(path: str) -> Iterator[Tuple[str, dict]]:
+    """Decode a log back into (tool name, arguments) pairs"""
+    records, payload = read_log(path)
+    for record in records.tolist():
+        tool_id, _, x1, y1, x2, y2, offset, length = record
+        name = TOOL_NAMES[tool_id]
+        if name == "add_text_in_paint":
+            yield name, {"text": payload[offset:offset + length].decode("utf-8"),
+                         "x": x1, "y": y1, "size": x2 or DEFAULT_TEXT_SIZE}
+        elif name == "clear":
+            yield name, {}
+        elif name == "draw_closed_curve":
+            yield "draw_curve", {"points": _points(payload, offset, length).tolist(), "closed": True}
+        elif tool_id in (_POLYLINE, _POLYGON, _CURVE):
+            yield name, {"points": _points(payload, offset, length).tolist()}
+        else:
+            yield name, {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
+
+
+def replay(path: str, canvas=None):
+    """Apply a log to a headless canvas (a new blank one by default) and return it"""
+    from canvas import HeadlessCanvas
+
+    if canvas is None:
+        canvas = HeadlessCanvas(track_previous=False)
+    records, payload = read_log(path)
+    for tool_id, _, x1, y1, x2, y2, offset, length in records.tolist():
+        if tool_id == _RECTANGLE:
+            canvas.draw_rectangle(x1, y1, x2, y2)
+        elif tool_id == _OVAL:
+            canvas.draw_oval(x1, y1, x2, y2)
+        elif tool_id in _ARROWS:
+            canvas.draw_arrow(_ARROWS[tool_id], x1, y1, x2, y2)
+        elif tool_id == _TEXT:
+            canvas.draw_text(payload[offset:offset + length].decode("utf-8"), x1, y1, x2 or DEFAULT_TEXT_SIZE)
+        elif tool_id in (_POLYLINE, _POLYGON):
+            canvas.draw_polyline(_points(payload, offset, length), closed=tool_id == _POLYGON)
+        elif tool_id in (_CURVE, _CLOSED_CURVE):
+            canvas.draw_curve(_points(payload, offset, length), closed=tool_id == _CLOSED_CURVE)
+        elif tool_id == _CLEAR:
+            canvas.clear()
+        else:
+            raise ValueError(f"Unknown tool ID {tool_id} in {path}")
+    return canvas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a drawing log onto a blank canvas")
+    parser.add_argument("log", help="drawing log written by an agent run")
+    parser.add_argument("--out", help="image to write (default: the log path with .png)")
+    args = parser.parse_args()
+
+    out = args.out or args.log.rsplit(".", 1)[0] + ".png"
+    replay(args.log).save(out)
+    print(f"Replayed {args.log} to {out}")
+
+
+if __name__ == "__main__":
+    main()
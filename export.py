@@ -0,0 +1,204 @@
+"""Offline export of recorded runs to PNG or SVG, without Paint or the MCP server.
+
+Every run leaves a drawing log (see drawlog.py). PNG export replays the log
+onto the raster backend; SVG export turns the same calls into vector
+elements with the raster backend's geometry. Files are exported in a
+process pool and each one is timed. Exports keep each log's path below the
+directory the logs have in common, so runs of the same name from different
+output directories do not overwrite each other.
+
+Usage:
+    python export.py logs/drawing_20250301_*.drawlog --format svg --out exports --jobs 8
+    python export.py batch_output --format both
+"""
+from drawlog import iter_calls, replay
+from canvas import CANVAS_WIDTH, CANVAS_HEIGHT, DEFAULT_TEXT_SIZE, arrow_outline
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from rich.console import Console
+from xml.sax.saxutils import escape
+from typing import Optional
+import argparse
+import glob
+import json
+import os
+import time
+import numpy as np
+
+console = Console()
+
+FORMATS = ("png", "svg")
+
+_ARROW_DIRECTIONS = {
+    "draw_2D_right_arrow_shape": "right",
+    "draw_2D_left_arrow_shape": "left",
+    "draw_2D_up_arrow_shape": "up",
+    "draw_2D_down_arrow_shape": "down",
+}
+
+
+def _curve_path(points, closed: bool) -> str:
+    """SVG path data for the raster backend's Catmull-Rom curve, as cubic Bezier segments"""
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return "M" + " L".join(f"{x:g},{y:g}" for x, y in points)
+    if closed:
+        padded = np.vstack([points[-1:], points, points[:2]])
+    else:
+        padded = np.vstack([points[:1], points, points[-1:]])
+    p0, p1, p2, p3 = padded[:-3], padded[1:-2], padded[2:-1], padded[3:]
+    control1, control2 = p1 + (p2 - p0) / 6, p2 - (p3 - p1) / 6
+    commands = [f"M{points[0][0]:g},{points[0][1]:g}"]
+    for (ax, ay), (bx, by), (x, y) in zip(control1, control2, p2):
+        commands.append(f"C{ax:g},{ay:g} {bx:g},{by:g} {x:g},{y:g}")
+    return " ".join(commands) + (" Z" if closed else "")
+
+
+def _svg_element(name: str, args: dict) -> str:
+    """One SVG element for a drawing call"""
+    if name == "draw_2D_rectangle":
+        x, y = min(args["x1"], args["x2"]), min(args["y1"], args["y2"])
+        return (f'<rect x="{x}" y="{y}" width="{abs(args["x2"] - args["x1"])}" '
+                f'height="{abs(args["y2"] - args["y1"])}"/>')
+    if name == "draw_2D_oval":
+        return (f'<ellipse cx="{(args["x1"] + args["x2"]) / 2}" cy="{(args["y1"] + args["y2"]) / 2}" '
+                f'rx="{abs(args["x2"] - args["x1"]) / 2}" ry="{abs(args["y2"] - args["y1"]) / 2}"/>')
+    if name in _ARROW_DIRECTIONS:
+        points = arrow_outline(_ARROW_DIRECTIONS[name], args["x1"], args["y1"], args["x2"], args["y2"])
+        return '<polygon points="' + " ".join(f"{x:g},{y:g}" for x, y in points) + '"/>'
+    if name in ("draw_polyline", "draw_polygon"):
+        tag = "polyline" if name == "draw_polyline" else "polygon"
+        return f'<{tag} points="' + " ".join(f"{x},{y}" for x, y in args["points"]) + '"/>'
+    if name == "draw_curve":
+        return f'<path d="{_curve_path(args["points"], args.get("closed", False))}"/>'
+    if name == "add_text_in_paint":
+        return (f'<text x="{args["x"]}" y="{args["y"]}" font-size="{args.get("size", DEFAULT_TEXT_SIZE)}" '
+                f'dominant-baseline="hanging" fill="black" stroke="none">{escape(args["text"])}</text>')
+    raise ValueError(f"No SVG form for {name}")
+
+
+def render_svg(log_path: str, out_path: str) -> str:
+    """Write a run's drawing as an SVG document"""
+    elements = []
+    for name, args in iter_calls(log_path):
+        if name == "clear":
+            elements.clear()
+        else:
+            elements.append(_svg_element(name, args))
+    with open(out_path, "w") as f:
+        f.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{CANVAS_WIDTH}" height="{CANVAS_HEIGHT}" '
+            f'viewBox="0 0 {CANVAS_WIDTH} {CANVAS_HEIGHT}">\n'
+            f'<title>{escape(os.path.basename(log_path))}</title>\n'
+            '<rect width="100%" height="100%" fill="white"/>\n'
+            '<g fill="none" stroke="black" stroke-width="1">\n'
+        )
+        for element in elements:
+            f.write(element + "\n")
+        f.write("</g>\n</svg>\n")
+    return out_path
+
+
+def render_png(log_path: str, out_path: str) -> str:
+    """Write a run's drawing as a PNG rendered by the raster backend"""
+    replay(log_path).save(out_path)
+    return out_path
+
+
+RENDERERS = {"png": render_png, "svg": render_svg}
+
+
+def export_file(log_path: str, out_dir: str, formats, name: Optional[str] = None) -> dict:
+    """Export one log in each format as out_dir/name.<format>; runs in a worker process"""
+    stem = name or os.path.splitext(os.path.basename(log_path))[0]
+    record = {"log": log_path, "outputs": [], "error": None}
+    start = time.perf_counter()
+    try:
+        out_base = os.path.join(out_dir, stem)
+        os.makedirs(os.path.dirname(out_base) or ".", exist_ok=True)
+        for fmt in formats:
+            out_path = f"{out_base}.{fmt}"
+            RENDERERS[fmt](log_path, out_path)
+            record["outputs"].append(out_path)
+    except Exception as e:
+        record["error"] = str(e)
+    record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return record
+
+
+def find_logs(paths) -> list:
+    """Expand files, glob patterns and directories into a sorted list of drawing logs"""
+    found = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found.update(glob.glob(os.path.join(path, "**", "*.drawlog"), recursive=True))
+        else:
+            found.update(glob.glob(path) or ([path] if os.path.exists(path) else []))
+    return sorted(found)
+
+
+def output_names(logs: list) -> dict:
+    """Output name of each log: its path below the logs' common directory, without the extension.
+
+    Logs with the same file name in different directories, such as
+    batch_output/run_0000.drawlog and daemon_output/run_0000.drawlog, keep
+    their directories apart instead of writing over each other's exports."""
+    if not logs:
+        return {}
+    paths = [os.path.abspath(log) for log in logs]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    return {log: os.path.splitext(os.path.relpath(path, root))[0] for log, path in zip(logs, paths)}
+
+
+def export_all(logs: list, out_dir: str, formats, jobs: int) -> list:
+    """Export every log with up to `jobs` worker processes, reporting each file as it finishes"""
+    os.makedirs(out_dir, exist_ok=True)
+    records = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(export_file, log, out_dir, formats, name) for log, name in output_names(logs).items()]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            if record["error"] is None:
+                console.print(f"[green]{record['log']}[/] -> {', '.join(record['outputs'])} "
+                              f"in {record['elapsed_ms']} ms")
+            else:
+                console.print(f"[red]{record['log']} failed: {record['error']}[/]")
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render recorded runs to PNG or SVG")
+    parser.add_argument("paths", nargs="+", help="drawing logs, glob patterns or directories to search")
+    parser.add_argument("--format", choices=FORMATS + ("both",), default="png")
+    parser.add_argument("--out", default="exports", help="directory for the exported files")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--report", help="also write per-file timings to this JSON file")
+    args = parser.parse_args()
+
+    logs = find_logs(args.paths)
+    if not logs:
+        console.print("[yellow]No drawing logs found[/]")
+        return
+    formats = FORMATS if args.format == "both" else (args.format,)
+    start = time.perf_counter()
+    records = export_all(logs, args.out, formats, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    succeeded = [record for record in records if record["error"] is None]
+    per_file = sorted(record["elapsed_ms"] for record in succeeded)
+    summary = {
+        "files": len(records),
+        "succeeded": len(succeeded),
+        "wall_s": round(elapsed, 3),
+        "median_ms": per_file[len(per_file) // 2] if per_file else None,
+        "max_ms": per_file[-1] if per_file else None,
+    }
+    console.print(f"[bold green]Exported {summary['succeeded']}/{summary['files']} runs in {summary['wall_s']}s "
+                  f"(median {summary['median_ms']} ms, max {summary['max_ms']} ms per file)[/]")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"summary": summary, "files": sorted(records, key=lambda r: r["log"])}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Loop detection and run budgets for the decision loop.
+
+Every call in the agent's history is fingerprinted by its normalized tool
+name and arguments. A call that repeats an earlier successful one is not
+executed again: the loop gets the earlier result back with a note telling
+the model the call was a repeat. The guard also ends a run that exceeds
+its iteration or wall-clock budget, or that keeps repeating itself.
+"""
+from models import AgentState, MemoryItem, ToolInput, ToolResult
+from typing import Dict, List, Optional
+import json
+import time
+
+# Calls that clear the canvas, after which earlier drawing calls may be repeated
+CANVAS_RESETS = frozenset(["open_paint", "reset_canvas"])
+
+# Calls whose result depends on what is on the canvas; a repeat only counts
+# as one while nothing has been drawn since
+STATE_QUERIES = frozenset(["query_scene", "verify_task"])
+
+
+def _normalize(value):
+    """Canonical form of an argument value, so "100", 100.0 and 100 compare equal"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        return _normalize(number)
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else round(value, 6)
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def fingerprint(tool_call: ToolInput) -> str:
+    """Stable key of a call: its tool name and arguments, ignoring request IDs"""
+    args = {key: value for key, value in tool_call.args.items() if key != "request_id"}
+    return tool_call.name.strip() + ":" + json.dumps(_normalize(args), sort_keys=True, default=str)
+
+
+class LoopGuard:
+    def __init__(self, max_iterations: int = 40, max_seconds: float = 600.0, max_repeats: int = 3):
+        """Stop a run after `max_iterations` tool calls, `max_seconds` of wall time or `max_repeats` repeated calls"""
+        self.max_iterations = max_iterations
+        self.max_seconds = max_seconds
+        self.max_repeats = max_repeats
+        self.repeats = 0
+        self._started = time.monotonic()
+        # Fingerprint -> history item of the first successful call with it
+        self._seen: Dict[str, MemoryItem] = {}
+        self._indexed = 0
+
+    def start(self) -> None:
+        """Begin a run: reset the clock, the repeat count and the call index"""
+        self._started = time.monotonic()
+        self.repeats = 0
+        self._seen.clear()
+        self._indexed = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def _index(self, history: List[MemoryItem]) -> None:
+        """Fold history items added since the last check into the fingerprint index"""
+        if len(history) < self._indexed:
+            # The history was reset; start over
+            self._seen.clear()
+            self._indexed = 0
+        for item in history[self._indexed:]:
+            if item.action is None:
+                continue
+            name = item.action.name
+            if name in CANVAS_RESETS:
+                self._seen.clear()
+            elif name not in STATE_QUERIES and name != "show_reasoning":
+                # The canvas may have changed, so earlier query results are stale
+                for key in [key for key, seen in self._seen.items() if seen.action.name in STATE_QUERIES]:
+                    del self._seen[key]
+            if item.result is not None and item.result.success:
+                self._seen.setdefault(fingerprint(item.action), item)
+        self._indexed = len(history)
+
+    def check_repeat(self, tool_call: ToolInput, history: List[MemoryItem]) -> Optional[ToolResult]:
+        """The earlier result of an identical call, with a corrective note, or None if the call is new"""
+        self._index(history)
+        seen = self._seen.get(fingerprint(tool_call))
+        if seen is None:
+            return None
+        self.repeats += 1
+        return ToolResult(
+            success=True,
+            content=(
+                f"{seen.result.content} [Repeated call: {tool_call.name} was already called with these "
+                f"arguments in iteration {seen.iteration + 1}, so it was not run again and this is the earlier "
+                f"result. Choose a different action, or give the final answer if the drawing is complete.]"
+            )
+        )
+
+    def exhausted(self, state: AgentState) -> Optional[str]:
+        """Why the run must stop now, or None while it is within its budgets"""
+        if state.iteration >= self.max_iterations:
+            return f"iteration budget of {self.max_iterations} reached"
+        if self.elapsed() >= self.max_seconds:
+            return f"time budget of {self.max_seconds:g}s reached after {state.iteration} iterations"
+        if self.repeats >= self.max_repeats:
+            return f"the model repeated earlier calls {self.repeats} times"
+        return None
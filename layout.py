@@ -0,0 +1,242 @@
+"""Layout compiler: turn one high-level scene spec into concrete drawing calls.
+
+A spec lists objects with a shape, a size and where they go, either at an
+anchor of the canvas or of a containing object, or next to another object:
+
+    {"objects": [
+        {"id": "face", "shape": "oval", "width": 500, "height": 500, "at": "center"},
+        {"id": "left_eye", "shape": "oval", "width": 60, "height": 40, "inside": "face", "at": "top-left"},
+        {"id": "mouth", "shape": "rectangle", "width": 0.5, "height": 0.1, "inside": "face", "at": "bottom"},
+        {"id": "pointer", "shape": "right_arrow", "width": 150, "height": 80, "left_of": "face"},
+        {"id": "title", "shape": "text", "text": "Hello", "size": 24, "below": "face"}
+    ]}
+
+Widths and heights are pixels, or fractions of the container (or canvas)
+when at most 1. Objects are placed in dependency order inside the drawable
+bounds; a placement that would overlap something already on the canvas is
+moved to the nearest free spot the scene graph can find.
+"""
+from dispatch import MIN_X, MAX_X, MIN_Y, MAX_Y
+from models import ToolInput
+from scene import SceneGraph, text_bbox, DEFAULT_TEXT_SIZE
+from typing import Dict, List, Optional, Tuple
+
+# Shapes a spec may use and the tool that draws each
+SHAPE_TOOLS = {
+    "rectangle": "draw_2D_rectangle",
+    "oval": "draw_2D_oval",
+    "right_arrow": "draw_2D_right_arrow_shape",
+    "left_arrow": "draw_2D_left_arrow_shape",
+    "up_arrow": "draw_2D_up_arrow_shape",
+    "down_arrow": "draw_2D_down_arrow_shape",
+    "text": "add_text_in_paint",
+}
+
+DEFAULT_SIZE = (200, 150)
+DEFAULT_GAP = 20
+
+# Fractions of the free width and height placing an object at an anchor
+ANCHORS = {
+    "center": (0.5, 0.5), "top": (0.5, 0.0), "bottom": (0.5, 1.0),
+    "left": (0.0, 0.5), "right": (1.0, 0.5),
+    "top-left": (0.0, 0.0), "top-right": (1.0, 0.0),
+    "bottom-left": (0.0, 1.0), "bottom-right": (1.0, 1.0),
+}
+
+RELATIONS = ("left_of", "right_of", "above", "below")
+
+BBox = Tuple[int, int, int, int]
+
+
+class LayoutError(ValueError):
+    """Raised when a scene spec cannot be laid out"""
+
+
+def _inner_region(bbox: BBox, kind: str) -> BBox:
+    """Area inside a container, keeping a margin from its outline"""
+    x1, y1, x2, y2 = bbox
+    width, height = x2 - x1, y2 - y1
+    margin = max(4, round(min(width, height) * 0.06))
+    # An ellipse's largest inscribed rectangle leaves (1 - 1/sqrt(2)) / 2 of each side outside
+    inset_x, inset_y = (round(width * 0.1465), round(height * 0.1465)) if kind == "oval" else (0, 0)
+    return (x1 + inset_x + margin, y1 + inset_y + margin, x2 - inset_x - margin, y2 - inset_y - margin)
+
+
+def _dependencies(item: dict) -> List[str]:
+    return [item[key] for key in ("inside",) + RELATIONS if key in item]
+
+
+def _ordered(objects: List[dict]) -> List[dict]:
+    """Objects sorted so each comes after the objects it is placed relative to.
+    IDs and references to them are turned into strings, so 1 and "1" name the same object"""
+    by_id = {}
+    for index, item in enumerate(objects):
+        if not isinstance(item, dict):
+            raise LayoutError(f"Object {index} must be a JSON object")
+        item_id = item["id"] = str(item.get("id", f"object_{index + 1}"))
+        for key in ("inside",) + RELATIONS:
+            if key in item:
+                item[key] = str(item[key])
+        if item_id in by_id:
+            raise LayoutError(f"Duplicate object id '{item_id}'")
+        by_id[item_id] = item
+
+    ordered, state = [], {}
+
+    def visit(item_id: str, chain: Tuple[str, ...]):
+        if state.get(item_id) == "done":
+            return
+        if state.get(item_id) == "visiting":
+            raise LayoutError(f"Circular placement: {' -> '.join(chain + (item_id,))}")
+        state[item_id] = "visiting"
+        for dependency in _dependencies(by_id[item_id]):
+            if dependency not in by_id:
+                raise LayoutError(f"Object '{item_id}' refers to unknown object '{dependency}'")
+            visit(dependency, chain + (item_id,))
+        state[item_id] = "done"
+        ordered.append(by_id[item_id])
+
+    for item_id in by_id:
+        visit(item_id, ())
+    return ordered
+
+
+def _dimension(value, available: int, default: int, name: str, item_id: str) -> int:
+    if value is None:
+        return min(default, available)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise LayoutError(f"Object '{item_id}': {name} must be a number, got {value!r}")
+    if value <= 0:
+        raise LayoutError(f"Object '{item_id}': {name} must be positive")
+    return max(1, round(value * available if value <= 1 else value))
+
+
+def _integer(value, name: str, item_id: str) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise LayoutError(f"Object '{item_id}': {name} must be a whole number, got {value!r}")
+
+
+def _clamp_into(bbox: BBox, region: BBox) -> BBox:
+    """Slide a box so it lies inside a region, shrinking it only if it is too big"""
+    x1, y1, x2, y2 = bbox
+    width, height = min(x2 - x1, region[2] - region[0]), min(y2 - y1, region[3] - region[1])
+    x1 = min(max(x1, region[0]), region[2] - width)
+    y1 = min(max(y1, region[1]), region[3] - height)
+    return (x1, y1, x1 + width, y1 + height)
+
+
+class LayoutCompiler:
+    def __init__(self, scene: Optional[SceneGraph] = None, bounds: BBox = (MIN_X, MIN_Y, MAX_X, MAX_Y)):
+        """Lay out specs around the shapes already in `scene`, within `bounds`"""
+        self.bounds = bounds
+        self.graph = SceneGraph(bounds=bounds)
+        if scene is not None:
+            for shape in sorted(scene.shapes.values(), key=lambda shape: shape.z):
+                self.graph.add(shape.kind, shape.bbox, label=shape.label)
+        # Shapes drawn before this spec; the spec's own shapes get higher IDs
+        self._first_new_id = self.graph._next_id
+        self.placed: Dict[str, BBox] = {}
+        # Object IDs in the order their calls were compiled
+        self.order: List[str] = []
+        self._shape_ids: Dict[str, int] = {}
+        self.notes: List[str] = []
+
+    def _conflicts(self, bbox: BBox, allowed: set) -> list:
+        """Shapes a box would overlap, apart from its containers and earlier shapes enclosing it"""
+        conflicts = []
+        for shape in self.graph.overlapping(bbox):
+            if shape.id in allowed:
+                continue
+            encloses = (shape.bbox[0] <= bbox[0] and shape.bbox[1] <= bbox[1]
+                        and bbox[2] <= shape.bbox[2] and bbox[3] <= shape.bbox[3])
+            if encloses and shape.id < self._first_new_id:
+                continue
+            conflicts.append(shape)
+        return conflicts
+
+    def _ancestors(self, item: dict, by_id: Dict[str, dict]) -> set:
+        ids = set()
+        while "inside" in item:
+            ids.add(self._shape_ids[item["inside"]])
+            item = by_id[item["inside"]]
+        return ids
+
+    def _place(self, item: dict, by_id: Dict[str, dict]) -> BBox:
+        item_id, shape = item["id"], item.get("shape")
+        if shape not in SHAPE_TOOLS:
+            raise LayoutError(f"Object '{item_id}': unknown shape {shape!r}; use {', '.join(SHAPE_TOOLS)}")
+
+        container = self.placed[item["inside"]] if "inside" in item else None
+        region = _inner_region(container, by_id[item["inside"]]["shape"]) if container else self.bounds
+        available = (region[2] - region[0], region[3] - region[1])
+        if shape == "text":
+            size = _integer(item.get("size", DEFAULT_TEXT_SIZE), "size", item_id)
+            _, _, width, height = text_bbox(str(item.get("text", "")), 0, 0, size)
+        else:
+            width = _dimension(item.get("width"), available[0], DEFAULT_SIZE[0], "width", item_id)
+            height = _dimension(item.get("height"), available[1], DEFAULT_SIZE[1], "height", item_id)
+
+        relation = next((key for key in RELATIONS if key in item), None)
+        if relation is not None:
+            ox1, oy1, ox2, oy2 = self.placed[item[relation]]
+            gap = _integer(item.get("gap", DEFAULT_GAP), "gap", item_id)
+            center_x, center_y = (ox1 + ox2) // 2, (oy1 + oy2) // 2
+            x, y = {
+                "left_of": (ox1 - gap - width, center_y - height // 2),
+                "right_of": (ox2 + gap, center_y - height // 2),
+                "above": (center_x - width // 2, oy1 - gap - height),
+                "below": (center_x - width // 2, oy2 + gap),
+            }[relation]
+        else:
+            anchor = item.get("at", "center")
+            if anchor not in ANCHORS:
+                raise LayoutError(f"Object '{item_id}': unknown anchor {anchor!r}; use {', '.join(ANCHORS)}")
+            fx, fy = ANCHORS[anchor]
+            x = region[0] + round((available[0] - width) * fx)
+            y = region[1] + round((available[1] - height) * fy)
+
+        bbox = _clamp_into((x, y, x + width, y + height), region)
+        allowed = self._ancestors(item, by_id)
+        if self._conflicts(bbox, allowed):
+            free = self.graph.free_space(bbox[2] - bbox[0], bbox[3] - bbox[1],
+                                         within=region if container else None, near=(bbox[0], bbox[1]))
+            if free is not None and not self._conflicts(free, allowed):
+                self.notes.append(f"moved '{item_id}' to ({free[0]},{free[1]}) to avoid an overlap")
+                bbox = free
+            else:
+                self.notes.append(f"'{item_id}' overlaps existing shapes; no free space of its size was found")
+        self.placed[item_id] = bbox
+        self._shape_ids[item_id] = self.graph.add(shape, bbox, label=item.get("text")).id
+        return bbox
+
+    def compile(self, spec) -> List[ToolInput]:
+        """Resolve a spec into drawing calls, in drawing order"""
+        objects = spec.get("objects") if isinstance(spec, dict) else spec
+        if not isinstance(objects, list) or not objects:
+            raise LayoutError("A scene spec needs a non-empty 'objects' list")
+        objects = [dict(item) if isinstance(item, dict) else item for item in objects]
+        calls = []
+        ordered = _ordered(objects)
+        by_id = {item["id"]: item for item in ordered}
+        for item in ordered:
+            x1, y1, x2, y2 = self._place(item, by_id)
+            tool_name = SHAPE_TOOLS[item["shape"]]
+            if item["shape"] == "text":
+                args = {"text": str(item.get("text", "")), "x": x1, "y": y1,
+                        "size": _integer(item.get("size", DEFAULT_TEXT_SIZE), "size", item["id"])}
+            else:
+                args = {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
+            calls.append(ToolInput(name=tool_name, args=args))
+            self.order.append(item["id"])
+        return calls
+
+
+def compile_layout(spec, scene: Optional[SceneGraph] = None) -> Tuple[List[ToolInput], List[str]]:
+    """Compile a scene spec into drawing calls, returning (calls, layout notes)"""
+    compiler = LayoutCompiler(scene)
+    calls = compiler.compile(spec)
+    return calls, compiler.notes
@@ -0,0 +1,247 @@
+"""Shared LLM client for every agent in the process.
+
+Gemini requests go over one pooled HTTP session with keep-alive
+connections instead of a client per DecisionLayer. Every model call, local
+stand-ins included, first takes a slot from the shared limiter: a
+token-bucket rate limit on requests and on tokens per minute (to stay
+within provider quotas), then a semaphore capping requests in flight. The
+time spent waiting for a slot is recorded. Gemini requests take a slot per
+attempt, so retries count against the request quota, and the backoff
+between attempts holds no slot.
+
+Settings come from the environment unless configure() is called:
+
+    PAINT_LLM_CONCURRENCY   requests in flight across the process (default 4)
+    PAINT_LLM_RPM           requests per minute (default: unlimited)
+    PAINT_LLM_TPM           tokens per minute (default: unlimited)
+    PAINT_LLM_BASE_URL      API root, e.g. a local mock endpoint
+"""
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+import os
+import threading
+import time
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+# Responses worth retrying after a pause
+RETRY_STATUSES = frozenset([429, 500, 503])
+
+# Rough size of a decision reply, added to the prompt when estimating a request's tokens
+REPLY_TOKENS = 100
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Token estimate for a request, at about four characters per token"""
+    return len(prompt) // 4 + REPLY_TOKENS
+
+
+class Reply:
+    """Response object with the `text` attribute decision code reads"""
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """Allow `per_minute` units a minute, in bursts of up to `capacity` (one minute's worth by default)"""
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Take `amount` units, sleeping until they are available; returns the seconds waited"""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def charge(self, amount: float) -> None:
+        """Take units without waiting, e.g. to settle an estimate; the balance may go negative"""
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+
+class LLMClient:
+    def __init__(self, max_in_flight: int = 4, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, base_url: Optional[str] = None,
+                 api_key: Optional[str] = None, timeout: float = 60.0, max_retries: int = 3):
+        """Pooled client allowing `max_in_flight` concurrent requests within the given quotas"""
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.max_in_flight = max_in_flight
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=1000)
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.tokens_used = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMClient":
+        return cls(**_env_options())
+
+    @contextmanager
+    def slot(self, prompt: str, retry: bool = False):
+        """Hold one request slot for the duration of a model call; a retry is not charged for tokens again"""
+        start = time.perf_counter()
+        if self.request_bucket is not None:
+            self.request_bucket.acquire(1)
+        if self.token_bucket is not None and not retry:
+            self.token_bucket.acquire(estimate_tokens(prompt))
+        # Take the slot last so requests held back by the rate limit do not block others' slots
+        self._slots.acquire()
+        with self._lock:
+            self._waits.append(time.perf_counter() - start)
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def generate(self, model: str, prompt: str) -> str:
+        """Call generateContent on a Gemini model and return the reply text, taking a slot per attempt"""
+        url = f"{self.base_url}/models/{model}:generateContent"
+        headers = {"x-goog-api-key": self.api_key or os.getenv("GEMINI_API_KEY", "")}
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot(prompt, retry=attempt > 0):
+                    response = self._session.post(url, json=body, headers=headers, timeout=self.timeout)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                with self._lock:
+                    self.retries += 1
+                time.sleep(_retry_delay(response.headers.get("Retry-After"), attempt))
+                continue
+            if response.status_code >= 400:
+                with self._lock:
+                    self.errors += 1
+                response.raise_for_status()
+            break
+
+        data = response.json()
+        used = data.get("usageMetadata", {}).get("totalTokenCount")
+        if used is not None:
+            with self._lock:
+                self.tokens_used += used
+            if self.token_bucket is not None:
+                # The slot was granted on an estimate; settle the difference
+                self.token_bucket.charge(used - estimate_tokens(prompt))
+        candidates = data.get("candidates") or []
+        if not candidates:
+            raise ValueError(f"No candidates in the response: {data.get('promptFeedback', data)}")
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "tokens_used": self.tokens_used,
+            "peak_in_flight": self.peak_in_flight,
+            "mean_wait_s": round(sum(waits) / len(waits), 4) if waits else None,
+            "p95_wait_s": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else None,
+            "max_wait_s": round(waits[-1], 4) if waits else None,
+        }
+
+    def close(self) -> None:
+        self._session.close()
+
+
+def _retry_delay(retry_after: Optional[str], attempt: int) -> float:
+    """Seconds to wait before a retry: the server's Retry-After in seconds, else exponential backoff"""
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return 0.5 * 2 ** attempt
+
+
+class GeminiModel:
+    """Gemini model called through a shared client (the process-wide one by default)"""
+
+    def __init__(self, name: str, client: Optional[LLMClient] = None):
+        self.name = name
+        self.client = client
+
+    def generate_content(self, prompt: str) -> Reply:
+        return Reply((self.client or shared_client()).generate(self.name, prompt))
+
+
+def _env_options() -> dict:
+    def number(name):
+        value = os.getenv(name)
+        return float(value) if value else None
+    return {
+        "max_in_flight": int(os.getenv("PAINT_LLM_CONCURRENCY", "4")),
+        "requests_per_minute": number("PAINT_LLM_RPM"),
+        "tokens_per_minute": number("PAINT_LLM_TPM"),
+        "base_url": os.getenv("PAINT_LLM_BASE_URL"),
+    }
+
+
+_shared: Optional[LLMClient] = None
+_shared_lock = threading.Lock()
+
+
+def shared_client() -> LLMClient:
+    """The process-wide client, created from the environment on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = LLMClient.from_env()
+        return _shared
+
+
+def configure(**options) -> LLMClient:
+    """Replace the process-wide client; options left as None keep their environment settings"""
+    global _shared
+    settings = _env_options()
+    settings.update((name, value) for name, value in options.items() if value is not None)
+    with _shared_lock:
+        if _shared is not None:
+            _shared.close()
+        _shared = LLMClient(**settings)
+        return _shared
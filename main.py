@@ -2,12 +2,153 @@ from perception import PerceptionLayer
 from memory import MemoryLayer
 from decision import DecisionLayer
 from action import ActionLayer
+from guard import LoopGuard
+from speculate import Speculator
+from plancache import PlanCache, seed_plan
+from runstore import RunStore
 from models import ToolInput, UserQuery
 from rich.console import Console
+from datetime import datetime
+import os
 import time
 
 console = Console()
 
+def run_agent_loop(processed_query, perception, memory, decision, action, system_prompt, state_file=None,
+                   drawlog_file=None, guard=None, speculator=None, user_query=None, plan_cache=None,
+                   recorder=None):
+    """Run decide/act iterations until the decision layer produces a final answer or a budget runs out.
+
+    With a plan cache and the original user query, a cached plan for the same query replaces the
+    planning step, a similar one is offered as a template, and the plan of a run that completed on
+    a valid final decision is cached.
+    A run store recorder receives every decision and tool call.
+    """
+    if drawlog_file is None:
+        drawlog_file = f"logs/drawing_{datetime.now().strftime('%Y%m%d_%H%M%S')}.drawlog"
+    if guard is None:
+        guard = LoopGuard()
+    if speculator is None:
+        speculator = Speculator(decision, action)
+    use_cache = plan_cache is not None and user_query is not None
+    try:
+        if use_cache:
+            match = plan_cache.lookup(user_query)
+            if match is not None:
+                if match.exact:
+                    console.print("[green]Reusing the cached plan for this query[/]")
+                    seed_plan(match, memory, action, perception)
+                else:
+                    console.print(f"[green]Offering a cached plan as a template (similarity {match.similarity:.2f})[/]")
+                processed_query = processed_query + "\n\n" + match.as_template()
+        final_decision = _run_iterations(processed_query, perception, memory, decision, action, system_prompt,
+                                         state_file, guard, speculator, recorder)
+        # A run ending on an unusable reply or a decision error is complete but has no plan worth reusing
+        if (use_cache and final_decision is not None and final_decision.valid
+                and plan_cache.store(user_query, memory.get_state())):
+            plan_cache.save()
+    finally:
+        speculator.close()
+        if recorder is not None:
+            recorder.finish(memory.get_state())
+        if speculator.attempts:
+            stats = speculator.stats()
+            console.print(f"[dim]Speculative decisions: {stats['hits']}/{stats['attempts']} used, "
+                          f"{stats['saved_s']}s of LLM latency overlapped with tool calls[/]")
+        for tier, stats in decision.router.stats().items():
+            console.print(f"[dim]Model tier {tier}: {stats}[/]")
+        # Keep the drawing calls for offline replay, even when the run fails part way
+        console.print(f"[dim]Drawing log saved to {action.drawlog.save(drawlog_file)}[/]")
+
+def _run_iterations(processed_query, perception, memory, decision, action, system_prompt, state_file, guard,
+                    speculator, recorder=None):
+    """Run the loop; returns the final decision, or None if a budget stopped the run"""
+    guard.start()
+    while not memory.get_state().task_complete:
+        # Stop before asking for another decision once a budget is spent
+        stop_reason = guard.exhausted(memory.get_state())
+        if stop_reason:
+            console.print(f"[bold yellow]Stopping run: {stop_reason}[/]")
+            memory.set_stopped(stop_reason)
+            speculator.discard()
+            state_path = memory.save_state_to_file(state_file)
+            console.print(f"[dim]Agent state logged to {state_path}[/]")
+            break
+        
+        # Use the decision requested while the last tool ran if it saw exactly this state,
+        # otherwise get one from the decision layer
+        scene_summary = action.scene.summary()
+        decided_at, start = time.time(), time.perf_counter()
+        decision_output = speculator.resolve(processed_query, memory.get_state(), system_prompt, scene_summary)
+        speculative = decision_output is not None
+        if decision_output is None:
+            decision_output = decision.make_decision(
+                processed_query, 
+                memory.get_state(),
+                system_prompt,
+                scene_summary=scene_summary
+            )
+        iteration = memory.get_state().iteration
+        if recorder is not None:
+            recorder.decision(iteration, decision_output, decided_at, time.perf_counter() - start, speculative)
+        
+        if decision_output.is_final:
+            # Task complete, store final answer
+            console.print(f"[bold green]Task Complete:[/] {decision_output.final_answer}")
+            memory.set_task_complete(decision_output.final_answer)
+            return decision_output
+        else:
+            # Execute the tool
+            tool_call = decision_output.tool_call
+            console.print(f"[cyan]Executing tool:[/] {tool_call.name}")
+            
+            # An exact repeat of an earlier call gets that call's result back instead of running again
+            repeated = guard.check_repeat(tool_call, memory.get_state().history)
+            
+            # Record the action in memory
+            memory.record_action(tool_call)
+            
+            if repeated is not None:
+                console.print(f"[yellow]Skipping repeated call to {tool_call.name}[/]")
+                result = repeated
+                called_at, tool_seconds = time.time(), None
+            else:
+                # Ask for the next decision with the expected result while the tool runs
+                speculator.start(processed_query, memory.get_state(), system_prompt, tool_call)
+                
+                # Execute in action layer
+                called_at, start = time.time(), time.perf_counter()
+                result = action.execute_tool(tool_call)
+                tool_seconds = time.perf_counter() - start
+            
+            # Process the result
+            processed_result = perception.process_tool_result(result, tool_call.name)
+            speculator.learn(tool_call, processed_result)
+            decision.record_outcome(decision_output, processed_result.success and repeated is None)
+            
+            # Store result in memory
+            memory.record_result(processed_result)
+            if recorder is not None:
+                recorder.tool_call(iteration, tool_call, processed_result, called_at, tool_seconds)
+            
+            # Fold in results of earlier timed-out calls that have since completed
+            for request_id, late_result in action.reconcile_timeouts():
+                memory.reconcile_result(request_id, late_result)
+            
+            # Increment iteration counter
+            memory.increment_iteration()
+            
+            # Log the state to file
+            state_path = memory.save_state_to_file(state_file)
+            console.print(f"[dim]Agent state logged to {state_path}[/]")
+            
+            # Only print result if it's not from show_reasoning (already printed)
+            if tool_call.name != "show_reasoning":
+                console.print(f"[green]Result:[/] {processed_result.content}")
+            
+            # Add a waiting message for next decision
+            console.print("[cyan]Waiting for next action decision from LLM...[/]")
+
 def main():
     """Main function to run the agent"""
     # Initialize all layers
@@ -16,26 +157,14 @@ def main():
     memory = MemoryLayer()
     decision = DecisionLayer()
     action = ActionLayer()
+    run_store = recorder = None
     
     try:
-        # Start the MCP server
+        # Start the MCP server; it comes up in the background while the user answers
         console.print("[bold cyan]Starting MCP server...[/]")
         if not action.start_mcp_server():
             console.print("[bold red]Failed to start MCP server. Exiting.[/]")
             return
-            
-        # Wait for tools to be loaded
-        console.print("[bold cyan]Waiting for tools to load...[/]")
-        time.sleep(2)  # Give a bit of time for initialization
-        tools = action.get_tools()
-        if not tools:
-            console.print("[bold red]Failed to get tools. Exiting.[/]")
-            return
-            
-        console.print(f"[green]Successfully loaded {len(tools)} tools[/]")
-        
-        # Create system prompt
-        system_prompt = decision.create_system_prompt(tools)
         
         # Get user input interactively
         console.print("[bold magenta]Welcome to Paint Agent![/]")
@@ -50,10 +179,23 @@ def main():
         description = input("> ")
         
         # Create structured query
-        user_query = UserQuery(
-            description=description,
-            style_preference=style_preference
-        )
+        try:
+            user_query = UserQuery.from_input({"description": description, "style_preference": style_preference})
+        except ValueError as e:
+            console.print(f"[bold red]Invalid query: {e}[/]")
+            return
+        
+        # Wait for tools to be loaded
+        console.print("[bold cyan]Waiting for tools to load...[/]")
+        tools = action.get_tools()
+        if not tools:
+            console.print("[bold red]Failed to get tools. Exiting.[/]")
+            return
+            
+        console.print(f"[green]Successfully loaded {len(tools)} tools[/]")
+        
+        # Create system prompt
+        system_prompt = decision.create_system_prompt(tools)
         
         # Process the query
         processed_query = perception.process_user_query(user_query)
@@ -61,49 +203,14 @@ def main():
         console.print(f"[bold magenta]User Query:[/] {processed_query}")
         console.print("[bold cyan]Beginning agent execution loop...[/]")
         
+        # Record the run in the run store when one is configured
+        if os.getenv("PAINT_RUN_STORE"):
+            run_store = RunStore(os.environ["PAINT_RUN_STORE"])
+            recorder = run_store.start_run(user_query.description, user_query.style_preference)
+        
         # Agent execution loop
-        while not memory.get_state().task_complete:
-            # Get decision from decision layer
-            decision_output = decision.make_decision(
-                processed_query, 
-                memory.get_state(),
-                system_prompt
-            )
-            
-            if decision_output.is_final:
-                # Task complete, store final answer
-                console.print(f"[bold green]Task Complete:[/] {decision_output.final_answer}")
-                memory.set_task_complete(decision_output.final_answer)
-            else:
-                # Execute the tool
-                tool_call = decision_output.tool_call
-                console.print(f"[cyan]Executing tool:[/] {tool_call.name}")
-                
-                # Record the action in memory
-                memory.record_action(tool_call)
-                
-                # Execute in action layer
-                result = action.execute_tool(tool_call)
-                
-                # Process the result
-                processed_result = perception.process_tool_result(result, tool_call.name)
-                
-                # Store result in memory
-                memory.record_result(processed_result)
-                
-                # Increment iteration counter
-                memory.increment_iteration()
-                
-                # Log the state to file
-                state_file = memory.save_state_to_file()
-                console.print(f"[dim]Agent state logged to {state_file}[/]")
-                
-                # Only print result if it's not from show_reasoning (already printed)
-                if tool_call.name != "show_reasoning":
-                    console.print(f"[green]Result:[/] {processed_result.content}")
-                
-                # Add a waiting message for next decision
-                console.print("[cyan]Waiting for next action decision from LLM...[/]")
+        run_agent_loop(processed_query, perception, memory, decision, action, system_prompt,
+                       user_query=user_query, plan_cache=PlanCache(), recorder=recorder)
                 
         console.print("[bold green]=== Agent Execution Complete ===[/]")
         
@@ -116,6 +223,8 @@ def main():
     finally:
         # Clean up
         action.stop()
+        if run_store is not None:
+            run_store.close()
         memory.reset()
         console.print("[bold cyan]Agent resources cleaned up[/]")
 
@@ -30,6 +30,17 @@ class MemoryLayer:
         if self.state.history:
             self.state.history[-1].result = result
             
+    def reconcile_result(self, request_id: str, result: ToolResult) -> None:
+        """Replace the timed-out result of an action with its late result"""
+        for item in reversed(self.state.history):
+            if item.action and item.action.request_id == request_id:
+                item.result = ToolResult(
+                    success=result.success,
+                    content=f"{result.content} (completed after the timeout)",
+                    error=result.error
+                )
+                return
+            
     def increment_iteration(self) -> None:
         """Increment the iteration counter"""
         self.state.iteration += 1
@@ -39,6 +50,10 @@ class MemoryLayer:
         self.state.task_complete = True
         self.state.final_answer = final_answer
         
+    def set_stopped(self, reason: str) -> None:
+        """Record that the run was stopped before the task was complete"""
+        self.state.stop_reason = reason
+        
     def format_history_for_context(self) -> str:
         """Format the history for LLM context"""
         formatted = []
@@ -72,7 +87,10 @@ class MemoryLayer:
             f.write("=== AGENT STATE LOG ===\n")
             f.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
             f.write(f"Current Iteration: {self.state.iteration}\n")
-            f.write(f"Task Complete: {self.state.task_complete}\n\n")
+            f.write(f"Task Complete: {self.state.task_complete}\n")
+            if self.state.stop_reason:
+                f.write(f"Stopped: {self.state.stop_reason}\n")
+            f.write("\n")
             
             if self.state.final_answer:
                 f.write(f"Final Answer: {self.state.final_answer}\n\n")
@@ -101,6 +119,6 @@ class MemoryLayer:
             
             # Also include the raw JSON for programmatic analysis if needed
             f.write("\n\n=== RAW STATE (JSON) ===\n")
-            f.write(json.dumps(self.state.model_dump(), indent=2))
+            f.write(json.dumps(self.state.to_dict(), indent=2))
             
         return filename 
\ No newline at end of file
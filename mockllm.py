@@ -0,0 +1,122 @@
+"""Local stand-in for the Gemini generateContent endpoint, for throughput tests.
+
+The server answers every request after a fixed latency with a canned reply
+and usage metadata, over HTTP/1.1 keep-alive, and counts the connections
+clients open. It can also reject a share of requests with 429 to exercise
+retries.
+
+Usage:
+    python mockllm.py --port 8765 --latency 0.2
+    PAINT_LLM_BASE_URL=http://127.0.0.1:8765/v1beta python batch.py queries.jsonl
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+import argparse
+import json
+import threading
+import time
+
+DEFAULT_REPLY = 'FINAL_ANSWER: done'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.mock.connection_opened()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        mock = self.server.mock
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if ":generateContent" not in self.path:
+            self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        if mock.should_reject():
+            self._send(429, {"error": {"message": "quota exceeded"}}, {"Retry-After": "0"})
+            return
+        prompt = "".join(part.get("text", "") for content in json.loads(body).get("contents", [])
+                         for part in content.get("parts", []))
+        time.sleep(mock.latency)
+        text = mock.reply(prompt)
+        prompt_tokens = len(prompt) // 4
+        self._send(200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(text) // 4,
+                              "totalTokenCount": prompt_tokens + len(text) // 4},
+        })
+
+    def _send(self, status: int, payload: dict, headers: Optional[dict] = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockLLMServer:
+    def __init__(self, latency: float = 0.05, reply: Callable[[str], str] = lambda prompt: DEFAULT_REPLY,
+                 reject_every: int = 0, port: int = 0):
+        """Serve replies after `latency` seconds; every `reject_every`-th request gets a 429 when set"""
+        self.latency = latency
+        self.reply = reply
+        self.reject_every = reject_every
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1beta"
+
+    def connection_opened(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def should_reject(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            return bool(self.reject_every) and self.requests % self.reject_every == 0
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> str:
+        """Serve on a background thread and return the API root URL"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock Gemini generateContent endpoint")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before each reply")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="text returned for every request")
+    parser.add_argument("--reject-every", type=int, default=0, help="answer every Nth request with 429")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.latency, lambda prompt: args.reply, args.reject_every, args.port)
+    print(f"Mock LLM endpoint at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,104 @@
-from pydantic import BaseModel, Field
+from dataclasses import dataclass, field, replace
 from typing import Dict, List, Optional, Union, Any
+import functools
 
-class ToolInput(BaseModel):
+# Types created on every iteration are slotted dataclasses rather than pydantic
+# models: they are built from already-parsed data, so validation buys nothing
+# there. User input is validated with pydantic at the boundary (the CLI, batch
+# files and the daemon's HTTP API) by UserQuery.from_input, which loads pydantic
+# on first use, so importing the models stays cheap.
+
+@dataclass(slots=True)
+class ToolInput:
     """Input for a tool call"""
     name: str
-    args: Dict[str, Any] = {}
+    args: Dict[str, Any] = field(default_factory=dict)
+    request_id: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "args": self.args, "request_id": self.request_id}
 
-class ToolResult(BaseModel):
+@dataclass(slots=True)
+class ToolResult:
     """Result from a tool execution"""
     success: bool
     content: str
     error: Optional[str] = None
 
-class UserQuery(BaseModel):
-    """Structure for user input query"""
-    description: str = Field(..., description="The main description of what to create")
-    style_preference: str = Field(..., description="User's style preference (simple, experimental, abstract, regular, etc.)")
+    def to_dict(self) -> dict:
+        return {"success": self.success, "content": self.content, "error": self.error}
+
+@dataclass(slots=True)
+class UserQuery:
+    """Structure for user input query; build it from untrusted input with from_input()"""
+    # The main description of what to create
+    description: str
+    # User's style preference (simple, experimental, abstract, regular, etc.)
+    style_preference: str
+
+    @classmethod
+    def from_input(cls, data: Any) -> "UserQuery":
+        """Validate a query from the user (a mapping such as a JSON body) and convert it; raises ValueError"""
+        checked = _query_input_model().model_validate(data)
+        return cls(description=checked.description, style_preference=checked.style_preference)
+
+@functools.lru_cache(maxsize=None)
+def _query_input_model():
+    """The pydantic model user input is validated with, defined on first use"""
+    from pydantic import AliasChoices, BaseModel, ConfigDict, Field
 
-class MemoryItem(BaseModel):
+    class QueryInput(BaseModel):
+        model_config = ConfigDict(str_strip_whitespace=True)
+        description: str = Field(min_length=1)
+        style_preference: str = Field("regular", validation_alias=AliasChoices("style_preference", "style"))
+
+    return QueryInput
+
+@dataclass(slots=True)
+class MemoryItem:
     """An item in agent memory"""
     iteration: int
     action: Optional[ToolInput] = None
     result: Optional[ToolResult] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "iteration": self.iteration,
+            "action": self.action.to_dict() if self.action else None,
+            "result": self.result.to_dict() if self.result else None,
+        }
     
-class AgentState(BaseModel):
+@dataclass(slots=True)
+class AgentState:
     """Current state of the agent"""
     iteration: int = 0
-    history: List[MemoryItem] = []
+    history: List[MemoryItem] = field(default_factory=list)
     task_complete: bool = False
     final_answer: Optional[str] = None
+    stop_reason: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """Plain-data form of the state, e.g. for JSON"""
+        return {
+            "iteration": self.iteration,
+            "history": [item.to_dict() for item in self.history],
+            "task_complete": self.task_complete,
+            "final_answer": self.final_answer,
+            "stop_reason": self.stop_reason,
+        }
+
+    def copy_with(self, **changes) -> "AgentState":
+        """Shallow copy with some fields replaced"""
+        return replace(self, **changes)
 
-class DecisionOutput(BaseModel):
+@dataclass(slots=True)
+class DecisionOutput:
     """Output from the decision layer"""
     is_final: bool = False
     final_answer: Optional[str] = None
-    tool_call: Optional[ToolInput] = None 
\ No newline at end of file
+    tool_call: Optional[ToolInput] = None
+    # Model tier that made the decision, and whether its reply could be parsed
+    model_tier: Optional[str] = None
+    valid: bool = True
+    # Tier whose unusable reply was escalated to model_tier, if any
+    escalated_from: Optional[str] = None 
\ No newline at end of file
@@ -2,18 +2,36 @@
 from mcp.server.fastmcp import FastMCP, Image
 from mcp.server.fastmcp.prompts import base
 from mcp.types import TextContent
-from PIL import Image as PILImage
 import sys
-from pywinauto.application import Application
-import win32gui
-import win32con
 import time
-from win32api import GetSystemMetrics
-from pywinauto.keyboard import send_keys
 import os
 
+# Drawing backend: "mspaint" drives MS Paint through pywinauto (Windows only),
+# "headless" draws on an in-memory raster canvas
+PAINT_BACKEND = os.getenv("PAINT_BACKEND", "mspaint")
+if PAINT_BACKEND == "mspaint":
+    from pywinauto.application import Application
+    import win32gui
+    import win32con
+    from win32api import GetSystemMetrics
+    from pywinauto.keyboard import send_keys
+else:
+    from canvas import HeadlessCanvas, shared_canvas_path
+    from snapshot import SnapshotCache
+    from verify import verify_last_change
+from procstats import resident_memory_mb
+from scene import SceneGraph
+from layout import LayoutError, compile_layout
+
 import json
+import atexit
 import tempfile
+import asyncio
+import contextlib
+import contextvars
+import functools
+import inspect
+from collections import OrderedDict
 from rich.console import Console
 from rich.panel import Panel
 import re
@@ -25,14 +43,182 @@ mcp = FastMCP("MSPainter")
 
 # Add global variable declaration
 paint_app = None
+headless_canvas = None
+snapshot_cache = None
+
+# Shapes drawn so far, for scene queries
+scene = SceneGraph()
+
+# Task names verify_task understands besides "shape" and "text"
+VERIFIABLE_KINDS = {"rectangle", "oval", "right_arrow", "left_arrow", "up_arrow", "down_arrow", "text", "shape"}
+
+def _not_open() -> dict:
+    return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
+
+# Results of completed drawing requests, keyed by client request ID, so a
+# retried call returns the original result instead of drawing twice
+MAX_COMPLETED_REQUESTS = 256
+completed_requests = OrderedDict()
+inflight_requests = {}
+
+def idempotent(func):
+    """Deduplicate calls to a tool by an optional request_id argument"""
+    @functools.wraps(func)
+    async def wrapper(*args, request_id: str = "", **kwargs):
+        if not request_id:
+            return await func(*args, **kwargs)
+        if request_id in completed_requests:
+            completed_requests.move_to_end(request_id)
+            return completed_requests[request_id]
+        if request_id in inflight_requests:
+            # The original call is still running; share its result
+            return await asyncio.shield(inflight_requests[request_id])
+        
+        # Record the result even if the client gives up waiting, so a retry
+        # or a later lookup gets the original outcome
+        task = asyncio.ensure_future(func(*args, **kwargs))
+        inflight_requests[request_id] = task
+        task.add_done_callback(functools.partial(_record_request_result, request_id))
+        return await asyncio.shield(task)
+    
+    signature = inspect.signature(func)
+    wrapper.__signature__ = signature.replace(parameters=[
+        *signature.parameters.values(),
+        inspect.Parameter("request_id", inspect.Parameter.KEYWORD_ONLY, default="", annotation=str),
+    ])
+    return wrapper
+
+def _record_request_result(request_id, task):
+    """Move a finished drawing call from the in-flight table to the completed table"""
+    inflight_requests.pop(request_id, None)
+    if not task.cancelled() and task.exception() is None:
+        completed_requests[request_id] = task.result()
+        if len(completed_requests) > MAX_COMPLETED_REQUESTS:
+            completed_requests.popitem(last=False)
+
+def records_shape(func):
+    """Add the shape drawn by a successful call to the scene graph"""
+    @functools.wraps(func)
+    async def wrapper(**kwargs):
+        result = await func(**kwargs)
+        text = result["content"][0].text
+        if not text.startswith(("Error", "Paint is not open")):
+            scene.add_from_call(func.__name__, kwargs)
+        return result
+    return wrapper
+
+class CanvasGate:
+    """Ordered exclusive access for tools that change the canvas, shared access for tools that read it.
+
+    Mutating calls queue in arrival order and run one at a time, with no
+    reads in progress. Reads run together, but wait behind any mutation
+    queued before them, so a client sees the changes it asked for first."""
+
+    def __init__(self):
+        self._order = asyncio.Lock()  # wakes waiters first come, first served
+        self._changed = asyncio.Condition()
+        self._readers = 0
+        self._writers = 0  # queued or running
+        self.mutations = 0
+        self.reads = 0
+        self.peak_readers = 0
+        self.peak_queued = 0
+        self.wait_s = 0.0
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self):
+        if _holding_canvas.get():
+            # A mutation calling another tool, e.g. compose_scene drawing its shapes
+            yield
+            return
+        start = time.perf_counter()
+        async with self._changed:
+            self._writers += 1
+            self.peak_queued = max(self.peak_queued, self._writers)
+        try:
+            async with self._order:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: self._readers == 0)
+                self.mutations += 1
+                self.wait_s += time.perf_counter() - start
+                token = _holding_canvas.set(True)
+                try:
+                    yield
+                finally:
+                    _holding_canvas.reset(token)
+        finally:
+            async with self._changed:
+                self._writers -= 1
+                self._changed.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def shared(self):
+        if _holding_canvas.get():
+            yield
+            return
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._writers == 0)
+            self._readers += 1
+            self.reads += 1
+            self.peak_readers = max(self.peak_readers, self._readers)
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._changed.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "mutations": self.mutations,
+            "reads": self.reads,
+            "queued": self._writers,
+            "peak_queued": self.peak_queued,
+            "peak_parallel_reads": self.peak_readers,
+            "mean_mutation_wait_ms": round(self.wait_s / self.mutations * 1000, 2) if self.mutations else None,
+        }
+
+_holding_canvas = contextvars.ContextVar("holding_canvas", default=False)
+canvas_gate = CanvasGate()
+
+def mutates_canvas(func):
+    """Run a tool that changes the canvas through the ordered queue"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        async with canvas_gate.exclusive():
+            return await func(*args, **kwargs)
+    return wrapper
+
+def reads_canvas(func):
+    """Run a read-only tool on a worker thread, alongside other reads but never during a mutation"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        async with canvas_gate.shared():
+            future = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Keep the canvas shared until the thread has finished reading it
+                await asyncio.wait([future])
+                raise
+    return wrapper
 
 # DEFINE TOOLS
 
 @mcp.tool()
+@idempotent
+@mutates_canvas
+@records_shape
 async def draw_2D_rectangle(x1: int, y1: int, x2: int, y2: int) -> dict:
     """Draw a rectangle in Paint from (x1,y1) to (x2,y2)"""
     global paint_app
     try:
+        if PAINT_BACKEND == "headless":
+            if headless_canvas is None:
+                return _not_open()
+            headless_canvas.draw_rectangle(x1, y1, x2, y2)
+            return {"content":[TextContent(type="text",text=f"Rectangle drawn from ({x1},{y1}) to ({x2},{y2})")]}
         if not paint_app:
             return {
                 "content": [
@@ -80,10 +266,19 @@ async def draw_2D_rectangle(x1: int, y1: int, x2: int, y2: int) -> dict:
         }
 
 @mcp.tool()
-async def add_text_in_paint(text: str) -> dict:
-    """Add text in Paint"""
+@idempotent
+@mutates_canvas
+@records_shape
+async def add_text_in_paint(text: str, x: int = 350, y: int = 533, size: int = 10) -> dict:
+    """Add a line of text in Paint with its top-left corner at (x, y); size is the font size in pixels"""
     global paint_app
     try:
+        if PAINT_BACKEND == "headless":
+            if headless_canvas is None:
+                return _not_open()
+            headless_canvas.draw_text(text, x, y, size)
+            return {"content":[TextContent(type="text",text=f"Text:'{text}' added successfully")]}
+        
         if not paint_app:
             return {
                 "content": [
@@ -110,7 +305,8 @@ async def add_text_in_paint(text: str) -> dict:
 
         # 2) Click on canvas to begin your text box
         canvas = paint_window.child_window(class_name='MSPaintView')
-        canvas.click_input(coords=(350, 533))
+        # Paint keeps its current font size; size only applies to the headless backend
+        canvas.click_input(coords=(x, y))
         time.sleep(0.5)
 
         # 3) Type the actual text
@@ -139,10 +335,22 @@ async def add_text_in_paint(text: str) -> dict:
         }
 
 @mcp.tool()
+@mutates_canvas
 async def open_paint() -> dict:
     """Open Microsoft Paint maximized on secondary monitor"""
-    global paint_app
+    global paint_app, headless_canvas, snapshot_cache
     try:
+        scene.clear()
+        if PAINT_BACKEND == "headless":
+            # Reuse the shared canvas so clients keep their mapping and versions stay monotonic
+            if headless_canvas is None:
+                headless_canvas = HeadlessCanvas(shared_path=shared_canvas_path())
+                atexit.register(headless_canvas.close)
+                snapshot_cache = SnapshotCache(headless_canvas)
+            else:
+                headless_canvas.clear()
+            return {"content":[TextContent(type="text",text="Paint opened successfully on a blank headless canvas")]}
+        
         paint_app = Application().start('mspaint.exe')
         time.sleep(0.2)
         
@@ -183,6 +391,154 @@ async def open_paint() -> dict:
             ]
         }
 
+@mcp.tool()
+@reads_canvas
+def save_canvas(path: str) -> dict:
+    """Save the current canvas to an image file (PNG, BMP, ...) at the given path"""
+    global paint_app
+    try:
+        if PAINT_BACKEND == "headless":
+            if headless_canvas is None:
+                return _not_open()
+            headless_canvas.save(path)
+        else:
+            if not paint_app:
+                return _not_open()
+            from PIL import ImageGrab
+            view = paint_app.window(class_name="MSPaintApp").child_window(class_name="MSPaintView")
+            rect = view.rectangle()
+            ImageGrab.grab(bbox=(rect.left, rect.top, rect.right, rect.bottom), all_screens=True).save(path)
+        return {"content":[TextContent(type="text",text=f"Canvas saved to {path}")]}
+    except Exception as e:
+        return {"content":[TextContent(type="text",text=f"Error saving canvas: {e}")]}
+
+@mcp.tool()
+@reads_canvas
+def get_canvas_snapshot(scale: float = 1.0, x1: Optional[int] = None, y1: Optional[int] = None,
+                        x2: Optional[int] = None, y2: Optional[int] = None, format: str = "png",
+                        since_version: Optional[int] = None) -> list:
+    """Return an image of the canvas, optionally scaled down and cropped to box x1,y1,x2,y2.
+    format is png, jpeg or webp. With since_version, only the tiles changed after that version are returned"""
+    region = None if None in (x1, y1, x2, y2) else (x1, y1, x2, y2)
+    if PAINT_BACKEND == "headless":
+        if snapshot_cache is None:
+            raise ValueError("Paint is not open. Please call open_paint first.")
+        if since_version is not None:
+            changes = snapshot_cache.changed_tiles(since_version, scale, format)
+            images = [Image(data=tile.pop("data"), format=changes["format"]) for tile in changes["tiles"]]
+            return [TextContent(type="text", text=json.dumps(changes))] + images
+
+        shot = snapshot_cache.snapshot(scale, region, format)
+        data = shot.pop("data")
+        return [TextContent(type="text", text=json.dumps(shot)), Image(data=data, format=shot["format"])]
+
+    if not paint_app:
+        raise ValueError("Paint is not open. Please call open_paint first.")
+    if since_version is not None:
+        raise ValueError("Incremental snapshots need the headless backend")
+    import io
+    from PIL import Image as PILImage, ImageGrab
+    from snapshot import FORMATS
+    fmt = format.lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported snapshot format '{fmt}'. Use png, jpeg or webp")
+    view = paint_app.window(class_name="MSPaintApp").child_window(class_name="MSPaintView")
+    rect = view.rectangle()
+    captured = ImageGrab.grab(bbox=(rect.left, rect.top, rect.right, rect.bottom), all_screens=True)
+    if region is not None:
+        captured = captured.crop((min(x1, x2), min(y1, y2), max(x1, x2) + 1, max(y1, y2) + 1))
+    if scale != 1.0:
+        captured = captured.resize((max(1, round(captured.width * scale)), max(1, round(captured.height * scale))),
+                                   PILImage.BOX)
+    buffer = io.BytesIO()
+    captured.convert("RGB").save(buffer, format=FORMATS[fmt])
+    shot = {"region": list(region) if region else None, "scale": scale, "format": fmt,
+            "width": captured.width, "height": captured.height, "cache_hit": False}
+    return [TextContent(type="text", text=json.dumps(shot)), Image(data=buffer.getvalue(), format=fmt)]
+
+@mcp.tool()
+@reads_canvas
+def get_canvas_handle() -> TextContent:
+    """Return the path of the memory-mapped headless canvas and its current version"""
+    if PAINT_BACKEND != "headless":
+        raise ValueError("Shared canvas access needs the headless backend")
+    if headless_canvas is None or headless_canvas.shared_path is None:
+        raise ValueError("Paint is not open. Please call open_paint first.")
+    return TextContent(type="text", text=json.dumps({
+        "path": headless_canvas.shared_path,
+        "width": headless_canvas.width,
+        "height": headless_canvas.height,
+        "version": headless_canvas.version,
+    }))
+
+@mcp.tool()
+@mutates_canvas
+async def reset_canvas() -> dict:
+    """Clear the whole canvas so a new drawing can start"""
+    global paint_app
+    try:
+        completed_requests.clear()
+        scene.clear()
+        if PAINT_BACKEND == "headless":
+            if headless_canvas is not None:
+                headless_canvas.clear()
+        elif paint_app:
+            paint_window = paint_app.window(class_name="MSPaintApp")
+            if not paint_window.has_focus():
+                paint_window.set_focus(); time.sleep(0.2)
+            send_keys('^a{DELETE}')
+            time.sleep(0.2)
+        return {"content":[TextContent(type="text",text="Canvas cleared")]}
+    except Exception as e:
+        return {"content":[TextContent(type="text",text=f"Error clearing canvas: {e}")]}
+
+@mcp.tool()
+def server_stats() -> TextContent:
+    """Report the server's process ID, resident memory in MB and canvas queue counters"""
+    return TextContent(
+        type="text",
+        text=json.dumps({"pid": os.getpid(), "rss_mb": resident_memory_mb(), "canvas": canvas_gate.stats()})
+    )
+
+@mcp.tool()
+@reads_canvas
+def query_scene(op: str, x1: int = 0, y1: int = 0, x2: int = 0, y2: int = 0,
+                shape_id: int = 0, container_id: int = 0, width: int = 0, height: int = 0) -> TextContent:
+    """Query the shapes already on the canvas. op is one of:
+    summary; list; overlaps (shapes intersecting box x1,y1,x2,y2); containers (shapes enclosing that box);
+    inside (is shape_id inside container_id); free_space (an empty width x height box, inside container_id if given)"""
+    return TextContent(
+        type="text",
+        text=json.dumps(scene.query(op, x1, y1, x2, y2, shape_id, container_id, width, height))
+    )
+
+@mcp.tool()
+@mutates_canvas
+async def compose_scene(spec: dict) -> dict:
+    """Lay out and draw a whole scene in one call. spec is {"objects": [...]}; each object has an id, a shape
+    (rectangle, oval, right_arrow, left_arrow, up_arrow, down_arrow or text), width and height in pixels or as
+    fractions (<= 1) of its container, text and size for text, and one placement: "at" an anchor (center, top,
+    bottom, left, right, top-left, top-right, bottom-left, bottom-right) of the canvas or of the object named by
+    "inside", or left_of / right_of / above / below another object with an optional gap.
+    Overlapping placements are moved to nearby free space"""
+    try:
+        calls, notes = compile_layout(spec, scene)
+    except LayoutError as e:
+        return {"content":[TextContent(type="text",text=f"Error: {e}")]}
+    drawn = []
+    for call in calls:
+        result = await globals()[call.name](**call.args)
+        drawn.append(f"{call.name}: {result['content'][0].text}")
+    return {"content":[TextContent(type="text",text="\n".join(drawn + notes))]}
+
+@mcp.tool()
+async def lookup_request(request_id: str) -> dict:
+    """Look up the result of an earlier drawing call by its request ID"""
+    if request_id in completed_requests:
+        return completed_requests[request_id]
+    status = "still pending" if request_id in inflight_requests else "unknown"
+    raise ValueError(f"Request {request_id} is {status}")
+
 @mcp.tool()
 def show_reasoning(steps) -> TextContent:
     """
@@ -222,10 +578,18 @@ def show_reasoning(steps) -> TextContent:
     )
 
 @mcp.tool()
+@idempotent
+@mutates_canvas
+@records_shape
 async def draw_2D_oval(x1: int, y1: int, x2: int, y2: int) -> dict:
     """Draw an oval in Paint from (x1,y1) to (x2,y2)"""
     global paint_app
     try:
+        if PAINT_BACKEND == "headless":
+            if headless_canvas is None:
+                return _not_open()
+            headless_canvas.draw_oval(x1, y1, x2, y2)
+            return {"content":[TextContent(type="text",text=f"Oval drawn from ({x1},{y1}) to ({x2},{y2})")]}
         if not paint_app:
             return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
         paint_window = paint_app.window(class_name="MSPaintApp")
@@ -246,10 +610,18 @@ async def draw_2D_oval(x1: int, y1: int, x2: int, y2: int) -> dict:
         return {"content":[TextContent(type="text",text=f"Error drawing oval: {e}")]}
 
 @mcp.tool()
+@idempotent
+@mutates_canvas
+@records_shape
 async def draw_2D_right_arrow_shape(x1: int, y1: int, x2: int, y2: int) -> dict:
     """Draw a right arrow in Paint from (x1,y1) to (x2,y2)"""
     global paint_app
     try:
+        if PAINT_BACKEND == "headless":
+            if headless_canvas is None:
+                return _not_open()
+            headless_canvas.draw_arrow("right", x1, y1, x2, y2)
+            return {"content":[TextContent(type="text",text=f"Right arrow drawn from ({x1},{y1}) to ({x2},{y2})")]}
         if not paint_app:
             return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
         paint_window = paint_app.window(class_name="MSPaintApp")
@@ -269,10 +641,18 @@ async def draw_2D_right_arrow_shape(x1: int, y1: int, x2: int, y2: int) -> dict:
         return {"content":[TextContent(type="text",text=f"Error drawing right arrow: {e}")]}
 
 @mcp.tool()
+@idempotent
+@mutates_canvas
+@records_shape
 async def draw_2D_left_arrow_shape(x1: int, y1: int, x2: int, y2: int) -> dict:
     """Draw a left arrow in Paint from (x1,y1) to (x2,y2)"""
     global paint_app
     try:
+        if PAINT_BACKEND == "headless":
+            if headless_canvas is None:
+                return _not_open()
+            headless_canvas.draw_arrow("left", x1, y1, x2, y2)
+            return {"content":[TextContent(type="text",text=f"Left arrow drawn from ({x1},{y1}) to ({x2},{y2})")]}
         if not paint_app:
             return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
         paint_window = paint_app.window(class_name="MSPaintApp")
@@ -292,10 +672,18 @@ async def draw_2D_left_arrow_shape(x1: int, y1: int, x2: int, y2: int) -> dict:
         return {"content":[TextContent(type="text",text=f"Error drawing left arrow: {e}")]}
 
 @mcp.tool()
+@idempotent
+@mutates_canvas
+@records_shape
 async def draw_2D_up_arrow_shape(x1: int, y1: int, x2: int, y2: int) -> dict:
     """Draw an up arrow in Paint from (x1,y1) to (x2,y2)"""
     global paint_app
     try:
+        if PAINT_BACKEND == "headless":
+            if headless_canvas is None:
+                return _not_open()
+            headless_canvas.draw_arrow("up", x1, y1, x2, y2)
+            return {"content":[TextContent(type="text",text=f"Up arrow drawn from ({x1},{y1}) to ({x2},{y2})")]}
         if not paint_app:
             return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
         paint_window = paint_app.window(class_name="MSPaintApp")
@@ -315,10 +703,18 @@ async def draw_2D_up_arrow_shape(x1: int, y1: int, x2: int, y2: int) -> dict:
         return {"content":[TextContent(type="text",text=f"Error drawing up arrow: {e}")]}
 
 @mcp.tool()
+@idempotent
+@mutates_canvas
+@records_shape
 async def draw_2D_down_arrow_shape(x1: int, y1: int, x2: int, y2: int) -> dict:
     """Draw a down arrow in Paint from (x1,y1) to (x2,y2)"""
     global paint_app
     try:
+        if PAINT_BACKEND == "headless":
+            if headless_canvas is None:
+                return _not_open()
+            headless_canvas.draw_arrow("down", x1, y1, x2, y2)
+            return {"content":[TextContent(type="text",text=f"Down arrow drawn from ({x1},{y1}) to ({x2},{y2})")]}
         if not paint_app:
             return {"content":[TextContent(type="text",text="Paint is not open. Please call open_paint first.")]}
         paint_window = paint_app.window(class_name="MSPaintApp")
@@ -336,82 +732,120 @@ async def draw_2D_down_arrow_shape(x1: int, y1: int, x2: int, y2: int) -> dict:
         return {"content":[TextContent(type="text",text=f"Down arrow drawn from ({x1},{y1}) to ({x2},{y2})")]}
     except Exception as e:
         return {"content":[TextContent(type="text",text=f"Error drawing down arrow: {e}")]}
-'''
+
+# Pencil button on Paint's Home ribbon, on the same layout as the shape buttons
+PENCIL_TOOL_COORDS = (180, 63)
+
+def _trace_path_in_paint(points, closed: bool = False) -> None:
+    """Drag Paint's pencil through a list of points"""
+    paint_window = paint_app.window(class_name='MSPaintApp')
+    if not paint_window.has_focus():
+        paint_window.set_focus(); time.sleep(0.2)
+    paint_window.click_input(coords=PENCIL_TOOL_COORDS)
+    time.sleep(0.2)
+    canvas = paint_window.child_window(class_name='MSPaintView')
+    path = [tuple(point) for point in points] + ([tuple(points[0])] if closed else [])
+    canvas.press_mouse_input(coords=path[0])
+    for point in path[1:]:
+        canvas.move_mouse_input(coords=point, pressed="left")
+    canvas.release_mouse_input(coords=path[-1])
+    time.sleep(0.2)
+
+async def _draw_path(kind: str, points: list[list[int]], closed: bool, curve: bool) -> dict:
+    count = len(points)
+    try:
+        if PAINT_BACKEND == "headless":
+            if headless_canvas is None:
+                return _not_open()
+            if curve:
+                headless_canvas.draw_curve(points, closed)
+            else:
+                headless_canvas.draw_polyline(points, closed)
+        else:
+            if not paint_app:
+                return _not_open()
+            if curve:
+                from canvas import catmull_rom
+                points = catmull_rom(points, closed).round().astype(int).tolist()
+            _trace_path_in_paint(points, closed)
+        return {"content":[TextContent(type="text",text=f"{kind} drawn through {count} points")]}
+    except Exception as e:
+        return {"content":[TextContent(type="text",text=f"Error drawing {kind.lower()}: {e}")]}
+
+@mcp.tool()
+@idempotent
+@mutates_canvas
+@records_shape
+async def draw_polyline(points: list[list[int]]) -> dict:
+    """Draw connected straight lines through points, a list of [x, y] pairs such as [[100, 300], [200, 250], [300, 300]]"""
+    return await _draw_path("Polyline", points, closed=False, curve=False)
+
+@mcp.tool()
+@idempotent
+@mutates_canvas
+@records_shape
+async def draw_polygon(points: list[list[int]]) -> dict:
+    """Draw a closed polygon through points, a list of [x, y] pairs; the last point joins the first"""
+    return await _draw_path("Polygon", points, closed=True, curve=False)
+
 @mcp.tool()
-async def verify_task(task: str, expected_count: Optional[int] = None) -> dict:
+@idempotent
+@mutates_canvas
+@records_shape
+async def draw_curve(points: list[list[int]], closed: bool = False) -> dict:
+    """Draw a smooth curve passing through points, a list of [x, y] pairs; closed joins the ends smoothly"""
+    return await _draw_path("Curve", points, closed=closed, curve=True)
+
+@mcp.tool()
+@reads_canvas
+def verify_task(task: str, expected_count: Optional[int] = None,
+                x1: Optional[int] = None, y1: Optional[int] = None,
+                x2: Optional[int] = None, y2: Optional[int] = None) -> dict:
     """
     Verify that the previous drawing or writing action was performed successfully.
     
     Parameters:
-      - task (str): A description of what is to be verified. For example: "shape" or "text".
-      - expected_count (int, optional): For shape verification, the expected number of shapes on the canvas.
+      - task (str): What the last action should have produced: "shape", "text", or a specific
+        shape (rectangle, oval, right_arrow, left_arrow, up_arrow, down_arrow).
+      - expected_count (int, optional): The number of separate shapes expected on the canvas.
+      - x1, y1, x2, y2 (int, optional): The corners the last shape was drawn with.
       
     Examples:
       - After drawing the first shape:
-          verify_task("shape", 1)  # expecting 1 shape on the canvas.
-      - After drawing the second shape:
-          verify_task("shape", 2)  # expecting 2 shapes on the canvas.
-      - After drawing the third shape:
-          verify_task("shape", 3)  # expecting 3 shapes on the canvas.
+          verify_task("rectangle", 1, 272, 310, 559, 657)
       - After adding text:
-          verify_task("text", 1)  # verifies that text is present.
+          verify_task("text")
           
-    If the tool determines that what has been drawn does not meet expectations, the agent may decide
-    to retry the last action with altered parameters.
-    
-    Note: This verification is simulated. In a production system, one might capture a screenshot from the canvas,
-    analyze it (for example, by counting drawn objects or detecting text), and then return the appropriate verification result.
+    If the tool reports a problem, the agent may decide to retry the last action with altered parameters.
+    Touching or overlapping outlines are counted as one shape.
     """
-    global paint_app
     try:
-        if not paint_app:
-            return {
-                "content": [
-                    TextContent(
-                        type="text",
-                        text="Paint is not open. Please call open_paint first."
-                    )
-                ]
-            }
-            
-        # Simulate verification based on provided parameters.
-        if expected_count is not None:
-            # Simulate verification for shapes using the expected count.
-            message = f"Verification successful: Canvas shows {expected_count} shape(s) as expected."
-        elif "text" in task.lower():
-            # Simulate text verification.
-            message = "Verification successful: Canvas contains text as expected."
+        if PAINT_BACKEND != "headless":
+            return {"content":[TextContent(type="text",text="Verification needs the headless canvas backend; it is not available in MS Paint.")]}
+        if headless_canvas is None:
+            return _not_open()
+        
+        start = time.perf_counter()
+        kind = task.strip().lower().replace(" ", "_")
+        if kind not in VERIFIABLE_KINDS:
+            kind = "text" if "text" in kind else "shape"
+        expected_bbox = (x1, y1, x2, y2) if None not in (x1, y1, x2, y2) else None
+        report = verify_last_change(
+            headless_canvas.previous, headless_canvas.pixels,
+            expected_kind=kind, expected_bbox=expected_bbox, expected_count=expected_count
+        )
+        report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        
+        if report["ok"]:
+            message = f"Verification successful: detected {report['detected_kind']} at {report['changed_bbox']}"
+            if expected_count is not None:
+                message += f" and {report['shape_count']} shape(s) on the canvas as expected"
         else:
-            message = f"Verification complete for task '{task}'."
-            
-        return {
-            "content": [
-                TextContent(
-                    type="text",
-                    text=message
-                )
-            ]
-        }
+            message = "Verification failed: " + "; ".join(report["problems"])
+        return {"content":[TextContent(type="text",text=f"{message}. Details: {json.dumps(report)}")]}
     except Exception as e:
-        return {
-            "content": [
-                TextContent(
-                    type="text",
-                    text=f"Verification failed: {str(e)}"
-                )
-            ]
-        }
+        return {"content":[TextContent(type="text",text=f"Verification failed: {str(e)}")]}
 
-# Override the input schema for verify_task to mark expected_count as optional.
-verify_task.inputSchema = {
-    "type": "object",
-    "properties": {
-        "task": {"type": "string"},
-        "expected_count": {"type": "integer"}
-    },
-    "required": ["task"]
-}
-'''
 # DEFINE RESOURCES
 
 # Add a dynamic greeting resource
@@ -435,7 +869,17 @@ def debug_error(error: str) -> list[base.Message]:
         base.AssistantMessage("I'll help debug that. What have you tried so far?"),
     ]
 
+# Local network transports, several clients sharing one canvas: `python paint_mcp_tools.py sse 8000`
+# serves SSE at http://127.0.0.1:8000/sse, `http` serves streamable HTTP at /mcp
+NETWORK_TRANSPORTS = {"sse": "sse", "http": "streamable-http"}
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in NETWORK_TRANSPORTS:
+        mcp.settings.host = os.getenv("PAINT_MCP_HOST", "127.0.0.1")
+        mcp.settings.port = int(sys.argv[2]) if len(sys.argv) > 2 else int(os.getenv("PAINT_MCP_PORT", "8000"))
+        mcp.settings.log_level = "WARNING"
+        mcp.run(transport=NETWORK_TRANSPORTS[sys.argv[1]])
+        sys.exit()
     # Use a handshake message that the client is waiting for.
     print("MCP HANDSHAKE", flush=True)
     if len(sys.argv) > 1 and sys.argv[1] == "dev":
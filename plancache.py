@@ -0,0 +1,230 @@
+"""Local cache of plans and drawing sequences from finished runs.
+
+Queries are normalized (lowercased, punctuation and filler words dropped)
+and summarized by a MinHash signature of their character n-grams, so
+near-duplicate descriptions can be found without any network call. A query
+whose normalized description and style match a cached one exactly reuses
+that plan and skips the planning call; a similar query in the same style
+gets the closest plan and call sequence offered to the model as a template.
+"""
+from models import AgentState, ToolInput, UserQuery
+from typing import List, Optional
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+
+# Words that do not change what is drawn
+STOPWORDS = frozenset([
+    "a", "an", "the", "of", "and", "with", "in", "on", "please", "draw", "create", "make",
+    "image", "picture", "drawing", "me", "some", "that", "this", "to", "i", "want", "would", "like",
+])
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+# Mersenne prime for the permutation hashes; products of two values below it fit in int64
+PRIME = (1 << 31) - 1
+
+# Calls that are part of a run's mechanics rather than its drawing
+_UNTEMPLATED = frozenset(["show_reasoning", "open_paint", "query_scene", "verify_task"])
+
+
+@functools.lru_cache(maxsize=None)
+def _permutations():
+    """Coefficients (a, b) of the MinHash permutations, drawn from a fixed seed"""
+    import numpy as np
+    rng = np.random.default_rng(0x5EED)
+    return (rng.integers(1, PRIME, NUM_PERMUTATIONS, dtype=np.int64),
+            rng.integers(0, PRIME, NUM_PERMUTATIONS, dtype=np.int64))
+
+
+def normalize(text: str) -> str:
+    words = re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
+    return " ".join(word for word in words if word not in STOPWORDS)
+
+
+def query_key(query: UserQuery) -> str:
+    """Exact-match key of a query: its normalized style and description"""
+    return normalize(query.style_preference) + "|" + normalize(query.description)
+
+
+def _is_empty(key: str) -> bool:
+    """Whether a key's description normalized away to nothing"""
+    return not key.split("|", 1)[-1]
+
+
+def signature(key: str) -> "np.ndarray":
+    """MinHash signature of the character n-grams of a key's description"""
+    import numpy as np
+    text = " " + key.split("|", 1)[-1] + " "
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little") % PRIME for s in shingles],
+        dtype=np.int64
+    )
+    perm_a, perm_b = _permutations()
+    return ((perm_a[:, None] * hashes[None, :] + perm_b[:, None]) % PRIME).min(axis=1)
+
+
+def _format_call(call: dict) -> str:
+    args = ", ".join(f"{name}={value!r}" for name, value in call["args"].items())
+    return f"{call['name']}({args})"
+
+
+class PlanMatch:
+    __slots__ = ("entry", "similarity", "exact")
+
+    def __init__(self, entry: dict, similarity: float, exact: bool):
+        self.entry = entry
+        self.similarity = similarity
+        self.exact = exact
+
+    @property
+    def steps(self) -> List[str]:
+        return self.entry["steps"]
+
+    def as_template(self, max_calls: int = 30) -> str:
+        """Prompt text offering the cached plan and drawing calls as a starting point"""
+        lines = [
+            f'A similar earlier request ("{self.entry["description"]}", style "{self.entry["style"]}") '
+            f"was completed with this plan:",
+        ]
+        lines += [f"{index}. {step}" for index, step in enumerate(self.steps, start=1)]
+        calls = self.entry["calls"]
+        if calls:
+            lines.append("and these drawing calls:")
+            lines += [_format_call(call) for call in calls[:max_calls]]
+            if len(calls) > max_calls:
+                lines.append(f"... and {len(calls) - max_calls} more")
+        lines.append("Adapt it to this request where it differs.")
+        return "\n".join(lines)
+
+
+class PlanCache:
+    def __init__(self, path: str = "logs/plan_cache.json", threshold: float = 0.4, max_entries: int = 1000):
+        """Plans of finished runs; queries at least `threshold` similar count as near hits"""
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: List[dict] = []
+        # Signature matrix and normalized styles of the entries, built by _rebuild
+        self._signatures = None
+        self._styles = None
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _rebuild(self) -> None:
+        import numpy as np
+        self._by_key = {entry["key"]: index for index, entry in enumerate(self._entries)}
+        self._signatures = np.array([entry["signature"] for entry in self._entries],
+                                    dtype=np.int64).reshape(-1, NUM_PERMUTATIONS)
+        self._styles = np.array([entry["key"].split("|", 1)[0] for entry in self._entries], dtype=object)
+
+    def lookup(self, query: UserQuery) -> Optional[PlanMatch]:
+        """The cached plan matching a query exactly, else the most similar one in its style above the threshold"""
+        key = query_key(query)
+        with self._lock:
+            if _is_empty(key):
+                # "draw a picture" says nothing to match another query on
+                self.misses += 1
+                return None
+            index = self._by_key.get(key)
+            if index is not None:
+                self.exact_hits += 1
+                return PlanMatch(self._entries[index], 1.0, exact=True)
+            if len(self._entries):
+                import numpy as np
+                similarities = (self._signatures == signature(key)).mean(axis=1)
+                # A plan for another style is no template for this one, however close the description
+                similarities = np.where(self._styles == key.split("|", 1)[0], similarities, -1.0)
+                best = int(similarities.argmax())
+                if similarities[best] >= self.threshold:
+                    self.near_hits += 1
+                    return PlanMatch(self._entries[best], float(similarities[best]), exact=False)
+            self.misses += 1
+            return None
+
+    def store(self, query: UserQuery, state: AgentState) -> bool:
+        """Remember the plan and drawing calls of a completed run; returns False if it had no plan
+        or the query has no words to match on"""
+        key = query_key(query)
+        if _is_empty(key):
+            return False
+        steps = None
+        calls = []
+        for item in state.history:
+            action, result = item.action, item.result
+            if action is None or result is None or not result.success:
+                continue
+            if action.name == "show_reasoning" and steps is None:
+                steps = action.args.get("steps")
+                if isinstance(steps, str):
+                    try:
+                        steps = json.loads(steps)
+                    except ValueError:
+                        steps = [steps]
+            elif action.name not in _UNTEMPLATED:
+                calls.append({"name": action.name, "args": action.args})
+        if not state.task_complete or not isinstance(steps, list) or not steps:
+            return False
+
+        entry = {
+            "key": key,
+            "description": query.description,
+            "style": query.style_preference,
+            "steps": [str(step) for step in steps],
+            "calls": calls,
+            "signature": signature(key).tolist(),
+        }
+        with self._lock:
+            index = self._by_key.get(key)
+            if index is not None:
+                del self._entries[index]
+            self._entries.append(entry)
+            del self._entries[:-self.max_entries]
+            self._rebuild()
+        return True
+
+    def load(self) -> None:
+        """Load cached plans, ignoring a missing or corrupt file"""
+        try:
+            with open(self.path) as f:
+                entries = json.load(f).get("entries", [])
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._entries = [entry for entry in entries
+                             if len(entry.get("signature", ())) == NUM_PERMUTATIONS][-self.max_entries:]
+            self._rebuild()
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {"entries": list(self._entries)}
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits, "misses": self.misses}
+
+
+def seed_plan(match: PlanMatch, memory, action, perception) -> None:
+    """Record a cached plan as the run's first step, as if the model had just shown it"""
+    tool_call = ToolInput(name="show_reasoning", args={"steps": match.steps})
+    memory.record_action(tool_call)
+    memory.record_result(perception.process_tool_result(action.execute_tool(tool_call), tool_call.name))
+    memory.increment_iteration()
@@ -0,0 +1,253 @@
+"""A warm pool of initialized MCP server sessions.
+
+Starting an ActionLayer spawns a server process and waits for the MCP
+handshake, which costs seconds per run. The pool keeps `size` sessions
+ready, leases them to agent runs, clears the canvas when a lease ends and
+recycles a server after `max_leases` leases or once its resident memory
+passes `max_rss_mb`. Idle members are health-checked in the background.
+A replacement server that fails to start is retried with backoff; once no
+member is left running or restarting, lease() raises PoolError instead of
+waiting.
+"""
+from action import ActionLayer
+from contextlib import contextmanager
+from rich.console import Console
+from typing import Optional
+import queue
+import threading
+import time
+
+console = Console()
+
+
+class PoolError(RuntimeError):
+    """Raised when the pool cannot provide a working session"""
+
+
+class _PoolMember:
+    def __init__(self, action: ActionLayer):
+        self.action = action
+        self.leases = 0
+
+
+class McpServerPool:
+    def __init__(self, size: int = 2, backend: Optional[str] = "headless", max_leases: int = 50,
+                 max_rss_mb: Optional[float] = 500.0, health_check_interval: float = 30.0,
+                 respawn_attempts: int = 3, respawn_backoff: float = 1.0):
+        """Configure the pool; call start() to spawn the servers"""
+        self.size = size
+        self.respawn_attempts = respawn_attempts
+        self.respawn_backoff = respawn_backoff
+        self.backend = backend
+        self.max_leases = max_leases
+        self.max_rss_mb = max_rss_mb
+        self.health_check_interval = health_check_interval
+
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._health_thread = None
+        # Members running, leased or being (re)started; lease() gives up when none are left
+        self._members = 0
+
+        # Metrics
+        self._started_at = None
+        self._lease_count = 0
+        self._lease_wait_total = 0.0
+        self._lease_wait_max = 0.0
+        self._busy_total = 0.0
+        self._busy_now = 0
+        self._recycled = 0
+        self._health_failures = 0
+        self._unclean_stops = 0
+        self._spawn_failures = 0
+
+    def start(self) -> None:
+        """Spawn and initialize every pool member, then start health checks"""
+        self._started_at = time.monotonic()
+        with self._lock:
+            self._members = self.size
+        starters = [threading.Thread(target=self._add_member) for _ in range(self.size)]
+        for thread in starters:
+            thread.start()
+        for thread in starters:
+            thread.join()
+        if self._idle.qsize() == 0:
+            raise PoolError("no MCP server in the pool could be started")
+
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+        self._health_thread.start()
+
+    def _spawn(self) -> Optional[_PoolMember]:
+        action = ActionLayer(backend=self.backend)
+        if not action.start_mcp_server() or not action.get_tools():
+            self._stop(action)
+            return None
+        return _PoolMember(action)
+
+    def _add_member(self, attempts: int = 1) -> None:
+        """Start a member, trying up to `attempts` times with exponential backoff"""
+        for attempt in range(attempts):
+            if self._closed.is_set():
+                break
+            member = self._spawn()
+            if member is not None:
+                if self._closed.is_set():
+                    self._stop(member.action)
+                    break
+                self._idle.put(member)
+                return
+            if attempt + 1 < attempts:
+                delay = self.respawn_backoff * 2 ** attempt
+                console.print(f"[yellow]Pool: failed to start an MCP server, retrying in {delay:g}s[/]")
+                self._closed.wait(delay)
+        with self._lock:
+            self._members -= 1
+            self._spawn_failures += 1
+            members = self._members
+        if not self._closed.is_set():
+            console.print(f"[bold red]Pool: failed to start an MCP server; {members} member(s) left[/]")
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """Borrow a warm ActionLayer for the duration of a `with` block"""
+        if self._closed.is_set():
+            raise PoolError("pool is closed")
+        wait_start = time.monotonic()
+        while True:
+            with self._lock:
+                members = self._members
+            if members <= 0:
+                raise PoolError("every MCP server in the pool failed and none could be restarted")
+            wait = 1.0 if timeout is None else min(1.0, wait_start + timeout - time.monotonic())
+            if wait <= 0:
+                raise PoolError(f"no MCP session became available within {timeout}s")
+            try:
+                # Wake up now and then to notice a pool that lost its last member
+                member = self._idle.get(timeout=wait)
+                break
+            except queue.Empty:
+                continue
+        waited = time.monotonic() - wait_start
+
+        with self._lock:
+            self._lease_count += 1
+            self._lease_wait_total += waited
+            self._lease_wait_max = max(self._lease_wait_max, waited)
+            self._busy_now += 1
+        member.leases += 1
+        lease_start = time.monotonic()
+        try:
+            yield member.action
+        finally:
+            with self._lock:
+                self._busy_total += time.monotonic() - lease_start
+                self._busy_now -= 1
+            self._release(member)
+
+    def _release(self, member: _PoolMember) -> None:
+        if self._closed.is_set():
+            self._stop(member.action)
+            return
+        if self._needs_recycle(member):
+            self._recycle(member)
+            return
+        reset = member.action.reset_canvas()
+        if not reset.success:
+            self._recycle(member)
+            return
+        self._idle.put(member)
+
+    def _needs_recycle(self, member: _PoolMember) -> bool:
+        if member.leases >= self.max_leases:
+            return True
+        if self.max_rss_mb is not None:
+            stats = member.action.server_stats()
+            if stats is None:
+                return True
+            rss_mb = stats.get("rss_mb")
+            if rss_mb is not None and rss_mb > self.max_rss_mb:
+                console.print(f"[yellow]Pool: server {stats.get('pid')} at {rss_mb} MB, recycling[/]")
+                return True
+        return False
+
+    def _stop(self, action: ActionLayer) -> None:
+        """Stop a member's session, counting shutdowns that left threads, tasks or processes behind"""
+        if not action.stop()["clean"]:
+            with self._lock:
+                self._unclean_stops += 1
+
+    def _recycle(self, member: _PoolMember) -> None:
+        """Replace a member with a fresh server process"""
+        with self._lock:
+            self._recycled += 1
+        self._stop(member.action)
+        if self._closed.is_set():
+            with self._lock:
+                self._members -= 1
+            return
+        threading.Thread(target=self._add_member, args=(self.respawn_attempts,), daemon=True).start()
+
+    def _health_loop(self) -> None:
+        while not self._closed.wait(self.health_check_interval):
+            for _ in range(self._idle.qsize()):
+                try:
+                    member = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if member.action.server_stats() is None:
+                    with self._lock:
+                        self._health_failures += 1
+                    console.print("[yellow]Pool: idle server failed its health check, recycling[/]")
+                    self._recycle(member)
+                else:
+                    self._idle.put(member)
+
+    def member_stats(self) -> list:
+        """Process stats and open asyncio tasks of each idle member; leased members are skipped"""
+        members = []
+        for _ in range(self._idle.qsize()):
+            try:
+                member = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                stats = member.action.server_stats() or {}
+                stats["tasks"] = member.action.pending_tasks()
+                stats["leases"] = member.leases
+                members.append(stats)
+            finally:
+                self._idle.put(member)
+        return members
+
+    def stats(self) -> dict:
+        """Lease wait times and utilization since the pool started"""
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            capacity = elapsed * self.size
+            return {
+                "size": self.size,
+                "members": self._members,
+                "idle": self._idle.qsize(),
+                "busy": self._busy_now,
+                "leases": self._lease_count,
+                "lease_wait_avg_s": round(self._lease_wait_total / self._lease_count, 4) if self._lease_count else 0.0,
+                "lease_wait_max_s": round(self._lease_wait_max, 4),
+                "utilization": round(self._busy_total / capacity, 4) if capacity else 0.0,
+                "recycled": self._recycled,
+                "health_failures": self._health_failures,
+                "unclean_stops": self._unclean_stops,
+                "spawn_failures": self._spawn_failures,
+            }
+
+    def close(self) -> None:
+        """Stop health checks and every idle server"""
+        self._closed.set()
+        if self._health_thread is not None:
+            self._health_thread.join(timeout=5)
+        while True:
+            try:
+                member = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._stop(member.action)
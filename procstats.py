@@ -0,0 +1,30 @@
+"""Resource figures of the current process, shared by the MCP server and the agent service.
+
+psutil is used where it is installed; otherwise the figures come from
+/proc on Linux, and are None on platforms that expose neither.
+"""
+from typing import Optional
+import os
+
+
+def resident_memory_mb() -> Optional[float]:
+    """Current resident set size of this process, where the platform exposes it"""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / 2**20, 1)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def open_files() -> Optional[int]:
+    """Open file descriptors of this process, where /proc lists them"""
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
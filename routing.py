@@ -0,0 +1,162 @@
+"""Route decision turns to model tiers.
+
+The planning turn and turns that follow a failed tool call go to the strong
+tier; routine continuation turns go to the fast tier. A tier whose reply
+cannot be parsed is retried once on the escalation tier. Each tier's
+latency, unparseable replies and the success of the tool calls it chose
+are recorded.
+
+Tiers are configured with model specs:
+
+    gemini:<model name>             a Gemini model over the shared client (a bare name means the same)
+    local:<module>:<function>       a Python function taking the prompt and returning the reply text
+    script:<path>                   a text file with one reply per line, picked by the turn number
+
+The local and script backends stand in for real models in offline tests.
+Environment variables override the defaults:
+
+    PAINT_MODEL_STRONG=gemini:gemini-2.0-flash
+    PAINT_MODEL_FAST=gemini:gemini-2.0-flash-lite
+    PAINT_ROUTING=planning=strong,recovery=strong,routine=fast
+"""
+from llmclient import GeminiModel, Reply
+from models import AgentState
+from typing import Callable, Dict, Optional
+import importlib
+import os
+import threading
+
+TURN_KINDS = ("planning", "recovery", "routine")
+
+DEFAULT_MODELS = {
+    "strong": "gemini:gemini-2.0-flash",
+    "fast": "gemini:gemini-2.0-flash-lite",
+}
+DEFAULT_POLICY = {"planning": "strong", "recovery": "strong", "routine": "fast"}
+
+# Marker the loop guard adds to the result of a repeated call
+_REPEAT_MARKER = "[Repeated call:"
+
+
+class LocalModel:
+    """Stand-in model backed by a Python function from prompt to reply text"""
+
+    def __init__(self, respond: Callable[[str], str], name: str = "local"):
+        self.respond = respond
+        self.name = name
+
+    def generate_content(self, prompt: str) -> Reply:
+        return Reply(self.respond(prompt))
+
+
+class ScriptedModel(LocalModel):
+    """Stand-in model replaying fixed replies, one per turn; the last reply repeats"""
+
+    def __init__(self, replies, name: str = "script"):
+        self.replies = list(replies)
+        if not self.replies:
+            raise ValueError("A scripted model needs at least one reply")
+        super().__init__(self._reply, name)
+
+    def _reply(self, prompt: str) -> str:
+        # Every completed step appears once in the prompt's history
+        turn = prompt.count("In iteration ")
+        return self.replies[min(turn, len(self.replies) - 1)]
+
+
+def load_model(spec: str):
+    """Build a model backend from a spec such as 'gemini:gemini-2.0-flash' or 'script:replies.txt'"""
+    kind, _, target = spec.partition(":")
+    if not target:
+        kind, target = "gemini", spec
+    if kind == "gemini":
+        return GeminiModel(target)
+    if kind == "local":
+        module_name, _, attr = target.partition(":")
+        if not attr:
+            raise ValueError(f"Local model spec '{spec}' must be local:<module>:<function>")
+        return LocalModel(getattr(importlib.import_module(module_name), attr), name=spec)
+    if kind == "script":
+        with open(target) as f:
+            return ScriptedModel([line.rstrip("\n") for line in f if line.strip()], name=spec)
+    raise ValueError(f"Unknown model backend '{kind}' in '{spec}'; use gemini, local or script")
+
+
+def _parse_policy(text: str) -> Dict[str, str]:
+    policy = dict(DEFAULT_POLICY)
+    for part in filter(None, (part.strip() for part in text.split(","))):
+        kind, _, tier = part.partition("=")
+        if kind.strip() not in TURN_KINDS or not tier.strip():
+            raise ValueError(f"Bad routing rule '{part}'; use <{'|'.join(TURN_KINDS)}>=<tier>")
+        policy[kind.strip()] = tier.strip()
+    return policy
+
+
+class ModelRouter:
+    def __init__(self, tiers: Dict[str, object], policy: Optional[Dict[str, str]] = None,
+                 escalation: Optional[str] = "strong"):
+        """Route turns to `tiers` (name -> model) by `policy` (turn kind -> tier name)"""
+        self.tiers = tiers
+        self.policy = dict(DEFAULT_POLICY if policy is None else policy)
+        for kind in TURN_KINDS:
+            self.policy.setdefault(kind, DEFAULT_POLICY[kind])
+        missing = set(self.policy.values()) - set(tiers)
+        if escalation is not None and escalation not in tiers:
+            missing.add(escalation)
+        if missing:
+            raise ValueError(f"Routing refers to undefined tier(s): {', '.join(sorted(missing))}")
+        self.escalation = escalation
+        self._lock = threading.Lock()
+        self._stats = {name: {"calls": 0, "seconds": 0.0, "invalid": 0, "outcomes": 0, "succeeded": 0}
+                       for name in tiers}
+
+    @classmethod
+    def single(cls, model) -> "ModelRouter":
+        """A router that sends every turn to one model"""
+        return cls({"default": model}, policy={kind: "default" for kind in TURN_KINDS}, escalation=None)
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        tiers = {name: load_model(os.getenv(f"PAINT_MODEL_{name.upper()}", spec))
+                 for name, spec in DEFAULT_MODELS.items()}
+        return cls(tiers, _parse_policy(os.getenv("PAINT_ROUTING", "")))
+
+    @staticmethod
+    def classify(state: AgentState) -> str:
+        """Kind of the next turn: planning, recovery after a failed or repeated call, or routine"""
+        if state.iteration == 0 or not state.history:
+            return "planning"
+        result = state.history[-1].result
+        if result is None or not result.success or result.error or _REPEAT_MARKER in result.content:
+            return "recovery"
+        return "routine"
+
+    def tier_for(self, turn: str) -> str:
+        return self.policy[turn]
+
+    def record_call(self, tier: str, seconds: float, valid: bool) -> None:
+        with self._lock:
+            stats = self._stats[tier]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["invalid"] += not valid
+
+    def record_outcome(self, tier: str, success: bool) -> None:
+        """Record whether the tool call a tier chose succeeded"""
+        with self._lock:
+            stats = self._stats[tier]
+            stats["outcomes"] += 1
+            stats["succeeded"] += success
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    "calls": stats["calls"],
+                    "mean_latency_s": round(stats["seconds"] / stats["calls"], 3) if stats["calls"] else None,
+                    "invalid": stats["invalid"],
+                    "tool_success_rate": (round(stats["succeeded"] / stats["outcomes"], 3)
+                                          if stats["outcomes"] else None),
+                }
+                for name, stats in self._stats.items() if stats["calls"]
+            }
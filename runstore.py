@@ -0,0 +1,271 @@
+"""SQLite store of runs, their iterations and tool calls, for querying across runs.
+
+Every run gets a row in `runs`; each decision a row in `iterations` (model
+tier, latency, unparseable replies) and each executed tool call a row in
+`tool_calls` (arguments, result, latency). Tool calls are indexed by tool
+name and time and by success, and runs by start time, so questions such as
+the p95 latency of one tool over the last week or the runs with parse
+failures are answered from indexes instead of by scanning state files.
+
+The database runs in WAL mode, so queries do not block writers. A run's
+rows are buffered and written in batches, one transaction per batch.
+
+Usage:
+    python batch.py queries.jsonl --run-store logs/runs.db
+    python runstore.py logs/runs.db latency draw_2D_oval --days 7
+    python runstore.py logs/runs.db parse-failures
+    python runstore.py logs/runs.db tools --days 1
+    python runstore.py logs/runs.db sql "SELECT tool, COUNT(*) FROM tool_calls GROUP BY tool"
+"""
+from models import AgentState, DecisionOutput, ToolInput, ToolResult
+from rich.console import Console
+from rich.table import Table
+from typing import List, Optional
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+console = Console()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    label TEXT,
+    description TEXT,
+    style TEXT,
+    task_complete INTEGER,
+    final_answer TEXT,
+    stop_reason TEXT,
+    iterations INTEGER,
+    parse_failures INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS iterations (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    iteration INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    decision_s REAL,
+    speculative INTEGER NOT NULL,
+    model_tier TEXT,
+    escalated_from TEXT,
+    parse_failures INTEGER NOT NULL,
+    is_final INTEGER NOT NULL,
+    PRIMARY KEY (run_id, iteration)
+);
+CREATE TABLE IF NOT EXISTS tool_calls (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    iteration INTEGER NOT NULL,
+    tool TEXT NOT NULL,
+    args TEXT,
+    started_at REAL NOT NULL,
+    latency_s REAL,
+    success INTEGER NOT NULL,
+    content TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_started ON runs(started_at);
+CREATE INDEX IF NOT EXISTS idx_runs_parse_failures ON runs(started_at) WHERE parse_failures > 0;
+CREATE INDEX IF NOT EXISTS idx_tool_calls_tool_time ON tool_calls(tool, started_at, latency_s);
+CREATE INDEX IF NOT EXISTS idx_tool_calls_success ON tool_calls(success, tool);
+CREATE INDEX IF NOT EXISTS idx_tool_calls_time ON tool_calls(started_at);
+CREATE INDEX IF NOT EXISTS idx_tool_calls_run ON tool_calls(run_id);
+"""
+
+# Stored result content is cut to this many characters
+MAX_CONTENT = 2000
+
+
+def _quantile(sorted_values: list, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def _since(days: Optional[float]) -> float:
+    return time.time() - days * 86400 if days is not None else 0.0
+
+
+class RunStore:
+    def __init__(self, path: str = "logs/runs.db", flush_every: int = 50):
+        """Open (creating if needed) the store at `path`; runs write in batches of `flush_every` rows"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        # One connection shared by the runs of a process; the lock serializes its use
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(SCHEMA)
+
+    def start_run(self, description: str = None, style: str = None, label: str = None) -> "RunRecorder":
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (started_at, label, description, style) VALUES (?, ?, ?, ?)",
+                (time.time(), label, description, style)
+            )
+        return RunRecorder(self, cursor.lastrowid)
+
+    def write(self, iterations: list, tool_calls: list, run_update: Optional[tuple] = None) -> None:
+        """Write buffered rows (and a run's final fields) in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO iterations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                       iterations)
+                self._conn.executemany(
+                    "INSERT INTO tool_calls (run_id, iteration, tool, args, started_at, latency_s, success, "
+                    "content, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", tool_calls
+                )
+                if run_update is not None:
+                    self._conn.execute(
+                        "UPDATE runs SET finished_at = ?, task_complete = ?, final_answer = ?, stop_reason = ?, "
+                        "iterations = ?, parse_failures = ? WHERE id = ?", run_update
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            self._conn.row_factory = sqlite3.Row
+            try:
+                return self._conn.execute(sql, params).fetchall()
+            finally:
+                self._conn.row_factory = None
+
+    def tool_latency(self, tool: str, days: Optional[float] = None) -> dict:
+        """Latency summary of a tool's executed calls, over the last `days` days or all time"""
+        rows = self.query(
+            "SELECT latency_s FROM tool_calls WHERE tool = ? AND started_at >= ? AND latency_s IS NOT NULL",
+            (tool, _since(days))
+        )
+        latencies = sorted(row[0] for row in rows)
+        if not latencies:
+            return {"tool": tool, "calls": 0}
+        return {
+            "tool": tool,
+            "calls": len(latencies),
+            "mean_s": round(sum(latencies) / len(latencies), 4),
+            "p50_s": round(_quantile(latencies, 0.5), 4),
+            "p95_s": round(_quantile(latencies, 0.95), 4),
+            "max_s": round(latencies[-1], 4),
+        }
+
+    def tool_summary(self, days: Optional[float] = None) -> List[sqlite3.Row]:
+        """Calls, failures and mean latency per tool"""
+        return self.query(
+            "SELECT tool, COUNT(*) AS calls, SUM(success = 0) AS failed, ROUND(AVG(latency_s), 4) AS mean_s "
+            "FROM tool_calls WHERE started_at >= ? GROUP BY tool ORDER BY calls DESC", (_since(days),)
+        )
+
+    def runs_with_parse_failures(self, days: Optional[float] = None) -> List[sqlite3.Row]:
+        return self.query(
+            "SELECT id, datetime(started_at, 'unixepoch', 'localtime') AS started, label, description, "
+            "parse_failures, stop_reason FROM runs "
+            "WHERE parse_failures > 0 AND started_at >= ? ORDER BY started_at DESC", (_since(days),)
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RunRecorder:
+    """Buffers the rows of one run and writes them to the store in batches"""
+
+    def __init__(self, store: RunStore, run_id: int):
+        self.store = store
+        self.run_id = run_id
+        self.parse_failures = 0
+        self._iterations = []
+        self._tool_calls = []
+
+    def decision(self, iteration: int, output: DecisionOutput, started_at: float, seconds: float,
+                 speculative: bool = False) -> None:
+        failures = (output.escalated_from is not None) + (not output.valid)
+        self.parse_failures += failures
+        self._iterations.append((self.run_id, iteration, started_at, seconds, int(speculative), output.model_tier,
+                                 output.escalated_from, failures, int(output.is_final)))
+        self._maybe_flush()
+
+    def tool_call(self, iteration: int, tool_call: ToolInput, result: ToolResult, started_at: float,
+                  seconds: Optional[float]) -> None:
+        """Record a call and its result; `seconds` is None for calls answered without running the tool"""
+        self._tool_calls.append((self.run_id, iteration, tool_call.name, json.dumps(tool_call.args, default=str),
+                                 started_at, seconds, int(result.success), result.content[:MAX_CONTENT],
+                                 result.error))
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        if len(self._iterations) + len(self._tool_calls) >= self.store.flush_every:
+            self.flush()
+
+    def flush(self, run_update: Optional[tuple] = None) -> None:
+        if self._iterations or self._tool_calls or run_update is not None:
+            self.store.write(self._iterations, self._tool_calls, run_update)
+            self._iterations, self._tool_calls = [], []
+
+    def finish(self, state: AgentState) -> None:
+        """Write the remaining rows and the run's outcome"""
+        self.flush((time.time(), int(state.task_complete), state.final_answer, state.stop_reason,
+                    state.iteration, self.parse_failures, self.run_id))
+
+
+def _print_rows(rows: List[sqlite3.Row], title: str) -> None:
+    if not rows:
+        console.print(f"[yellow]{title}: no rows[/]")
+        return
+    table = Table(title=title)
+    for column in rows[0].keys():
+        table.add_column(column)
+    for row in rows:
+        table.add_row(*("" if value is None else str(value) for value in row))
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the run store")
+    parser.add_argument("db", help="run store database, e.g. logs/runs.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    latency = commands.add_parser("latency", help="latency percentiles of a tool")
+    latency.add_argument("tool")
+    latency.add_argument("--days", type=float, help="only calls from the last N days")
+    failures = commands.add_parser("parse-failures", help="runs with unparseable model replies")
+    failures.add_argument("--days", type=float)
+    tools = commands.add_parser("tools", help="calls, failures and mean latency per tool")
+    tools.add_argument("--days", type=float)
+    sql = commands.add_parser("sql", help="run a read-only SQL query")
+    sql.add_argument("query")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        console.print(f"[bold red]No run store at {args.db}[/]")
+        return
+    store = RunStore(args.db)
+    try:
+        if args.command == "latency":
+            console.print(store.tool_latency(args.tool, args.days))
+        elif args.command == "parse-failures":
+            _print_rows(store.runs_with_parse_failures(args.days), "Runs with parse failures")
+        elif args.command == "tools":
+            _print_rows(store.tool_summary(args.days), "Tool calls")
+        else:
+            store.query("PRAGMA query_only = ON")
+            _print_rows(store.query(args.query), "Query result")
+    except sqlite3.Error as e:
+        console.print(f"[bold red]Query failed: {e}[/]")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Scene graph of the shapes drawn on the canvas.
+
+Every shape is kept with its kind, bounding box and z-order in a uniform
+grid spatial index, so overlap, containment and free-space questions are
+answered by looking at a handful of grid cells instead of every shape.
+"""
+from dispatch import MIN_X, MAX_X, MIN_Y, MAX_Y
+from typing import Dict, List, Optional, Set, Tuple
+
+# Drawing tools and the kind of shape each one produces
+SHAPE_KINDS = {
+    "draw_2D_rectangle": "rectangle",
+    "draw_2D_oval": "oval",
+    "draw_2D_right_arrow_shape": "right_arrow",
+    "draw_2D_left_arrow_shape": "left_arrow",
+    "draw_2D_up_arrow_shape": "up_arrow",
+    "draw_2D_down_arrow_shape": "down_arrow",
+    "add_text_in_paint": "text",
+    "draw_polyline": "polyline",
+    "draw_polygon": "polygon",
+    "draw_curve": "curve",
+}
+
+# Approximate footprint of one character of the default text font; other
+# sizes scale from these
+TEXT_CHAR_WIDTH = 7
+TEXT_LINE_HEIGHT = 12
+DEFAULT_TEXT_POSITION = (350, 533)
+DEFAULT_TEXT_SIZE = 10
+
+BBox = Tuple[int, int, int, int]
+
+
+def normalize_bbox(x1: int, y1: int, x2: int, y2: int) -> BBox:
+    """Order the corners so the box runs from top-left to bottom-right"""
+    return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+
+def text_bbox(text: str, x: int = DEFAULT_TEXT_POSITION[0], y: int = DEFAULT_TEXT_POSITION[1],
+              size: int = DEFAULT_TEXT_SIZE) -> BBox:
+    """Estimate the box covered by a line of text placed at (x, y)"""
+    scale = size / DEFAULT_TEXT_SIZE
+    return (x, y, x + round(max(1, len(text)) * TEXT_CHAR_WIDTH * scale), y + round(TEXT_LINE_HEIGHT * scale))
+
+
+def _intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _contains(outer: BBox, inner: BBox) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+class Shape:
+    """A shape on the canvas"""
+
+    __slots__ = ("id", "kind", "bbox", "z", "label", "request_id")
+
+    def __init__(self, shape_id: int, kind: str, bbox: BBox, z: int,
+                 label: Optional[str] = None, request_id: Optional[str] = None):
+        self.id = shape_id
+        self.kind = kind
+        self.bbox = bbox
+        self.z = z
+        self.label = label
+        self.request_id = request_id
+
+    def to_dict(self) -> dict:
+        item = {"id": self.id, "kind": self.kind, "bbox": list(self.bbox), "z": self.z}
+        if self.label is not None:
+            item["label"] = self.label
+        return item
+
+    def describe(self) -> str:
+        x1, y1, x2, y2 = self.bbox
+        text = f"#{self.id} {self.kind} ({x1},{y1})-({x2},{y2})"
+        if self.label is not None:
+            text += f" '{self.label}'"
+        return text
+
+
+class SceneGraph:
+    def __init__(self, cell_size: int = 32, bounds: BBox = (MIN_X, MIN_Y, MAX_X, MAX_Y)):
+        """Create an empty scene over the drawable area"""
+        self.cell_size = cell_size
+        self.bounds = bounds
+        self.shapes: Dict[int, Shape] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._request_ids: Set[str] = set()
+        self._next_id = 1
+
+    def clear(self) -> None:
+        """Forget every shape"""
+        self.shapes.clear()
+        self._cells.clear()
+        self._request_ids.clear()
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        return len(self.shapes)
+
+    def _cell_range(self, bbox: BBox):
+        size = self.cell_size
+        return range(bbox[0] // size, bbox[2] // size + 1), range(bbox[1] // size, bbox[3] // size + 1)
+
+    def add(self, kind: str, bbox: BBox, label: Optional[str] = None,
+            request_id: Optional[str] = None) -> Optional[Shape]:
+        """Add a shape on top of the others; a repeated request ID is ignored"""
+        if request_id is not None:
+            if request_id in self._request_ids:
+                return None
+            self._request_ids.add(request_id)
+        bbox = normalize_bbox(*bbox)
+        shape = Shape(self._next_id, kind, bbox, len(self.shapes), label, request_id)
+        self._next_id += 1
+        self.shapes[shape.id] = shape
+        columns, rows = self._cell_range(bbox)
+        for cx in columns:
+            for cy in rows:
+                self._cells.setdefault((cx, cy), set()).add(shape.id)
+        return shape
+
+    def add_from_call(self, tool_name: str, args: dict, request_id: Optional[str] = None) -> Optional[Shape]:
+        """Add the shape produced by a successful drawing tool call"""
+        kind = SHAPE_KINDS.get(tool_name)
+        if kind is None:
+            return None
+        if kind == "text":
+            text = str(args.get("text", ""))
+            bbox = text_bbox(text, int(args.get("x", DEFAULT_TEXT_POSITION[0])),
+                             int(args.get("y", DEFAULT_TEXT_POSITION[1])),
+                             int(args.get("size", DEFAULT_TEXT_SIZE)))
+            return self.add(kind, bbox, label=text, request_id=request_id)
+        if "points" in args:
+            xs = [int(point[0]) for point in args["points"]]
+            ys = [int(point[1]) for point in args["points"]]
+            return self.add(kind, (min(xs), min(ys), max(xs), max(ys)), request_id=request_id)
+        return self.add(kind, (int(args["x1"]), int(args["y1"]), int(args["x2"]), int(args["y2"])),
+                        request_id=request_id)
+
+    def _candidates(self, bbox: BBox) -> Set[int]:
+        found = set()
+        cells = self._cells
+        columns, rows = self._cell_range(bbox)
+        for cx in columns:
+            for cy in rows:
+                ids = cells.get((cx, cy))
+                if ids:
+                    found |= ids
+        return found
+
+    def overlapping(self, bbox: BBox, exclude: Optional[int] = None) -> List[Shape]:
+        """Shapes whose bounding boxes intersect a box, in z-order"""
+        bbox = normalize_bbox(*bbox)
+        shapes = self.shapes
+        hits = [shapes[i] for i in self._candidates(bbox) if i != exclude and _intersects(shapes[i].bbox, bbox)]
+        return sorted(hits, key=lambda shape: shape.z)
+
+    def containers_of(self, bbox: BBox, exclude: Optional[int] = None) -> List[Shape]:
+        """Shapes whose bounding boxes fully contain a box, innermost first"""
+        bbox = normalize_bbox(*bbox)
+        shapes = self.shapes
+        hits = [shapes[i] for i in self._candidates(bbox) if i != exclude and _contains(shapes[i].bbox, bbox)]
+        return sorted(hits, key=lambda shape: (shape.bbox[2] - shape.bbox[0]) * (shape.bbox[3] - shape.bbox[1]))
+
+    def is_inside(self, shape_id: int, container_id: int) -> bool:
+        """Whether one shape lies entirely within another's bounding box"""
+        return _contains(self.shapes[container_id].bbox, self.shapes[shape_id].bbox)
+
+    def free_space(self, width: int, height: int, within: Optional[BBox] = None,
+                   near: Optional[Tuple[int, int]] = None) -> Optional[BBox]:
+        """Find a width x height box, aligned to the grid, that no shape overlaps.
+
+        `within` limits the search to a region, such as the inside of a
+        container shape, whose own outline is then not counted as occupying it.
+        Returns the box closest to `near` (default: the region's top-left),
+        or None if no free box of that size exists.
+        """
+        region = normalize_bbox(*within) if within is not None else self.bounds
+        size = self.cell_size
+        # Only cells fully inside the region can hold the box
+        first_col, first_row = -(-region[0] // size), -(-region[1] // size)
+        last_col, last_row = (region[2] + 1) // size, (region[3] + 1) // size
+        need_cols, need_rows = -(-width // size), -(-height // size)
+        cols, rows = last_col - first_col, last_row - first_row
+        if need_cols > cols or need_rows > rows or need_cols <= 0 or need_rows <= 0:
+            return None
+
+        ignored = {s.id for s in self.shapes.values() if within is not None and _contains(s.bbox, region)}
+        # Summed-area table of occupied cells
+        table = [[0] * (cols + 1) for _ in range(rows + 1)]
+        for r in range(rows):
+            running = 0
+            above, row_out = table[r], table[r + 1]
+            for c in range(cols):
+                ids = self._cells.get((first_col + c, first_row + r))
+                if ids and not ids <= ignored:
+                    running += 1
+                row_out[c + 1] = above[c + 1] + running
+
+        target = near if near is not None else (region[0], region[1])
+        best, best_distance = None, None
+        for r in range(rows - need_rows + 1):
+            top, bottom = table[r], table[r + need_rows]
+            for c in range(cols - need_cols + 1):
+                if bottom[c + need_cols] - bottom[c] - top[c + need_cols] + top[c]:
+                    continue
+                x, y = (first_col + c) * size, (first_row + r) * size
+                distance = (x - target[0]) ** 2 + (y - target[1]) ** 2
+                if best is None or distance < best_distance:
+                    best, best_distance = (x, y, x + width, y + height), distance
+        return best
+
+    def query(self, op: str, x1: int = 0, y1: int = 0, x2: int = 0, y2: int = 0,
+              shape_id: int = 0, container_id: int = 0, width: int = 0, height: int = 0) -> dict:
+        """Answer one scene query; this backs the query_scene tool"""
+        bbox = (x1, y1, x2, y2)
+        if op == "summary":
+            return {"summary": self.summary()}
+        if op == "list":
+            return {"shapes": [shape.to_dict() for shape in self.shapes.values()]}
+        if op == "overlaps":
+            return {"overlapping": [shape.to_dict() for shape in self.overlapping(bbox)]}
+        if op == "containers":
+            return {"containers": [shape.to_dict() for shape in self.containers_of(bbox)]}
+        if op == "inside":
+            if shape_id not in self.shapes or container_id not in self.shapes:
+                raise ValueError(f"Unknown shape id {shape_id if shape_id not in self.shapes else container_id}")
+            return {"inside": self.is_inside(shape_id, container_id)}
+        if op == "free_space":
+            within = self.shapes[container_id].bbox if container_id in self.shapes else None
+            return {"free_box": self.free_space(width, height, within=within)}
+        raise ValueError(f"Unknown scene query '{op}'. Use summary, list, overlaps, containers, inside or free_space")
+
+    def summary(self, max_shapes: int = 20) -> str:
+        """Compact description of the canvas for the LLM prompt"""
+        if not self.shapes:
+            return "The canvas is empty."
+        lines = [f"{len(self.shapes)} shape(s) on the canvas (bottom to top):"]
+        ordered = sorted(self.shapes.values(), key=lambda shape: shape.z)
+        for shape in ordered[-max_shapes:]:
+            line = shape.describe()
+            containers = self.containers_of(shape.bbox, exclude=shape.id)
+            if containers:
+                line += f", inside #{containers[0].id}"
+            lines.append(f"- {line}")
+        if len(ordered) > max_shapes:
+            lines.insert(1, f"- ... {len(ordered) - max_shapes} older shape(s) omitted")
+        return "\n".join(lines)
+
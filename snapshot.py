@@ -0,0 +1,212 @@
+"""Cached, incremental snapshots of the headless canvas.
+
+The canvas stamps every tile it draws on with a new version number. The
+cache keeps scaled tiles and encoded images together with the version they
+were produced from, so a snapshot taken again before anything is drawn
+returns the stored bytes, a snapshot after a small change rescales only the
+tiles that changed, and an incremental request encodes just those tiles.
+"""
+from canvas import HeadlessCanvas, TILE_SIZE
+from collections import OrderedDict
+from typing import Optional, Tuple
+import io
+import numpy as np
+import threading
+
+# Image formats a snapshot can be encoded in, keyed by the name tools accept
+FORMATS = {"png": "PNG", "jpeg": "JPEG", "jpg": "JPEG", "webp": "WEBP"}
+
+MIN_SCALE = 0.05
+MAX_SCALE = 1.0
+
+BBox = Tuple[int, int, int, int]
+
+
+def _encode(pixels: np.ndarray, fmt: str) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=FORMATS[fmt])
+    return buffer.getvalue()
+
+
+class _LRU(OrderedDict):
+    """Ordered dict that drops its least recently used entries past a size.
+    Safe to share between the threads of parallel snapshot calls"""
+
+    def __init__(self, max_entries: int):
+        super().__init__()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get_fresh(self, key):
+        with self._lock:
+            value = self.get(key)
+            if value is not None:
+                self.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self[key] = value
+            self.move_to_end(key)
+            while len(self) > self.max_entries:
+                self.popitem(last=False)
+
+
+class SnapshotCache:
+    def __init__(self, canvas: HeadlessCanvas, tile_size: int = TILE_SIZE, max_entries: int = 512):
+        """Cache snapshots of a canvas; tile_size must match the canvas's dirty tracking"""
+        self.canvas = canvas
+        self.tile_size = tile_size
+        # (row, col, scale) -> (version, scaled pixels)
+        self._scaled_tiles = _LRU(max_entries)
+        # (row, col, scale, format) -> (version, encoded bytes)
+        self._encoded_tiles = _LRU(max_entries)
+        # (scale, region, format) -> (version, encoded bytes, width, height)
+        self._snapshots = _LRU(16)
+        self.hits = 0
+        self.misses = 0
+        self.tiles_rendered = 0
+
+    @staticmethod
+    def _check(scale: float, fmt: str) -> Tuple[float, str]:
+        fmt = fmt.lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported snapshot format '{fmt}'. Use png, jpeg or webp")
+        if not MIN_SCALE <= scale <= MAX_SCALE:
+            raise ValueError(f"Snapshot scale must be between {MIN_SCALE} and {MAX_SCALE}")
+        return round(scale, 4), fmt
+
+    def _clip(self, region: Optional[BBox]) -> BBox:
+        """Clamp an inclusive region to the canvas; None means the whole canvas"""
+        width, height = self.canvas.width, self.canvas.height
+        if region is None:
+            return (0, 0, width - 1, height - 1)
+        x1, y1, x2, y2 = region
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, width - 1), min(y2, height - 1)
+        if x2 < x1 or y2 < y1:
+            raise ValueError("Snapshot region lies outside the canvas")
+        return (x1, y1, x2, y2)
+
+    def _tile_span(self, index: int, limit: int) -> Tuple[int, int]:
+        start = index * self.tile_size
+        return start, min(start + self.tile_size, limit)
+
+    def _scaled_tile(self, row: int, col: int, scale: float) -> np.ndarray:
+        """A tile resized by `scale`, rendered again only if it changed"""
+        version = int(self.canvas.tile_versions[row, col])
+        key = (row, col, scale)
+        cached = self._scaled_tiles.get_fresh(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        from PIL import Image
+
+        x0, x1 = self._tile_span(col, self.canvas.width)
+        y0, y1 = self._tile_span(row, self.canvas.height)
+        # Scaled tile edges are rounded from canvas coordinates so neighbouring tiles meet exactly
+        size = (round(x1 * scale) - round(x0 * scale), round(y1 * scale) - round(y0 * scale))
+        tile = self.canvas.pixels[y0:y1, x0:x1]
+        if size[0] > 0 and size[1] > 0:
+            scaled = np.asarray(Image.fromarray(tile).resize(size, Image.BOX))
+        else:
+            scaled = np.zeros((max(size[1], 0), max(size[0], 0)), dtype=np.uint8)
+        self.tiles_rendered += 1
+        self._scaled_tiles.put(key, (version, scaled))
+        return scaled
+
+    def _render(self, region: BBox, scale: float) -> np.ndarray:
+        """Pixels of a region at a scale, assembled from cached tiles"""
+        x1, y1, x2, y2 = region
+        if scale == 1.0:
+            return self.canvas.pixels[y1:y2 + 1, x1:x2 + 1]
+        size = self.tile_size
+        first_col, last_col = x1 // size, x2 // size
+        first_row, last_row = y1 // size, y2 // size
+        origin_x = round(first_col * size * scale)
+        origin_y = round(first_row * size * scale)
+        end_x = round(min((last_col + 1) * size, self.canvas.width) * scale)
+        end_y = round(min((last_row + 1) * size, self.canvas.height) * scale)
+        out = np.empty((end_y - origin_y, end_x - origin_x), dtype=np.uint8)
+        for row in range(first_row, last_row + 1):
+            top = round(row * size * scale) - origin_y
+            for col in range(first_col, last_col + 1):
+                left = round(col * size * scale) - origin_x
+                tile = self._scaled_tile(row, col, scale)
+                out[top:top + tile.shape[0], left:left + tile.shape[1]] = tile
+        left, top = round(x1 * scale) - origin_x, round(y1 * scale) - origin_y
+        right, bottom = round((x2 + 1) * scale) - origin_x, round((y2 + 1) * scale) - origin_y
+        return out[top:max(bottom, top + 1), left:max(right, left + 1)]
+
+    def _region_version(self, region: BBox) -> int:
+        """Latest version that touched any tile under a region"""
+        size = self.tile_size
+        return int(self.canvas.tile_versions[region[1] // size:region[3] // size + 1,
+                                             region[0] // size:region[2] // size + 1].max())
+
+    def snapshot(self, scale: float = 1.0, region: Optional[BBox] = None, fmt: str = "png") -> dict:
+        """Encode a region of the canvas, reusing the last encoding if nothing under it changed"""
+        scale, fmt = self._check(scale, fmt)
+        region = self._clip(region)
+        key = (scale, region, fmt)
+        version = self._region_version(region)
+        cached = self._snapshots.get_fresh(key)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            data, width, height = cached[1:]
+            cache_hit = True
+        else:
+            self.misses += 1
+            pixels = self._render(region, scale)
+            height, width = pixels.shape
+            data = _encode(np.ascontiguousarray(pixels), fmt)
+            self._snapshots.put(key, (version, data, width, height))
+            cache_hit = False
+        return {
+            "version": self.canvas.version,
+            "region": list(region),
+            "scale": scale,
+            "format": fmt,
+            "width": width,
+            "height": height,
+            "cache_hit": cache_hit,
+            "data": data,
+        }
+
+    def changed_tiles(self, since_version: int, scale: float = 1.0, fmt: str = "png") -> dict:
+        """Encode only the tiles changed after `since_version`, each as its own image"""
+        scale, fmt = self._check(scale, fmt)
+        tiles = []
+        for row, col in self.canvas.dirty_tiles(since_version):
+            row, col = int(row), int(col)
+            x0, x1 = self._tile_span(col, self.canvas.width)
+            y0, y1 = self._tile_span(row, self.canvas.height)
+            version = int(self.canvas.tile_versions[row, col])
+            key = (row, col, scale, fmt)
+            cached = self._encoded_tiles.get_fresh(key)
+            if cached is None or cached[0] != version:
+                if scale == 1.0:
+                    pixels = self.canvas.pixels[y0:y1, x0:x1]
+                else:
+                    pixels = self._scaled_tile(row, col, scale)
+                cached = (version, _encode(np.ascontiguousarray(pixels), fmt))
+                self._encoded_tiles.put(key, cached)
+            tiles.append({
+                "region": [x0, y0, x1 - 1, y1 - 1],
+                "offset": [round(x0 * scale), round(y0 * scale)],
+                "data": cached[1],
+            })
+        return {
+            "version": self.canvas.version,
+            "since_version": since_version,
+            "scale": scale,
+            "format": fmt,
+            "tiles": tiles,
+        }
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "tiles_rendered": self.tiles_rendered}
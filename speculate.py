@@ -0,0 +1,167 @@
+"""Speculative decisions: ask the LLM for the next step while a tool is still running.
+
+Most tool results can be predicted from the call: show_reasoning always
+answers the same way, and a drawing tool reports the same message with the
+call's own arguments filled in. While such a call runs, the next decision
+is requested with the predicted observation. Once the real result is in,
+the prompt is rebuilt from the real state; if it is identical to the
+speculative prompt the speculative decision is used, otherwise it is
+discarded and the decision is made as usual. Predictions are learned from
+earlier results, so a wrong guess costs an LLM call but never changes what
+the agent does.
+"""
+from action import REASONING_DISPLAYED
+from models import AgentState, MemoryItem, ToolInput, ToolResult
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+import re
+import time
+
+# Stop speculating on a tool once this many attempts hit less often than MIN_HIT_RATE
+MIN_ATTEMPTS = 4
+MIN_HIT_RATE = 0.5
+
+# A template is literal text and the names of the arguments substituted between it
+Template = List[Union[str, Tuple[str]]]
+
+
+def _scalar_args(args: dict) -> Dict[str, str]:
+    """Arguments whose text form can appear in a result message"""
+    return {name: str(value) for name, value in args.items()
+            if isinstance(value, (int, float, str)) and not isinstance(value, bool) and str(value)}
+
+
+def make_template(content: str, args: dict) -> Template:
+    """Turn a result into a template by replacing argument values with their names"""
+    values = _scalar_args(args)
+    if not values:
+        return [content]
+    by_text = {}
+    for name, text in sorted(values.items(), key=lambda item: -len(item[1])):
+        by_text.setdefault(text, name)
+    pattern = "|".join(r"(?<!\w)" + re.escape(text) + r"(?!\w)" for text in by_text)
+    template, position = [], 0
+    for match in re.finditer(pattern, content):
+        template.append(content[position:match.start()])
+        template.append((by_text[match.group(0)],))
+        position = match.end()
+    template.append(content[position:])
+    return template
+
+
+def fill_template(template: Template, args: dict) -> Optional[str]:
+    values = _scalar_args(args)
+    parts = []
+    for part in template:
+        if isinstance(part, tuple):
+            if part[0] not in values:
+                return None
+            parts.append(values[part[0]])
+        else:
+            parts.append(part)
+    return "".join(parts)
+
+
+class ResultPredictor:
+    """Result templates learned per tool; may be shared by the runs of a batch"""
+
+    def __init__(self):
+        self._templates: Dict[str, Template] = {"show_reasoning": [REASONING_DISPLAYED]}
+
+    def learn(self, tool_call: ToolInput, result: ToolResult) -> None:
+        if result.success and tool_call.name != "show_reasoning":
+            self._templates[tool_call.name] = make_template(result.content, tool_call.args)
+
+    def predict(self, tool_call: ToolInput) -> Optional[ToolResult]:
+        template = self._templates.get(tool_call.name)
+        if template is None:
+            return None
+        content = fill_template(template, tool_call.args)
+        return None if content is None else ToolResult(success=True, content=content)
+
+
+class Speculator:
+    def __init__(self, decision, action, predictor: Optional[ResultPredictor] = None, enabled: bool = True):
+        """Overlap the next decision with tool execution for `decision` and `action` layers"""
+        self.enabled = enabled
+        self.decision = decision
+        self.action = action
+        self.predictor = predictor if predictor is not None else ResultPredictor()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculate")
+        self._pending = None
+        self.attempts = 0
+        self.hits = 0
+        self.saved_seconds = 0.0
+        # Tool name -> [attempts, hits]
+        self._per_tool: Dict[str, List[int]] = {}
+
+    def _worth_trying(self, tool_name: str) -> bool:
+        attempts, hits = self._per_tool.get(tool_name, (0, 0))
+        return attempts < MIN_ATTEMPTS or hits >= attempts * MIN_HIT_RATE
+
+    def _timed_decide(self, prompt: str, turn: str):
+        start = time.perf_counter()
+        output = self.decision.decide(prompt, turn)
+        return output, start, time.perf_counter()
+
+    def start(self, query: str, state: AgentState, system_prompt: str, tool_call: ToolInput) -> bool:
+        """Request the decision after `tool_call` with its predicted result; call before executing it.
+
+        `state` must already hold the call as its last history item, without a result.
+        """
+        self.discard()
+        if not self.enabled or not self._worth_trying(tool_call.name):
+            return False
+        scene_summary = self.action.preview_scene(tool_call)
+        predicted = self.predictor.predict(tool_call) if scene_summary is not None else None
+        if predicted is None:
+            return False
+        history = state.history[:-1] + [MemoryItem(iteration=state.history[-1].iteration,
+                                                   action=tool_call, result=predicted)]
+        expected = state.copy_with(history=history, iteration=state.iteration + 1)
+        prompt = self.decision.build_prompt(query, expected, system_prompt, scene_summary=scene_summary)
+        turn = self.decision.router.classify(expected)
+        self._pending = (tool_call, prompt, turn, self._executor.submit(self._timed_decide, prompt, turn))
+        return True
+
+    def learn(self, tool_call: ToolInput, result: ToolResult) -> None:
+        self.predictor.learn(tool_call, result)
+
+    def resolve(self, query: str, state: AgentState, system_prompt: str, scene_summary: str):
+        """The speculative decision if it was made from exactly the real prompt and turn kind, else None"""
+        if self._pending is None:
+            return None
+        tool_call, prompt, turn, future = self._pending
+        self._pending = None
+        ready = time.perf_counter()
+        counts = self._per_tool.setdefault(tool_call.name, [0, 0])
+        counts[0] += 1
+        self.attempts += 1
+        if (self.decision.build_prompt(query, state, system_prompt, scene_summary=scene_summary) != prompt
+                or self.decision.router.classify(state) != turn):
+            future.cancel()
+            return None
+        output, start, end = future.result()
+        counts[1] += 1
+        self.hits += 1
+        # The part of the LLM call that ran while the tool was executing
+        self.saved_seconds += max(0.0, min(ready, end) - start)
+        return output
+
+    def discard(self) -> None:
+        """Drop a pending speculation, e.g. when the run stops before using it"""
+        if self._pending is not None:
+            self._pending[-1].cancel()
+            self._pending = None
+
+    def stats(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.attempts, 3) if self.attempts else None,
+            "saved_s": round(self.saved_seconds, 3),
+        }
+
+    def close(self) -> None:
+        self.discard()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,8 @@
+from batch import next_run_index
+
+
+def test_next_run_index_continues_after_existing_runs(tmp_path):
+    assert next_run_index(str(tmp_path)) == 0
+    for name in ("run_0000.png", "run_0003_state.txt", "run_0002.drawlog", "results.jsonl", "notes_run_9.txt"):
+        (tmp_path / name).write_text("")
+    assert next_run_index(str(tmp_path)) == 4
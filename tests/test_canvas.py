@@ -0,0 +1,39 @@
+import os
+import threading
+
+import numpy as np
+
+from canvas import INK, PAPER, HeadlessCanvas, SharedCanvasView, shared_canvas_path
+
+
+def test_shared_copy_never_returns_a_torn_frame():
+    canvas = HeadlessCanvas(1000, 1000, shared_path=shared_canvas_path(), track_previous=False)
+    view = SharedCanvasView(canvas.shared_path)
+    ys, xs = np.indices((canvas.height, canvas.width))
+    ys, xs = ys.ravel(), xs.ravel()
+    stop = threading.Event()
+
+    def writer():
+        # Every finished frame is all paper or all ink
+        while not stop.is_set():
+            canvas._ink_points(xs, ys)
+            canvas.clear()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(300):
+            pixels = view.copy()
+            assert pixels.min() == pixels.max() and pixels[0, 0] in (INK, PAPER)
+    finally:
+        stop.set()
+        thread.join()
+        canvas.close()
+
+
+def test_version_counts_changes():
+    canvas = HeadlessCanvas(64, 64)
+    canvas.draw_rectangle(1, 1, 10, 10)
+    canvas.clear()
+    assert canvas.version == 2
+    assert int(canvas.tile_versions.max()) == 2
@@ -0,0 +1,66 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from daemon import AgentService, _Handler
+from procstats import resident_memory_mb
+
+
+class _Service:
+    def __init__(self):
+        self.queries = []
+
+    def run(self, query):
+        self.queries.append(query)
+        return {"success": True}
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.service = _Service()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _post(server, body: bytes):
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/query", data=body)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_query_body_is_validated(server):
+    assert _post(server, json.dumps({"description": "a red house"}).encode())[0] == 200
+    assert server.service.queries[0].description == "a red house"
+
+
+@pytest.mark.parametrize("body", [b'["a red house"]', b'"a red house"', b"3", b"{", b'{"style": "simple"}'])
+def test_bad_query_body_gets_400(server, body):
+    status, payload = _post(server, body)
+    assert status == 400
+    assert payload["error"]
+    assert server.service.queries == []
+
+
+def test_resident_memory_mb():
+    rss = resident_memory_mb()
+    assert rss is None or rss > 0
+
+
+def test_service_numbers_runs_after_earlier_sessions(tmp_path):
+    (tmp_path / "run_0001.png").write_text("")
+    service = AgentService(output_dir=str(tmp_path))
+    service.pool.start = lambda: None
+    service.start()
+    assert service._next_index == 2
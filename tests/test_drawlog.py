@@ -0,0 +1,31 @@
+from drawlog import DrawLog, iter_calls, replay
+
+
+def test_round_trip(tmp_path):
+    log = DrawLog()
+    log.record("draw_2D_rectangle", {"x1": 10, "y1": 20, "x2": 110, "y2": 90})
+    log.record("add_text_in_paint", {"text": "héllo", "x": 5, "y": 6, "size": 18})
+    log.record("draw_polyline", {"points": [[0, 0], [30, 40], [-5, 7]]})
+    log.record("draw_curve", {"points": [[1, 2], [3, 4], [5, 6]], "closed": True})
+    log.record("clear", {})
+    assert not log.record("query_scene", {})
+    path = log.save(str(tmp_path / "run.drawlog"))
+
+    assert list(iter_calls(path)) == [
+        ("draw_2D_rectangle", {"x1": 10, "y1": 20, "x2": 110, "y2": 90}),
+        ("add_text_in_paint", {"text": "héllo", "x": 5, "y": 6, "size": 18}),
+        ("draw_polyline", {"points": [[0, 0], [30, 40], [-5, 7]]}),
+        ("draw_curve", {"points": [[1, 2], [3, 4], [5, 6]], "closed": True}),
+        ("clear", {}),
+    ]
+    replay(path)
+
+
+def test_long_text_is_cut_on_a_character_boundary(tmp_path):
+    log = DrawLog()
+    log.record("add_text_in_paint", {"text": "é" * 40000, "x": 0, "y": 0, "size": 12})
+    path = log.save(str(tmp_path / "run.drawlog"))
+
+    (name, args), = iter_calls(path)
+    assert name == "add_text_in_paint"
+    assert args["text"] == "é" * (0xFFFF // 2)
@@ -0,0 +1,31 @@
+import os
+
+from drawlog import DrawLog
+from export import export_all, output_names
+
+
+def _write_log(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    log = DrawLog()
+    log.record("draw_2D_rectangle", {"x1": 10, "y1": 10, "x2": 50, "y2": 40})
+    log.save(str(path))
+
+
+def test_output_names_keep_directories_apart():
+    assert output_names(["out/run_0000.drawlog", "out/run_0001.drawlog"]) == {
+        "out/run_0000.drawlog": "run_0000", "out/run_0001.drawlog": "run_0001"}
+    assert output_names(["batch_output/run_0000.drawlog", "daemon_output/run_0000.drawlog"]) == {
+        "batch_output/run_0000.drawlog": os.path.join("batch_output", "run_0000"),
+        "daemon_output/run_0000.drawlog": os.path.join("daemon_output", "run_0000")}
+
+
+def test_same_named_logs_export_to_separate_files(tmp_path):
+    logs = [str(tmp_path / "batch_output" / "run_0000.drawlog"), str(tmp_path / "daemon_output" / "run_0000.drawlog")]
+    for log in logs:
+        _write_log(log)
+    out_dir = tmp_path / "exports"
+    records = export_all(logs, str(out_dir), ("svg",), jobs=2)
+    outputs = sorted(output for record in records for output in record["outputs"])
+    assert [record["error"] for record in records] == [None, None]
+    assert outputs == [str(out_dir / "batch_output" / "run_0000.svg"), str(out_dir / "daemon_output" / "run_0000.svg")]
+    assert all(os.path.exists(output) for output in outputs)
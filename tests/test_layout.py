@@ -0,0 +1,23 @@
+import pytest
+
+from layout import LayoutError, compile_layout
+
+
+def test_numeric_ids_and_references():
+    calls, _ = compile_layout({"objects": [
+        {"id": 1, "shape": "rectangle", "width": 400, "height": 300},
+        {"id": 2, "shape": "oval", "inside": 1},
+        {"id": 3, "shape": "text", "text": "label", "below": "1"},
+    ]})
+    rectangle, oval, text = (call.args for call in calls)
+    assert rectangle["x1"] < oval["x1"] and oval["x2"] < rectangle["x2"]
+    assert text["y"] > rectangle["y2"]
+
+
+@pytest.mark.parametrize("item", [
+    {"id": "label", "shape": "text", "text": "hi", "size": "big"},
+    {"id": "arrow", "shape": "right_arrow", "right_of": "box", "gap": "far"},
+])
+def test_bad_numbers_raise_layout_errors(item):
+    with pytest.raises(LayoutError, match="must be a whole number"):
+        compile_layout({"objects": [{"id": "box", "shape": "rectangle"}, item]})
@@ -0,0 +1,43 @@
+from llmclient import LLMClient, _retry_delay
+from mockllm import MockLLMServer
+
+
+def test_retries_are_charged_to_the_request_quota():
+    server = MockLLMServer(latency=0.0, reject_every=2)
+    base_url = server.start()
+    client = LLMClient(max_in_flight=1, requests_per_minute=60, base_url=base_url)
+    try:
+        client.generate("mock", "hello")
+        before = client.request_bucket.tokens
+        # The second request is rejected once and retried
+        client.generate("mock", "hello")
+        assert client.retries == 1
+        assert before - client.request_bucket.tokens > 1.5
+        assert client.in_flight == 0
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_retry_after_accepts_fractional_seconds():
+    assert _retry_delay("0.25", 0) == 0.25
+    assert _retry_delay("2", 3) == 2.0
+    assert _retry_delay(None, 2) == 2.0
+    assert _retry_delay("Wed, 21 Oct 2026 07:28:00 GMT", 0) == 0.5
+
+
+def test_decision_layer_sends_through_the_injected_client():
+    from decision import DecisionLayer
+    from llmclient import GeminiModel
+    from routing import ModelRouter
+
+    server = MockLLMServer(latency=0.0)
+    client = LLMClient(base_url=server.start())
+    try:
+        decision = DecisionLayer(router=ModelRouter.single(GeminiModel("mock")), llm_client=client)
+        output = decision._generate(GeminiModel("mock"), "prompt")
+        assert output.is_final and output.final_answer == "done"
+        assert server.requests == 1 and client.requests == 1
+    finally:
+        client.close()
+        server.stop()
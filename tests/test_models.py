@@ -0,0 +1,21 @@
+import pytest
+
+from models import UserQuery
+
+
+def test_from_input_validates_and_converts():
+    query = UserQuery.from_input({"description": "  a red house ", "style": "simple"})
+    assert query == UserQuery(description="a red house", style_preference="simple")
+    assert UserQuery.from_input({"description": "a tree"}).style_preference == "regular"
+
+
+@pytest.mark.parametrize("data", [
+    {"description": 3},
+    {"style_preference": "simple"},
+    {"description": "   "},
+    ["a red house"],
+    "a red house",
+])
+def test_from_input_rejects_bad_input(data):
+    with pytest.raises(ValueError):
+        UserQuery.from_input(data)
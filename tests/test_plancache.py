@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+from main import run_agent_loop
+from memory import MemoryLayer
+from models import AgentState, DecisionOutput, MemoryItem, ToolInput, ToolResult, UserQuery
+from perception import PerceptionLayer
+from plancache import PlanCache
+from routing import ModelRouter
+from scene import SceneGraph
+from speculate import Speculator
+
+PLAN = ToolInput(name="show_reasoning", args={"steps": ["draw a house", "add a roof"]})
+
+
+class ScriptedDecisions:
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+        self.router = ModelRouter.single(None)
+
+    def make_decision(self, *args, **kwargs):
+        return self.outputs.pop(0)
+
+    def record_outcome(self, decision_output, success):
+        pass
+
+
+class FakeAction:
+    def __init__(self):
+        self.scene = SceneGraph()
+        self.drawlog = SimpleNamespace(save=lambda path: path)
+
+    def execute_tool(self, tool_call):
+        return ToolResult(success=True, content="Reasoning steps displayed successfully.")
+
+    def reconcile_timeouts(self):
+        return []
+
+
+def run(tmp_path, final, query=UserQuery(description="a red house", style_preference="simple")):
+    cache = PlanCache(str(tmp_path / "plans.json"))
+    decision = ScriptedDecisions([DecisionOutput(tool_call=PLAN), final])
+    action = FakeAction()
+    run_agent_loop("query", PerceptionLayer(), MemoryLayer(), decision, action, "prompt",
+                   state_file=str(tmp_path / "state.txt"), drawlog_file=str(tmp_path / "run.drawlog"),
+                   speculator=Speculator(decision, action, enabled=False), user_query=query, plan_cache=cache)
+    return cache
+
+
+def test_valid_final_decision_caches_the_plan(tmp_path):
+    cache = run(tmp_path, DecisionOutput(is_final=True, final_answer="done"))
+    assert len(cache) == 1
+    assert len(PlanCache(cache.path)) == 1
+
+
+def test_invalid_final_decision_caches_nothing(tmp_path):
+    cache = run(tmp_path, DecisionOutput(is_final=True, final_answer="Unexpected response format: ???", valid=False))
+    assert len(cache) == 0
+    assert len(PlanCache(cache.path)) == 0
+
+
+def test_queries_without_words_are_neither_stored_nor_matched(tmp_path):
+    cache = PlanCache(str(tmp_path / "plans.json"))
+    state = AgentState(task_complete=True, history=[
+        MemoryItem(iteration=0, action=PLAN, result=ToolResult(success=True, content="")),
+    ])
+    assert not cache.store(UserQuery(description="draw a picture", style_preference="simple"), state)
+    assert cache.store(UserQuery(description="a red house", style_preference="simple"), state)
+    assert cache.lookup(UserQuery(description="make me an image", style_preference="simple")) is None
+
+
+def test_near_hits_only_match_plans_in_the_same_style(tmp_path):
+    cache = PlanCache(str(tmp_path / "plans.json"))
+    state = AgentState(task_complete=True, history=[
+        MemoryItem(iteration=0, action=PLAN, result=ToolResult(success=True, content="")),
+    ])
+    assert cache.store(UserQuery(description="a red house", style_preference="abstract"), state)
+    assert cache.lookup(UserQuery(description="a red house", style_preference="simple")) is None
+    match = cache.lookup(UserQuery(description="a red house!", style_preference="Abstract"))
+    assert match is not None and match.exact
+    match = cache.lookup(UserQuery(description="a red house with a tree", style_preference="abstract"))
+    assert match is not None and not match.exact
@@ -0,0 +1,59 @@
+import pytest
+
+from models import ToolResult
+from pool import McpServerPool, PoolError, _PoolMember
+
+
+class FakeAction:
+    def stop(self):
+        return {"clean": True}
+
+    def reset_canvas(self):
+        return ToolResult(success=True, content="Canvas cleared")
+
+    def server_stats(self):
+        return {"pid": 1, "rss_mb": 10.0}
+
+
+class FlakyPool(McpServerPool):
+    """A pool whose first `healthy` spawns succeed and the rest fail"""
+
+    def __init__(self, healthy: int, **kwargs):
+        super().__init__(**kwargs)
+        self.healthy = healthy
+        self.spawns = 0
+
+    def _spawn(self):
+        self.spawns += 1
+        return _PoolMember(FakeAction()) if self.spawns <= self.healthy else None
+
+
+def test_lease_fails_once_no_member_can_restart():
+    pool = FlakyPool(healthy=1, size=1, max_leases=1, respawn_attempts=3, respawn_backoff=0.01)
+    pool.start()
+    try:
+        with pool.lease():
+            pass
+        # The member was recycled after its only lease and every respawn fails
+        with pytest.raises(PoolError, match="none could be restarted"):
+            with pool.lease():
+                pass
+        assert pool.spawns == 4
+        assert pool.stats()["members"] == 0
+        assert pool.stats()["spawn_failures"] == 1
+    finally:
+        pool.close()
+
+
+def test_respawn_is_retried():
+    pool = FlakyPool(healthy=1, size=1, max_leases=1, respawn_attempts=3, respawn_backoff=0.01)
+    pool.start()
+    pool.healthy = 3  # the first respawn fails, the second succeeds
+    try:
+        with pool.lease():
+            pass
+        with pool.lease(timeout=5):
+            pass
+        assert pool.spawns == 3
+    finally:
+        pool.close()
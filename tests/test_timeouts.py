@@ -0,0 +1,32 @@
+import json
+import threading
+
+from timeouts import TimeoutPolicy
+
+
+def test_concurrent_saves_keep_every_policys_samples(tmp_path):
+    path = str(tmp_path / "tool_latency.json")
+    policies = [TimeoutPolicy(path) for _ in range(8)]
+    for index, policy in enumerate(policies):
+        policy.record(f"tool_{index}", 0.1)
+        policy.record("shared", 0.2)
+
+    threads = [threading.Thread(target=policy.save) for policy in policies]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(path) as f:
+        samples = json.load(f)["samples"]
+    assert all(samples[f"tool_{index}"] == [0.1] for index in range(8))
+    assert len(samples["shared"]) == 8
+    assert list(tmp_path.iterdir()) == [tmp_path / "tool_latency.json"]
+
+
+def test_saving_twice_does_not_duplicate_samples(tmp_path):
+    policy = TimeoutPolicy(str(tmp_path / "tool_latency.json"))
+    policy.record("draw", 0.3)
+    policy.save()
+    policy.save()
+    assert len(TimeoutPolicy(policy.path)._samples["draw"]) == 1
@@ -0,0 +1,107 @@
+from collections import deque
+from typing import Deque, Dict, List
+import json
+import math
+import os
+import threading
+
+# Starting timeouts (seconds) before enough latency samples have been observed
+DEFAULT_TIMEOUT = 4.0
+DEFAULT_TIMEOUTS = {
+    "open_paint": 10.0,
+    "add_text_in_paint": 8.0,
+}
+
+
+class TimeoutPolicy:
+    """Per-tool timeouts derived from a rolling window of observed latencies.
+
+    Once a tool has `min_samples` observations its timeout becomes
+    `percentile x factor`, clamped to [floor, ceiling]. Samples are persisted
+    to a JSON file so the learned policy survives across runs. Several
+    policies may share the file (one per pooled session): each save merges
+    the samples it recorded since its last save into those on disk.
+    """
+
+    def __init__(self, path: str = "logs/tool_latency.json", window: int = 200,
+                 percentile: float = 0.99, factor: float = 2.0, floor: float = 1.0,
+                 ceiling: float = 30.0, min_samples: int = 5):
+        self.path = path
+        self.window = window
+        self.percentile = percentile
+        self.factor = factor
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        # Samples recorded since the last load or save, merged into the file by save()
+        self._unsaved: Dict[str, List[float]] = {}
+        self._timeouts: Dict[str, float] = {}
+        self.load()
+
+    def timeout_for(self, tool_name: str) -> float:
+        """Return the current timeout in seconds for a tool"""
+        timeout = self._timeouts.get(tool_name)
+        if timeout is None:
+            timeout = self._compute(tool_name)
+            self._timeouts[tool_name] = timeout
+        return timeout
+
+    def record(self, tool_name: str, seconds: float, timed_out: bool = False) -> None:
+        """Record an observed latency; a timeout counts as a sample at the timeout value"""
+        samples = self._samples.get(tool_name)
+        if samples is None:
+            samples = self._samples[tool_name] = deque(maxlen=self.window)
+        sample = max(seconds, self.timeout_for(tool_name)) if timed_out else seconds
+        samples.append(sample)
+        self._unsaved.setdefault(tool_name, []).append(sample)
+        self._timeouts.pop(tool_name, None)
+
+    def _compute(self, tool_name: str) -> float:
+        samples = self._samples.get(tool_name)
+        if not samples or len(samples) < self.min_samples:
+            return DEFAULT_TIMEOUTS.get(tool_name, DEFAULT_TIMEOUT)
+        ordered = sorted(samples)
+        rank = min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)
+        return min(self.ceiling, max(self.floor, ordered[rank] * self.factor))
+
+    def _read(self) -> Dict[str, List[float]]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {name: [float(s) for s in samples] for name, samples in data.get("samples", {}).items()}
+
+    def load(self) -> None:
+        """Load persisted latency samples, ignoring a missing or corrupt file"""
+        for tool_name, samples in self._read().items():
+            self._samples[tool_name] = deque(samples[-self.window:], maxlen=self.window)
+        self._unsaved.clear()
+        self._timeouts.clear()
+
+    def save(self) -> None:
+        """Merge the samples recorded since the last save into the file, and adopt the merged window"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _save_lock:
+            merged = self._read()
+            for tool_name, samples in self._unsaved.items():
+                merged.setdefault(tool_name, []).extend(samples)
+            for tool_name, samples in merged.items():
+                self._samples[tool_name] = deque(samples[-self.window:], maxlen=self.window)
+            self._unsaved.clear()
+            self._timeouts.clear()
+            data = {
+                "samples": {name: [round(s, 4) for s in samples] for name, samples in self._samples.items()},
+                "timeouts": {name: round(self.timeout_for(name), 3) for name in self._samples},
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+# Serializes the read-merge-replace of saves within a process
+_save_lock = threading.Lock()
@@ -0,0 +1,192 @@
+"""Raster verification of drawing operations on the headless canvas.
+
+Everything works on whole-array NumPy operations: the change made by the
+last operation is found by diffing the before/after snapshots, shapes are
+classified from the ink along the edges of the changed box, and connected
+components are labelled from horizontal ink runs instead of pixel by pixel.
+"""
+from typing import Optional, Tuple
+import numpy as np
+
+# Pixels darker than this count as ink
+INK_THRESHOLD = 128
+
+# Components smaller than this in both directions are marks such as glyphs, not shapes
+MIN_SHAPE_SIZE = 20
+
+BBox = Tuple[int, int, int, int]
+
+
+def ink_mask(pixels: np.ndarray) -> np.ndarray:
+    """Boolean mask of inked pixels"""
+    return pixels < INK_THRESHOLD
+
+
+def changed_bbox(before: np.ndarray, after: np.ndarray) -> Optional[BBox]:
+    """Bounding box (x1, y1, x2, y2 inclusive) of the pixels that differ, or None"""
+    changed = before != after
+    rows = np.flatnonzero(changed.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(changed[rows[0]:rows[-1] + 1].any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]), int(rows[-1])
+
+
+def _edge_span(edge: np.ndarray) -> float:
+    """Fraction of an edge between its first and last inked pixel"""
+    inked = np.flatnonzero(edge)
+    if inked.size == 0:
+        return 0.0
+    return (inked[-1] - inked[0] + 1) / edge.size
+
+
+def classify_shape(mask: np.ndarray) -> str:
+    """Guess which primitive produced the ink in a mask cropped to its bounding box.
+
+    Returns one of rectangle, oval, right_arrow, left_arrow, up_arrow,
+    down_arrow, text or unknown.
+    """
+    height, width = mask.shape
+    if height < 2 or width < 2:
+        return "unknown"
+    if height < MIN_SHAPE_SIZE and width > height:
+        return "text"
+
+    left, right = mask[:, 0], mask[:, -1]
+    top, bottom = mask[0, :], mask[-1, :]
+    spans = {
+        "left": _edge_span(left), "right": _edge_span(right),
+        "top": _edge_span(top), "bottom": _edge_span(bottom),
+    }
+    coverage = (left.mean() + right.mean() + top.mean() + bottom.mean()) / 4
+    if coverage > 0.9:
+        return "rectangle"
+
+    # An arrow's tip touches its edge at a point while the opposite edge
+    # carries the full width of the shaft
+    for tip, tail, kind in (("right", "left", "right_arrow"), ("left", "right", "left_arrow"),
+                            ("top", "bottom", "up_arrow"), ("bottom", "top", "down_arrow")):
+        if spans[tip] < 0.15 and 0.35 < spans[tail] < 0.65:
+            return kind
+
+    # An ellipse touches each edge only around its midpoint and leaves the corners empty
+    corner = max(1, min(height, width) // 8)
+    corners_empty = not (mask[:corner, :corner].any() or mask[:corner, -corner:].any()
+                         or mask[-corner:, :corner].any() or mask[-corner:, -corner:].any())
+    if corners_empty and all(span < 0.6 for span in spans.values()):
+        return "oval"
+    return "unknown"
+
+
+def label_components(mask: np.ndarray):
+    """Label 8-connected components of a boolean mask.
+
+    Returns (count, bboxes) where bboxes is an (N, 4) array of inclusive
+    x1, y1, x2, y2 boxes, one per component.
+    """
+    height, width = mask.shape
+    stride = width + 2
+    # Only rows with ink are scanned
+    active_rows = np.flatnonzero(mask.any(axis=1))
+    if active_rows.size == 0:
+        return 0, np.zeros((0, 4), dtype=np.int64)
+    # Pad each row with blank columns so runs never continue across rows
+    padded = np.zeros((active_rows.size, stride), dtype=np.int8)
+    padded[:, 1:-1] = mask[active_rows]
+    edges = np.diff(padded.ravel())
+    local_starts = np.flatnonzero(edges == 1) + 1
+    local_ends = np.flatnonzero(edges == -1) + 1
+
+    local_rows = local_starts // stride
+    rows = active_rows[local_rows]
+    # A run covers padded columns [start_col, end_col); keys place it on the full canvas grid
+    start_cols = local_starts - local_rows * stride
+    end_cols = local_ends - local_rows * stride
+    starts = rows * stride + start_cols
+    ends = rows * stride + end_cols
+
+    # Runs on the previous row that touch each run, including diagonally,
+    # form a contiguous block [lo, hi] in the sorted run arrays
+    lo = np.searchsorted(ends, (rows - 1) * stride + start_cols, side="left")
+    hi = np.searchsorted(starts, (rows - 1) * stride + end_cols, side="right") - 1
+    has_neighbour = (rows > 0) & (lo <= hi)
+    counts = np.where(has_neighbour, hi - lo + 1, 0)
+    run_index = np.repeat(np.arange(starts.size), counts)
+    offsets = np.arange(run_index.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    neighbour = lo[run_index] + offsets
+
+    # Propagate the smallest label across touching runs, with pointer jumping
+    labels = np.arange(starts.size)
+    while True:
+        merged = np.minimum(labels[run_index], labels[neighbour])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, run_index, merged)
+        np.minimum.at(new_labels, neighbour, merged)
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    roots, component = np.unique(labels, return_inverse=True)
+    count = roots.size
+    x1 = np.full(count, width, dtype=np.int64)
+    y1 = np.full(count, height, dtype=np.int64)
+    x2 = np.zeros(count, dtype=np.int64)
+    y2 = np.zeros(count, dtype=np.int64)
+    np.minimum.at(x1, component, start_cols - 1)
+    np.maximum.at(x2, component, end_cols - 2)
+    np.minimum.at(y1, component, rows)
+    np.maximum.at(y2, component, rows)
+    return count, np.column_stack([x1, y1, x2, y2])
+
+
+def count_shapes(pixels: np.ndarray) -> Tuple[int, int]:
+    """Count (shapes, small marks) among the connected ink components"""
+    count, boxes = label_components(ink_mask(pixels))
+    if count == 0:
+        return 0, 0
+    sizes = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]) + 1
+    shapes = int((sizes >= MIN_SHAPE_SIZE).sum())
+    return shapes, count - shapes
+
+
+def verify_last_change(before: np.ndarray, after: np.ndarray, expected_kind: Optional[str] = None,
+                       expected_bbox: Optional[BBox] = None, expected_count: Optional[int] = None,
+                       tolerance: int = 3) -> dict:
+    """Check the most recent drawing operation against expectations"""
+    report = {"ok": True, "problems": []}
+    bbox = changed_bbox(before, after)
+    report["changed_bbox"] = list(bbox) if bbox else None
+    if bbox is None:
+        report["ok"] = False
+        report["problems"].append("the last operation did not change the canvas")
+    else:
+        x1, y1, x2, y2 = bbox
+        added = ink_mask(after[y1:y2 + 1, x1:x2 + 1]) & ~ink_mask(before[y1:y2 + 1, x1:x2 + 1])
+        kind = classify_shape(added)
+        report["detected_kind"] = kind
+        if expected_kind and kind != expected_kind and not (expected_kind == "shape" and kind != "text"):
+            report["ok"] = False
+            report["problems"].append(f"expected a {expected_kind} but found a {kind}")
+        if expected_bbox is not None:
+            ex1, ey1, ex2, ey2 = (min(expected_bbox[0], expected_bbox[2]), min(expected_bbox[1], expected_bbox[3]),
+                                  max(expected_bbox[0], expected_bbox[2]), max(expected_bbox[1], expected_bbox[3]))
+            error = max(abs(x1 - ex1), abs(y1 - ey1), abs(x2 - ex2), abs(y2 - ey2))
+            report["bbox_error_px"] = error
+            if error > tolerance:
+                report["ok"] = False
+                report["problems"].append(
+                    f"expected box ({ex1},{ey1})-({ex2},{ey2}) but the change covers ({x1},{y1})-({x2},{y2})"
+                )
+
+    if expected_count is not None:
+        shapes, marks = count_shapes(after)
+        report["shape_count"] = shapes
+        report["mark_count"] = marks
+        if shapes != expected_count:
+            report["ok"] = False
+            report["problems"].append(
+                f"expected {expected_count} shape(s) but found {shapes} separate outline(s); "
+                "touching shapes count as one"
+            )
+    return report